@@ -2,6 +2,7 @@ import json
 import os
 import sys
 import re
+import gzip
 import argparse
 from collections import defaultdict
 import glob
@@ -10,6 +11,17 @@ import openai
 from tqdm import tqdm
 from termcolor import colored
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Exported PR documents, plain or compressed by pr_export.py --compression
+PR_FILE_PATTERNS = ["*.json", "*.json.gz", "*.json.zst"]
+
+# Token budget of the diff context given with a file's comments, in whole hunks
+CONTEXT_TOKENS = 400
+
 class PRReviewAnalyzer:
     def __init__(self, openai_api_key):
         self.openai_api_key = openai_api_key
@@ -26,11 +38,49 @@ class PRReviewAnalyzer:
             "pr_results": []
         }
     
+    def read_exported_file(self, path):
+        """Read an exported file, decompressing .gz / .zst transparently"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        
+        if path.endswith(".gz"):
+            return gzip.decompress(data)
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("the zstandard package is required to read .zst exports")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data
+    
+    def load_stored_patch(self, store_dir, digest):
+        """Load a patch body from the exporter's content-addressed patch store"""
+        for suffix in ("", ".gz", ".zst"):
+            path = os.path.join(store_dir, digest[:2], f"{digest}.patch{suffix}")
+            if os.path.exists(path):
+                return self.read_exported_file(path).decode("utf-8")
+        
+        print(f"Warning: patch {digest} not found in {store_dir}")
+        return ""
+    
     def load_pr_data(self, json_file):
-        """Load PR data from a JSON file"""
+        """Load PR data from a JSON file
+        
+        Handles both the original layout (indented JSON with inline patches)
+        and the compressed / deduplicated layout, whose patches and diffs are
+        stored once in a patch store and referenced by SHA-256.
+        """
         try:
-            with open(json_file, 'r') as f:
-                pr_data = json.load(f)
+            pr_data = json.loads(self.read_exported_file(json_file))
+            
+            if pr_data.get("patch_store"):
+                store_dir = os.path.join(os.path.dirname(json_file), pr_data["patch_store"])
+                
+                for patch in pr_data.get("patches", []):
+                    if patch.get("patch_sha256"):
+                        patch["patch"] = self.load_stored_patch(store_dir, patch["patch_sha256"])
+                
+                if pr_data.get("diffs_sha256"):
+                    pr_data["diffs"] = self.load_stored_patch(store_dir, pr_data["diffs_sha256"])
+            
             return pr_data
         except Exception as e:
             print(f"Error loading {json_file}: {e}")
@@ -94,6 +144,11 @@ class PRReviewAnalyzer:
         """Extract information about file changes in the PR"""
         file_changes = {}
         
+        # The hunk index of exports from pr_hunks, in hunk order per file
+        hunks = defaultdict(list)
+        for hunk in pr_data.get("hunks", []):
+            hunks[hunk["filename"]].append(hunk)
+        
         for patch in pr_data.get("patches", []):
             filename = patch.get("filename", "")
             if filename:
@@ -101,11 +156,44 @@ class PRReviewAnalyzer:
                     "patch": patch.get("patch", ""),
                     "additions": patch.get("additions", 0),
                     "deletions": patch.get("deletions", 0),
-                    "status": patch.get("status", "modified")
+                    "status": patch.get("status", "modified"),
+                    "hunks": hunks.get(filename, [])
                 }
         
         return file_changes
     
+    def diff_context(self, file_change, human_comments):
+        """Pick the hunks of a file to show with its comments, within CONTEXT_TOKENS
+        
+        Hunks that human comments point at come first, then the others in
+        order. Exports without a hunk index fall back to the start of the patch.
+        """
+        patch = file_change.get("patch") or ""
+        hunks = file_change.get("hunks")
+        if not hunks:
+            return f"{patch[:500]}..."
+        
+        commented = {comment["line"] for comment in human_comments if comment.get("line")}
+        ranked = sorted(hunks, key=lambda hunk: not any(
+            hunk["position_start"] <= position <= hunk["position_end"] for position in commented))
+        
+        chosen, tokens = [], 0
+        for hunk in ranked:
+            if chosen and tokens + hunk["tokens"] > CONTEXT_TOKENS:
+                continue
+            chosen.append(hunk)
+            tokens += hunk["tokens"]
+        
+        # Hunk positions are line offsets into the patch; a hunk alone over the budget is cut
+        lines = patch.splitlines()
+        parts = ["\n".join(lines[hunk["position_start"]:hunk["position_end"] + 1])[:CONTEXT_TOKENS * 4]
+                 for hunk in sorted(chosen, key=lambda hunk: hunk["hunk_index"])]
+        
+        omitted = len(hunks) - len(chosen)
+        if omitted:
+            parts.append(f"... ({omitted} more hunks)")
+        return "\n".join(parts)
+    
     def compute_file_overlap_score(self, human_files, ai_files):
         """Compute score for overlap between files commented on by humans vs AI"""
         human_files_set = set(human_files)
@@ -206,7 +294,7 @@ class PRReviewAnalyzer:
         # Prepare the context with file change if available
         context = ""
         if file_change:
-            context = f"File changes summary:\n{file_change['patch'][:500]}...\n\n"
+            context = f"File changes summary:\n{self.diff_context(file_change, human_comments)}\n\n"
         
         # Create a prompt for OpenAI
         prompt = f"""
@@ -535,8 +623,12 @@ def main():
     else:
         api_key = args.api_key
     
-    # Find all JSON files in the specified folder
-    json_files = glob.glob(os.path.join(args.folder, "*.json"))
+    # Find all exported PR files (plain or compressed) in the specified folder
+    json_files = sorted(
+        path
+        for pattern in PR_FILE_PATTERNS
+        for path in glob.glob(os.path.join(args.folder, pattern))
+    )
     
     if not json_files:
         print(f"No JSON files found in folder: {args.folder}")
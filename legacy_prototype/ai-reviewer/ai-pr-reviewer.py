@@ -1,12 +1,28 @@
 import os
 import sys
 import logging
+import re
 import json
 import time
+import random
+import hashlib
+import math
+import tempfile
+import socket
+import asyncio
+import contextlib
+import fnmatch
+import aiohttp
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 import mysql.connector
 from mysql.connector import Error
 import openai
 from datetime import datetime, timedelta
+from collections import Counter
 
 # Configure logging
 logging.basicConfig(
@@ -19,6 +35,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ai-pr-reviewer")
 
+# Lockfiles, minified bundles, snapshots, vendored and generated code
+DEFAULT_SKIP_GLOBS = [
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock", "Cargo.lock",
+    "Gemfile.lock", "composer.lock", "go.sum", "*.lock",
+    "*.min.js", "*.min.css", "*.map", "*.snap", "*/__snapshots__/*",
+    "vendor/*", "*/vendor/*", "third_party/*", "node_modules/*", "dist/*",
+    "*.pb.go", "*_pb2.py", "*_pb2_grpc.py", "*.pb.h", "*.pb.cc", "*.generated.*",
+]
+
+def split_list(value):
+    """Split a comma-separated setting, dropping empty items."""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+# How much each feature adds to a PR's review priority; size counts against it
+DEFAULT_PRIORITY_WEIGHTS = {"recency": 1.0, "open": 1.0, "activity": 0.5, "waiting": 1.0, "size": 1.5}
+
+def parse_weights(value):
+    """Parse ``name=weight`` pairs over the default priority weights."""
+    weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+    for item in split_list(value):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
 class Config:
     """Configuration settings for the AI PR reviewer."""
     def __init__(self):
@@ -36,6 +76,61 @@ class Config:
         
         # Review settings
         self.max_prs_to_review = int(os.getenv("MAX_PRS_TO_REVIEW", "10"))
+        self.review_only_open_prs = os.getenv("REVIEW_ONLY_OPEN_PRS", "false").lower() in ("1", "true", "yes")
+        self.days_since_update = int(os.getenv("DAYS_SINCE_UPDATE", "0"))  # 0 disables the age filter
+        
+        # Concurrency limits: API requests in flight overall and per PR, and PRs reviewed at once
+        self.llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.llm_per_pr_concurrency = int(os.getenv("LLM_PER_PR_CONCURRENCY", "4"))
+        self.review_pr_concurrency = int(os.getenv("REVIEW_PR_CONCURRENCY", "2"))
+        
+        # API quota and failure handling (an RPM or TPM of 0 disables that bucket)
+        self.llm_rpm = int(os.getenv("LLM_RPM", "0"))
+        self.llm_tpm = int(os.getenv("LLM_TPM", "0"))
+        self.llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "6"))
+        self.llm_backoff_base = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+        self.llm_backoff_max = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+        self.llm_breaker_threshold = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # 0 disables
+        self.llm_breaker_cooldown = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+        self.llm_request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+        
+        # Review cache settings (an empty REVIEW_CACHE_DIR disables the cache)
+        self.review_cache_dir = os.getenv("REVIEW_CACHE_DIR", "review_cache")
+        self.review_cache_max_mb = int(os.getenv("REVIEW_CACHE_MAX_MB", "256"))
+        self.review_cache_max_age_days = float(os.getenv("REVIEW_CACHE_MAX_AGE_DAYS", "30"))
+        
+        # Small patches are packed into shared requests of up to this many tokens (0 disables batching)
+        self.review_batch_tokens = int(os.getenv("REVIEW_BATCH_TOKENS", "3000"))
+        self.review_batch_max_files = int(os.getenv("REVIEW_BATCH_MAX_FILES", "8"))
+        self.small_patch_tokens = int(os.getenv("SMALL_PATCH_TOKENS", "400"))
+        
+        # PRs whose patches and comments are loaded per query round
+        self.review_prefetch_batch = int(os.getenv("REVIEW_PREFETCH_BATCH", "10"))
+        
+        # Larger patches are split on hunk boundaries into chunks of up to this many tokens
+        self.review_chunk_tokens = int(os.getenv("REVIEW_CHUNK_TOKENS", "6000"))
+        
+        # Patch filter: files matching these rules are not sent to the LLM (an empty value disables a rule)
+        self.review_skip_globs = split_list(os.getenv("REVIEW_SKIP_GLOBS", ",".join(DEFAULT_SKIP_GLOBS)))
+        self.review_skip_statuses = split_list(os.getenv("REVIEW_SKIP_STATUSES", "removed"))
+        self.review_max_patch_chars = int(os.getenv("REVIEW_MAX_PATCH_CHARS", "200000"))  # 0 disables
+        self.review_max_patch_lines = int(os.getenv("REVIEW_MAX_PATCH_LINES", "5000"))  # 0 disables
+        self.review_skip_generated = os.getenv("REVIEW_SKIP_GENERATED", "true").lower() in ("1", "true", "yes")
+        
+        # Exporter wakeup socket (optional, the export outbox is the durable signal)
+        self.export_notify_socket = os.getenv("EXPORT_NOTIFY_SOCKET", "")
+        
+        # Work queue: several reviewers split the backlog by leasing jobs from review_jobs
+        self.reviewer_id = os.getenv("REVIEWER_ID", "") or f"{socket.gethostname()}-{os.getpid()}"
+        self.review_enqueue_limit = int(os.getenv("REVIEW_ENQUEUE_LIMIT", "100"))
+        self.review_lease_seconds = int(os.getenv("REVIEW_LEASE_SECONDS", "600"))
+        self.review_max_attempts = int(os.getenv("REVIEW_MAX_ATTEMPTS", "3"))
+        
+        # Scheduler: each cycle takes the most urgent PRs that fit these budgets (0 disables a budget)
+        self.review_cycle_tokens = int(os.getenv("REVIEW_CYCLE_TOKENS", "0"))
+        self.review_cycle_seconds = int(os.getenv("REVIEW_CYCLE_SECONDS", "0"))
+        self.review_seconds_per_request = float(os.getenv("REVIEW_SECONDS_PER_REQUEST", "10"))
+        self.review_priority_weights = parse_weights(os.getenv("REVIEW_PRIORITY_WEIGHTS", ""))
 
     def validate(self):
         """Validate the configuration."""
@@ -43,6 +138,39 @@ class Config:
             logger.error("OPENAI_API_KEY environment variable is not set")
             return False
         
+        if min(self.llm_max_concurrency, self.llm_per_pr_concurrency, self.review_pr_concurrency) < 1:
+            logger.error("LLM_MAX_CONCURRENCY, LLM_PER_PR_CONCURRENCY and REVIEW_PR_CONCURRENCY must be at least 1")
+            return False
+        
+        if min(self.llm_rpm, self.llm_tpm, self.llm_max_retries, self.llm_breaker_threshold) < 0:
+            logger.error("LLM_RPM, LLM_TPM, LLM_MAX_RETRIES and LLM_BREAKER_THRESHOLD must not be negative")
+            return False
+        
+        if self.review_prefetch_batch < 1:
+            logger.error("REVIEW_PREFETCH_BATCH must be at least 1")
+            return False
+        
+        if self.review_chunk_tokens < 200:
+            logger.error("REVIEW_CHUNK_TOKENS must be at least 200")
+            return False
+        
+        if self.review_lease_seconds < 30:
+            logger.error("REVIEW_LEASE_SECONDS must be at least 30")
+            return False
+        
+        if self.review_max_attempts < 1:
+            logger.error("REVIEW_MAX_ATTEMPTS must be at least 1")
+            return False
+        
+        if min(self.review_cycle_tokens, self.review_cycle_seconds, self.review_seconds_per_request) < 0:
+            logger.error("REVIEW_CYCLE_TOKENS, REVIEW_CYCLE_SECONDS and REVIEW_SECONDS_PER_REQUEST must not be negative")
+            return False
+        
+        unknown = set(self.review_priority_weights) - set(DEFAULT_PRIORITY_WEIGHTS)
+        if unknown:
+            logger.error(f"Unknown REVIEW_PRIORITY_WEIGHTS features: {', '.join(sorted(unknown))}")
+            return False
+        
         return True
 
 def connect_to_database(config):
@@ -119,6 +247,28 @@ def export_pr_diagnostics(connection):
     except Error as e:
         logger.error(f"Error exporting PR diagnostics: {e}")
 
+def ensure_index(cursor, table, index_name, columns):
+    """Create an index unless it already exists (MySQL has no CREATE INDEX IF NOT EXISTS)."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index_name))
+    
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+        logger.info(f"Created index {index_name} on {table}")
+
+def ensure_column(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Added column {column} to {table}")
+
 def ensure_tables_exist(connection):
     """Ensure the necessary tables exist for storing reviews."""
     try:
@@ -155,6 +305,127 @@ def ensure_tables_exist(connection):
             )
         """)
         
+        # Create export_outbox table, consumed by the PR exporter daemon
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS export_outbox (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                pr_id BIGINT NOT NULL,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+                INDEX idx_pr_id (pr_id)
+            )
+        """)
+        
+        # Create review_jobs table, the work queue shared by all reviewer processes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS review_jobs (
+                pr_id BIGINT PRIMARY KEY,
+                status ENUM('pending', 'leased', 'done', 'failed') NOT NULL DEFAULT 'pending',
+                pr_updated_at DATETIME NOT NULL,
+                lease_owner VARCHAR(255) NULL,
+                lease_expires_at DATETIME NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                last_error TEXT NULL,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+                INDEX idx_status_lease (status, lease_expires_at),
+                INDEX idx_lease_owner (lease_owner)
+            )
+        """)
+        
+        # Create pr_hunks table, every patch parsed once into its hunks
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pr_hunks (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                pr_id BIGINT NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                hunk_index INT NOT NULL,
+                old_start INT NOT NULL,
+                old_lines INT NOT NULL,
+                new_start INT NOT NULL,
+                new_lines INT NOT NULL,
+                position_start INT NOT NULL,
+                position_end INT NOT NULL,
+                additions INT NOT NULL DEFAULT 0,
+                deletions INT NOT NULL DEFAULT 0,
+                content_hash CHAR(64) NOT NULL,
+                tokens INT NOT NULL,
+                content MEDIUMTEXT NOT NULL,
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+                UNIQUE INDEX idx_pr_file_hunk (pr_id, filename, hunk_index),
+                INDEX idx_content_hash (content_hash)
+            )
+        """)
+        
+        # Create pr_hunk_index table, the PR version pr_hunks was built from
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pr_hunk_index (
+                pr_id BIGINT PRIMARY KEY,
+                pr_updated_at DATETIME NOT NULL,
+                hunks INT NOT NULL DEFAULT 0,
+                indexed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE
+            )
+        """)
+        
+        # Create ai_reviewed_patches table, the patch each file of a review was based on
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ai_reviewed_patches (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                review_id BIGINT NOT NULL,
+                pr_id BIGINT NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                patch_hash CHAR(64) NOT NULL,
+                hunk_hashes MEDIUMTEXT NOT NULL,
+                finding TEXT NULL,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (review_id) REFERENCES ai_pr_reviews(id) ON DELETE CASCADE,
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+                INDEX idx_review_id (review_id),
+                INDEX idx_pr_id (pr_id)
+            )
+        """)
+        
+        # Columns added after the tables were first created
+        ensure_column(cursor, "ai_pr_reviews", "summary_hash", "CHAR(64) NULL")
+        ensure_column(cursor, "ai_file_reviews", "patch_hash", "CHAR(64) NULL")
+        
+        # Create ai_file_review_progress table, results of reviews that are not finished yet
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ai_file_review_progress (
+                pr_id BIGINT NOT NULL,
+                kind ENUM('summary', 'file') NOT NULL,
+                filename VARCHAR(255) NOT NULL DEFAULT '',
+                content_hash CHAR(64) NOT NULL,
+                content TEXT NULL,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (pr_id, kind, filename),
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE
+            )
+        """)
+        
+        # Create ai_skipped_files table, the files the patch filter kept from the LLM
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ai_skipped_files (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                review_id BIGINT NOT NULL,
+                pr_id BIGINT NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                reason VARCHAR(255) NOT NULL,
+                tokens INT NOT NULL DEFAULT 0,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (review_id) REFERENCES ai_pr_reviews(id) ON DELETE CASCADE,
+                FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+                INDEX idx_review_id (review_id),
+                INDEX idx_pr_id (pr_id)
+            )
+        """)
+        
+        # Indexes backing the review selection query
+        ensure_index(cursor, "ai_pr_reviews", "idx_pr_created", "pr_id, created_at")
+        ensure_index(cursor, "pull_requests", "idx_state_updated", "state, updated_at")
+        
         connection.commit()
         cursor.close()
         logger.info("Review tables created or verified")
@@ -164,27 +435,148 @@ def ensure_tables_exist(connection):
         logger.error(f"Error creating review tables: {e}")
         return False
 
-def get_all_prs_for_review(connection, limit):
-    """Get all PRs for review, ignoring previous filters."""
+# PRs whose patches are parsed into pr_hunks per transaction
+HUNK_INDEX_BATCH = 50
+
+def index_pr_hunks(connection, model, owner, pr_ids, batch_size=HUNK_INDEX_BATCH):
+    """Parse the patches of the PRs ``owner`` has leased into pr_hunks; returns how many PRs were indexed.
+    
+    Only ``pr_ids`` whose jobs ``owner`` still holds are indexed, and only
+    when their ``updated_at`` differs from the one in pr_hunk_index. Their
+    review_jobs rows are locked first, so a reviewer that took over an
+    expired lease waits instead of rewriting the same hunks concurrently.
+    The tracker replaces a PR's patches in the transaction that updates
+    the PR, and a batch reads both in one snapshot, so the hunks always
+    belong to the recorded version.
+    """
+    indexed = 0
+    pr_ids = list(pr_ids)
+    
+    for start in range(0, len(pr_ids), batch_size):
+        batch = pr_ids[start:start + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        
+        try:
+            cursor = connection.cursor(dictionary=True)
+            
+            # A locking read does not open the snapshot, the next SELECT does
+            cursor.execute(f"""
+                SELECT pr_id FROM review_jobs
+                WHERE pr_id IN ({placeholders}) AND lease_owner = %s AND status = 'leased'
+                FOR UPDATE
+            """, (*batch, owner))
+            held = [row['pr_id'] for row in cursor.fetchall()]
+            
+            if not held:
+                connection.commit()
+                cursor.close()
+                continue
+            
+            cursor.execute(f"""
+                SELECT pr.id, pr.updated_at
+                FROM pull_requests pr
+                LEFT JOIN pr_hunk_index idx ON idx.pr_id = pr.id
+                WHERE pr.id IN ({', '.join(['%s'] * len(held))})
+                  AND (idx.pr_id IS NULL OR idx.pr_updated_at <> pr.updated_at)
+            """, tuple(held))
+            prs = cursor.fetchall()
+            
+            if not prs:
+                connection.commit()
+                cursor.close()
+                continue
+            
+            stale = [pr['id'] for pr in prs]
+            placeholders = ', '.join(['%s'] * len(stale))
+            
+            cursor.execute(f"""
+                SELECT pr_id, filename, patch
+                FROM pr_patches
+                WHERE pr_id IN ({placeholders})
+            """, tuple(stale))
+            patches = _group_by_pr(cursor.fetchall(), stale)
+            
+            cursor.execute(f"DELETE FROM pr_hunks WHERE pr_id IN ({placeholders})", tuple(stale))
+            
+            counts = {}
+            for pr_id in stale:
+                rows = [
+                    (pr_id, patch['filename'], hunk['hunk_index'], hunk['old_start'], hunk['old_lines'],
+                     hunk['new_start'], hunk['new_lines'], hunk['position_start'], hunk['position_end'],
+                     hunk['additions'], hunk['deletions'], hunk['content_hash'], hunk['tokens'], hunk['content'])
+                    for patch in patches[pr_id] if patch['patch']
+                    for hunk in index_hunks(patch['patch'], model)
+                ]
+                counts[pr_id] = len(rows)
+                
+                # One statement per PR keeps the packet size bounded by the PR's diff
+                if rows:
+                    cursor.executemany("""
+                        INSERT INTO pr_hunks
+                        (pr_id, filename, hunk_index, old_start, old_lines, new_start, new_lines,
+                         position_start, position_end, additions, deletions, content_hash, tokens, content)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, rows)
+            
+            cursor.executemany("""
+                INSERT INTO pr_hunk_index (pr_id, pr_updated_at, hunks)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE pr_updated_at = VALUES(pr_updated_at), hunks = VALUES(hunks)
+            """, [(pr['id'], pr['updated_at'], counts[pr['id']]) for pr in prs])
+            
+            connection.commit()
+            cursor.close()
+            indexed += len(prs)
+            
+        except Error as e:
+            logger.error(f"Error indexing PR hunks: {e}")
+            connection.rollback()
+    
+    return indexed
+
+def get_prs_for_review(connection, limit, only_open=False, days_since_update=0):
+    """Get the PRs that need a review: never reviewed, or updated since their last AI review.
+    
+    The review state comes from ``ai_pr_reviews.created_at``. The tracker
+    overwrites ``pull_requests.last_processed_time`` with its fetch time on
+    every sync, so that column cannot tell reviewed PRs apart. Unreviewed
+    PRs come first, then changed ones, newest first within each group.
+    """
     prs = []
     
     try:
         cursor = connection.cursor(dictionary=True)
         
-        # Simple query to get PRs in order of newest first, with a limit
-        query = """
-            SELECT pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, 
-                   pr.diffs, pr.state, pr.user_login, pr.base_commit_sha, 
-                   pr.files_changed, pr.additions, pr.deletions, pr.updated_at
+        filters = ["(rev.last_reviewed_at IS NULL OR pr.updated_at > rev.last_reviewed_at)"]
+        params = []
+        
+        if only_open:
+            filters.append("pr.state = 'open'")
+        
+        if days_since_update > 0:
+            filters.append("pr.updated_at >= DATE_SUB(NOW(), INTERVAL %s DAY)")
+            params.append(days_since_update)
+        
+        query = f"""
+            SELECT pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title,
+                   pr.state, pr.updated_at, rev.last_reviewed_at
             FROM pull_requests pr
-            ORDER BY pr.updated_at DESC
+            LEFT JOIN (
+                SELECT pr_id, MAX(created_at) AS last_reviewed_at
+                FROM ai_pr_reviews
+                GROUP BY pr_id
+            ) rev ON rev.pr_id = pr.id
+            WHERE {' AND '.join(filters)}
+            ORDER BY rev.last_reviewed_at IS NOT NULL, pr.updated_at DESC
             LIMIT %s
         """
+        params.append(limit)
         
-        cursor.execute(query, (limit,))
+        cursor.execute(query, tuple(params))
         prs = cursor.fetchall()
         
-        logger.info(f"Found {len(prs)} PRs for review (ignoring previous filters)")
+        unreviewed = sum(1 for pr in prs if pr['last_reviewed_at'] is None)
+        logger.info(f"Found {len(prs)} PRs for review ({unreviewed} never reviewed, {len(prs) - unreviewed} updated since their last review)")
         
         cursor.close()
         
@@ -193,213 +585,2159 @@ def get_all_prs_for_review(connection, limit):
     
     return prs
 
-def get_pr_patches(connection, pr_id):
-    """Get all file patches for a specific PR."""
-    patches = []
+def enqueue_review_jobs(connection, prs):
+    """Add the selected PRs to the review_jobs queue.
+    
+    Every reviewer runs the selection and enqueues what it found, so this
+    must be idempotent: jobs that are pending or leased are left alone, and
+    finished or failed jobs are only reset when the PR changed since the
+    version they were queued for. A PR that keeps failing therefore stays
+    failed until somebody pushes to it.
+    """
+    if not prs:
+        return True
     
     try:
-        cursor = connection.cursor(dictionary=True)
-        
-        query = """
-            SELECT path, patch, filename, status, changes, additions, deletions
-            FROM pr_patches
-            WHERE pr_id = %s
-        """
+        cursor = connection.cursor()
         
-        cursor.execute(query, (pr_id,))
-        patches = cursor.fetchall()
+        # MySQL applies the assignments left to right, so the status test
+        # must come before status and pr_updated_at are overwritten
+        cursor.executemany("""
+            INSERT INTO review_jobs (pr_id, pr_updated_at)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE
+                attempts = IF(status IN ('done', 'failed') AND VALUES(pr_updated_at) > pr_updated_at, 0, attempts),
+                last_error = IF(status IN ('done', 'failed') AND VALUES(pr_updated_at) > pr_updated_at, NULL, last_error),
+                status = IF(status IN ('done', 'failed') AND VALUES(pr_updated_at) > pr_updated_at, 'pending', status),
+                pr_updated_at = GREATEST(pr_updated_at, VALUES(pr_updated_at))
+        """, [(pr['id'], pr['updated_at']) for pr in prs])
         
+        connection.commit()
         cursor.close()
+        return True
         
     except Error as e:
-        logger.error(f"Error querying PR patches: {e}")
-    
-    return patches
+        logger.error(f"Error enqueueing review jobs: {e}")
+        connection.rollback()
+        return False
 
-def get_pr_comments(connection, pr_id):
-    """Get all comments for a specific PR."""
-    comments = []
+def claim_review_jobs(connection, owner, limit, lease_seconds, max_attempts, choose=None):
+    """Lease up to ``limit`` review jobs for ``owner`` and return their PR ids.
+    
+    Pending jobs and jobs whose lease expired (their reviewer died or hung)
+    are claimable. ``SKIP LOCKED`` lets concurrent reviewers claim disjoint
+    sets without waiting on each other's row locks. Expired jobs that have
+    used up their attempts are marked failed instead of being retried.
+    
+    With ``choose``, ``limit`` bounds the claimable jobs considered instead:
+    ``choose(connection, pr_ids)`` returns the ones to lease, and the rest
+    are unlocked for other reviewers when the claim commits.
+    """
+    pr_ids = []
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         
-        query = """
-            SELECT id, body, created_at, user_login, path, position
-            FROM pr_comments
-            WHERE pr_id = %s
-            ORDER BY created_at ASC
-        """
+        cursor.execute("""
+            UPDATE review_jobs
+            SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL,
+                last_error = COALESCE(last_error, 'Lease expired')
+            WHERE status = 'leased' AND lease_expires_at < NOW() AND attempts >= %s
+        """, (max_attempts,))
+        if cursor.rowcount:
+            logger.warning(f"Marked {cursor.rowcount} review jobs failed after {max_attempts} attempts")
+        connection.commit()
         
-        cursor.execute(query, (pr_id,))
-        comments = cursor.fetchall()
+        cursor.execute("""
+            SELECT pr_id FROM review_jobs
+            WHERE (status = 'pending' OR (status = 'leased' AND lease_expires_at < NOW()))
+              AND attempts < %s
+            ORDER BY attempts, pr_updated_at DESC
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (max_attempts, limit))
+        pr_ids = [row[0] for row in cursor.fetchall()]
         
+        if choose and pr_ids:
+            pr_ids = choose(connection, pr_ids)
+        
+        if pr_ids:
+            cursor.execute(f"""
+                UPDATE review_jobs
+                SET status = 'leased', lease_owner = %s, attempts = attempts + 1,
+                    lease_expires_at = DATE_ADD(NOW(), INTERVAL %s SECOND)
+                WHERE pr_id IN ({', '.join(['%s'] * len(pr_ids))})
+            """, (owner, lease_seconds, *pr_ids))
+        
+        connection.commit()
         cursor.close()
         
     except Error as e:
-        logger.error(f"Error querying PR comments: {e}")
+        logger.error(f"Error claiming review jobs: {e}")
+        connection.rollback()
+        return []
     
-    return comments
+    return pr_ids
 
-def summarize_pr(openai_api, model, title, patches):
-    """Generate a summary of the PR using OpenAI."""
+def renew_leases(connection, owner, pr_ids, lease_seconds):
+    """Extend the leases ``owner`` still holds on ``pr_ids``; returns how many were renewed."""
     try:
-        # Prepare the prompt
-        prompt = f"""
-        ## GitHub PR Title
-        `{title}`
-        
-        ## Changes Overview
-        The PR changes {len(patches)} files with the following modifications:
-        
-        """
-        
-        # Add a summary of each file's changes
-        for patch in patches[:5]:  # Limit to first 5 files to avoid token limits
-            prompt += f"- {patch['filename']} ({patch['status']}): {patch['additions']} additions, {patch['deletions']} deletions\n"
-        
-        if len(patches) > 5:
-            prompt += f"- ... and {len(patches) - 5} more files\n"
-        
-        prompt += """
-        ## Instructions
-        Please provide a concise summary of this PR. Your summary should:
-        1. Explain the purpose of the changes
-        2. Note significant modifications
-        3. Identify potential concerns or areas for improvement
-        4. Keep the response under 250 words
-        """
+        cursor = connection.cursor()
         
-        # Make the API call
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful AI code reviewer."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=500
-        )
+        cursor.execute(f"""
+            UPDATE review_jobs
+            SET lease_expires_at = DATE_ADD(NOW(), INTERVAL %s SECOND)
+            WHERE lease_owner = %s AND status = 'leased'
+              AND pr_id IN ({', '.join(['%s'] * len(pr_ids))})
+        """, (lease_seconds, owner, *pr_ids))
+        renewed = cursor.rowcount
         
-        summary = response.choices[0].message['content'].strip()
-        logger.info("Generated PR summary")
-        return summary
+        connection.commit()
+        cursor.close()
+        return renewed
         
-    except Exception as e:
-        logger.error(f"Error generating PR summary: {e}")
-        return "Failed to generate summary due to an error."
+    except Error as e:
+        logger.error(f"Error renewing review leases: {e}")
+        connection.rollback()
+        return 0
 
-def review_file(openai_api, model, filename, patch_content, file_status):
-    """Review a single file's changes using OpenAI."""
+def release_review_job(connection, owner, pr_id, max_attempts, error=None, done=False, count_attempt=True):
+    """Give back a leased job: finished, or pending again unless its attempts are used up.
+    
+    With ``count_attempt`` False the claim is not counted as an attempt,
+    for jobs handed back without being tried.
+    """
     try:
-        if not patch_content or len(patch_content) < 10:
-            return None
-        
-        # Limit patch content size to avoid token limits
-        if len(patch_content) > 8000:
-            patch_content = patch_content[:8000] + "\n... (content truncated for token limit)"
-        
-        # Prepare the prompt
-        prompt = f"""
-        ## File: {filename}
-        ## Status: {file_status}
-        
-        ## Diff
-        ```diff
-        {patch_content}
-        ```
-        
-        ## Instructions
-        Please review this code diff and provide specific, actionable feedback. Focus on:
-        
-        1. Bugs or logical errors
-        2. Performance issues
-        3. Security vulnerabilities
-        4. Code style and best practices
-        5. Potential edge cases
-        
-        Format your response with these rules:
-        - If you find issues, start with a brief overall assessment, then list specific issues with line numbers.
-        - If the code looks good without issues, respond with "LGTM! (Looks Good To Me)"
-        - Be concise and specific.
-        """
+        cursor = connection.cursor()
         
-        # Make the API call
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful AI code reviewer with expertise in multiple programming languages."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=1000
-        )
+        if done:
+            status, params = "'done'", ()
+        elif count_attempt:
+            status, params = "IF(attempts >= %s, 'failed', 'pending')", (max_attempts,)
+        else:
+            status, params = "'pending', attempts = attempts - 1", ()
         
-        review = response.choices[0].message['content'].strip()
-        logger.info(f"Generated review for {filename}")
+        cursor.execute(f"""
+            UPDATE review_jobs
+            SET status = {status}, lease_owner = NULL, lease_expires_at = NULL, last_error = %s
+            WHERE pr_id = %s AND lease_owner = %s
+        """, (*params, error, pr_id, owner))
         
-        if review.startswith("LGTM"):
-            return None
-            
-        return review
+        connection.commit()
+        cursor.close()
+        return True
         
-    except Exception as e:
-        logger.error(f"Error reviewing file {filename}: {e}")
-        return None
+    except Error as e:
+        logger.error(f"Error releasing review job for PR {pr_id}: {e}")
+        connection.rollback()
+        return False
 
-def store_review(connection, pr_id, repo_owner, repo_name, pr_number, summary, full_review, file_reviews=None):
-    """Store a PR review in the database."""
+def get_review_candidates(connection, pr_ids):
+    """Get the PR rows the scheduler ranks, with discussion, review history and patch sizes.
+    
+    Patches are listed with their length and their token count from
+    pr_hunks instead of their text, which is only loaded for the PRs that
+    are picked.
+    """
+    candidates = {}
+    
     try:
-        cursor = connection.cursor()
+        cursor = connection.cursor(dictionary=True)
+        placeholders = ', '.join(['%s'] * len(pr_ids))
+        
+        cursor.execute(f"""
+            SELECT pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, pr.state,
+                   pr.created_at, pr.updated_at, pr.additions, pr.deletions, pr.files_changed,
+                   (SELECT COUNT(*) FROM pr_comments c WHERE c.pr_id = pr.id) +
+                   (SELECT COUNT(*) FROM pr_reviews r WHERE r.pr_id = pr.id) AS discussion,
+                   (SELECT MAX(created_at) FROM ai_pr_reviews a WHERE a.pr_id = pr.id) AS last_reviewed_at,
+                   NOW() AS now
+            FROM pull_requests pr
+            WHERE pr.id IN ({placeholders})
+        """, tuple(pr_ids))
+        for row in cursor.fetchall():
+            candidates[row['id']] = dict(row, patches=[])
+        
+        cursor.execute(f"""
+            SELECT p.pr_id, p.filename, p.status, p.additions, p.deletions,
+                   CHAR_LENGTH(p.patch) AS chars, h.tokens
+            FROM pr_patches p
+            LEFT JOIN (
+                SELECT pr_id, filename, SUM(tokens) AS tokens
+                FROM pr_hunks
+                WHERE pr_id IN ({placeholders})
+                GROUP BY pr_id, filename
+            ) h ON h.pr_id = p.pr_id AND h.filename = p.filename
+            WHERE p.pr_id IN ({placeholders})
+        """, tuple(pr_ids) * 2)
+        for row in cursor.fetchall():
+            candidates[row.pop('pr_id')]['patches'].append(row)
         
-        # Insert the main PR review
-        cursor.execute("""
-            INSERT INTO ai_pr_reviews 
-            (pr_id, summary, full_review, created_at) 
-            VALUES (%s, %s, %s, NOW())
-        """, (pr_id, summary, full_review))
+        cursor.close()
         
-        review_id = cursor.lastrowid
+    except Error as e:
+        logger.error(f"Error querying review candidates: {e}")
+    
+    return candidates
+
+def _group_by_pr(rows, pr_ids):
+    """Group rows by their ``pr_id`` column; every id in ``pr_ids`` gets a list."""
+    grouped = {pr_id: [] for pr_id in pr_ids}
+    for row in rows:
+        grouped[row.pop('pr_id')].append(row)
+    return grouped
+
+def get_patches_for_prs(connection, pr_ids):
+    """Get the file patches of several PRs with one query, keyed by PR id; raises on database errors."""
+    patches = []
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
         
-        # Insert individual file reviews if provided
-        if file_reviews and isinstance(file_reviews, list):
-            for file_review in file_reviews:
-                if file_review.get('content') and file_review.get('filename'):
-                    cursor.execute("""
-                        INSERT INTO ai_file_reviews
-                        (review_id, pr_id, filename, content, created_at)
-                        VALUES (%s, %s, %s, %s, NOW())
-                    """, (review_id, pr_id, file_review['filename'], file_review['content']))
+        query = f"""
+            SELECT pr_id, path, patch, filename, status, additions, deletions
+            FROM pr_patches
+            WHERE pr_id IN ({', '.join(['%s'] * len(pr_ids))})
+            ORDER BY pr_id, path
+        """
         
-        connection.commit()
+        cursor.execute(query, tuple(pr_ids))
+        patches = cursor.fetchall()
         
-        logger.info(f"Stored review for PR #{pr_number} in {repo_owner}/{repo_name}, review ID: {review_id}")
-        return review_id
+        cursor.close()
         
     except Error as e:
-        logger.error(f"Error storing review in database: {e}")
-        return None
+        logger.error(f"Error querying PR patches: {e}")
+        raise
+    
+    return _group_by_pr(patches, pr_ids)
 
-def update_review_status(connection, pr_id):
-    """Mark a PR as reviewed in the database."""
+def get_comments_for_prs(connection, pr_ids):
+    """Get the comments of several PRs with one query, keyed by PR id; raises on database errors."""
+    comments = []
+    
     try:
-        cursor = connection.cursor()
+        cursor = connection.cursor(dictionary=True)
         
-        # Update the PR's last_processed_time
-        query = """
-            UPDATE pull_requests
-            SET last_processed_time = NOW()
-            WHERE id = %s
+        query = f"""
+            SELECT pr_id, id, body, created_at, user_login, path, position
+            FROM pr_comments
+            WHERE pr_id IN ({', '.join(['%s'] * len(pr_ids))})
+            ORDER BY pr_id, created_at ASC
         """
         
-        cursor.execute(query, (pr_id,))
-        connection.commit()
+        cursor.execute(query, tuple(pr_ids))
+        comments = cursor.fetchall()
         
         cursor.close()
-        return True
         
     except Error as e:
-        logger.error(f"Error updating PR review status: {e}")
-        return False
+        logger.error(f"Error querying PR comments: {e}")
+        raise
+    
+    return _group_by_pr(comments, pr_ids)
+
+def get_previous_reviews_for_prs(connection, pr_ids):
+    """Get the latest AI review of several PRs and the patches it was based on, keyed by PR id.
+    
+    PRs never reviewed are missing from the result. A review stored before
+    reviewed patches were recorded has no files, so it is redone in full.
+    Database errors are raised, an empty result would look like no history.
+    """
+    previous = {}
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        
+        cursor.execute(f"""
+            SELECT r.pr_id, r.id, r.summary, r.summary_hash
+            FROM ai_pr_reviews r
+            JOIN (
+                SELECT MAX(id) AS id
+                FROM ai_pr_reviews
+                WHERE pr_id IN ({', '.join(['%s'] * len(pr_ids))})
+                GROUP BY pr_id
+            ) latest ON latest.id = r.id
+        """, tuple(pr_ids))
+        
+        by_review = {}
+        for row in cursor.fetchall():
+            previous[row['pr_id']] = {'summary': row['summary'], 'summary_hash': row['summary_hash'], 'files': {}}
+            by_review[row['id']] = previous[row['pr_id']]
+        
+        if by_review:
+            cursor.execute(f"""
+                SELECT review_id, filename, patch_hash, hunk_hashes, finding
+                FROM ai_reviewed_patches
+                WHERE review_id IN ({', '.join(['%s'] * len(by_review))})
+            """, tuple(by_review))
+            
+            for row in cursor.fetchall():
+                by_review[row['review_id']]['files'][row['filename']] = {
+                    'patch_hash': row['patch_hash'],
+                    'hunks': set(json.loads(row['hunk_hashes'])),
+                    'finding': row['finding']
+                }
+        
+        cursor.close()
+        
+    except Error as e:
+        logger.error(f"Error querying previous reviews: {e}")
+        raise
+    
+    return previous
+
+def load_review_inputs(connection, pr_ids):
+    """Load everything needed to review a batch of PRs, one query per table; raises on database errors."""
+    try:
+        patches = get_patches_for_prs(connection, pr_ids)
+        comments = get_comments_for_prs(connection, pr_ids)
+        previous = get_previous_reviews_for_prs(connection, pr_ids)
+    except Error:
+        connection.rollback()
+        raise
+    
+    # End the read transaction so the next batch sees new data
+    connection.commit()
+    return patches, comments, previous
+
+# Bump whenever a prompt template changes so cached responses are not reused
+PROMPT_VERSION = 2
+
+class ReviewCache:
+    """On-disk cache of LLM responses.
+    
+    Entries are keyed by the request kind, model, temperature, prompt
+    version, filename and a hash of the reviewed content, and stored as
+    small JSON files in a two-level fan-out directory. Entries older than
+    ``max_age`` seconds are ignored; ``evict`` also trims the cache to
+    ``max_bytes``, least recently used first. Only successful responses
+    are ever stored. A key looked up again before its response is stored,
+    as a small patch is when it ends up reviewed on its own, counts as one
+    miss.
+    """
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.missed = set()
+    
+    def _miss(self, key):
+        if key not in self.missed:
+            self.missed.add(key)
+            self.misses += 1
+    
+    def key(self, kind, model, temperature, filename, content):
+        """Return the cache key for one request."""
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        fields = [kind, model, temperature, PROMPT_VERSION, filename, content_hash]
+        return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+    
+    def get(self, key):
+        """Return the cached response for ``key``, or None on a miss."""
+        path = self._path(key)
+        
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self._miss(key)
+                return None
+            
+            with open(path, 'r') as f:
+                value = json.load(f)['response']
+            
+            # Touch the entry so eviction keeps recently used responses
+            os.utime(path)
+            self.hits += 1
+            return value
+        
+        except (OSError, ValueError, KeyError):
+            self._miss(key)
+            return None
+    
+    def put(self, key, value):
+        """Store a response, replacing the entry atomically."""
+        path = self._path(key)
+        self.missed.discard(key)
+        
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'created_at': time.time(), 'response': value}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write review cache entry: {e}")
+    
+    def evict(self):
+        """Delete expired entries, then the least recently used ones beyond ``max_bytes``."""
+        entries = []
+        now = time.time()
+        
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                
+                if now - stat.st_mtime > self.max_age or name.endswith(".tmp"):
+                    os.unlink(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.unlink(path)
+            total -= size
+            removed += 1
+        
+        if removed:
+            logger.info(f"Evicted {removed} review cache entries to stay under {self.max_bytes // (1024 * 1024)} MB")
+    
+    def summary(self):
+        """Return the hit / miss counts of this run."""
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+class TokenBucket:
+    """Allows ``rate`` units per minute, refilled continuously; a rate of 0 means unlimited."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.level = float(rate)
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.rate, self.level + (now - self.updated) * self.rate / 60)
+        self.updated = now
+    
+    def delay(self, amount):
+        """Seconds until ``amount`` units are available."""
+        if not self.rate:
+            return 0.0
+        
+        self._refill()
+        # A request larger than the whole bucket goes through once it is full
+        amount = min(amount, self.rate)
+        return max(0.0, (amount - self.level) * 60 / self.rate)
+    
+    def take(self, amount):
+        if self.rate:
+            self._refill()
+            self.level -= min(amount, self.rate)
+
+class AdaptiveLimit:
+    """Concurrency limit adjusted AIMD-style from rate-limit responses.
+    
+    Each successful request raises the limit by ``1 / limit``, about one
+    slot per round of requests, up to ``maximum``. A rate-limited request
+    halves it, at most once per ``decrease_interval`` seconds, because the
+    requests that were in flight together are all answered from the same
+    exhausted quota.
+    """
+    def __init__(self, maximum, decrease_interval=2.0):
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.inflight = 0
+        self.decrease_interval = decrease_interval
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+    
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+    
+    async def release(self, throttled=False, succeeded=False):
+        async with self.condition:
+            self.inflight -= 1
+            
+            if throttled:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.decrease_interval:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = now
+                    logger.warning(f"Rate limited, reducing LLM concurrency to {int(self.limit)}")
+            elif succeeded:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            
+            self.condition.notify_all()
+
+class CircuitBreaker:
+    """Holds requests back while the API keeps failing.
+    
+    After ``threshold`` consecutive failed requests the breaker opens for
+    ``cooldown`` seconds. Then one probe request is let through: success
+    closes the breaker, failure reopens it for twice as long, up to ten
+    times the cooldown. Rate limiting is not counted as a failure, the
+    adaptive limit deals with it.
+    """
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.current_cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probing = False
+        self.opens = 0
+    
+    @property
+    def is_open(self):
+        return self.threshold > 0 and self.failures >= self.threshold
+    
+    async def admit(self):
+        """Wait until a request may be sent; False if the breaker stayed open for a whole cooldown."""
+        deadline = time.monotonic() + self.current_cooldown
+        while self.is_open:
+            now = time.monotonic()
+            if now >= self.opened_until and not self.probing:
+                self.probing = True
+                return True
+            if now >= deadline:
+                return False
+            await asyncio.sleep(min(max(self.opened_until - now, 0.05), deadline - now, 1.0))
+        return True
+    
+    def record(self, failed):
+        """Record the outcome of a request: True failed, False succeeded, None neither."""
+        probing, self.probing = self.probing, False
+        
+        if failed is None:
+            return
+        
+        if not failed:
+            if self.is_open:
+                logger.info("LLM API recovered, closing the circuit breaker")
+            self.failures = 0
+            self.current_cooldown = self.cooldown
+            return
+        
+        self.failures += 1
+        if probing or self.failures == self.threshold:
+            if probing:
+                self.current_cooldown = min(self.current_cooldown * 2, self.cooldown * 10)
+            self.opened_until = time.monotonic() + self.current_cooldown
+            self.opens += 1
+            logger.warning(f"LLM API failing, opening the circuit breaker for {self.current_cooldown:.0f}s")
+
+class LLMUnavailableError(Exception):
+    """The API could not be reached within the client's retry budget."""
+
+# Transient API errors worth retrying; anything else fails the request at once
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    asyncio.TimeoutError,
+    aiohttp.ClientError,
+)
+
+def retry_after(error):
+    """Seconds the API asked us to wait before retrying, if it said so."""
+    headers = getattr(error, 'headers', None) or {}
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(name) or headers.get(name.title())
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    return None
+
+def is_retryable(error):
+    if isinstance(error, openai.error.RateLimitError):
+        # An exhausted account quota does not come back by waiting
+        body = error.json_body if isinstance(error.json_body, dict) else {}
+        return (body.get('error') or {}).get('code') != 'insufficient_quota'
+    if type(error) is openai.error.APIError:
+        return error.http_status is None or error.http_status >= 500
+    return isinstance(error, RETRYABLE_ERRORS)
+
+class LLMClient:
+    """Async chat completion client shared by all reviews of a run.
+    
+    Every request holds a slot of the per-PR semaphore passed by the
+    caller, so one large PR cannot take all of the API concurrency, and
+    then goes through the client's controls:
+    
+    * request and token buckets matching the account's RPM and TPM quota,
+    * an AIMD concurrency limit of at most ``max_concurrency``, cut on 429s,
+    * retries of transient errors with jittered exponential backoff, or
+      the delay the API asked for in ``Retry-After``,
+    * a circuit breaker that holds requests back while the API is down.
+    
+    A request that still fails raises, so the PR fails and its job is
+    retried instead of a partial review being stored.
+    """
+    def __init__(self, model, temperature=0.0, max_concurrency=8, cache=None, chunk_tokens=6000,
+                 rpm=0, tpm=0, max_retries=6, backoff_base=1.0, backoff_max=60.0,
+                 breaker_threshold=5, breaker_cooldown=30.0, request_timeout=120):
+        self.model = model
+        self.temperature = temperature
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.bucket_lock = asyncio.Lock()
+        self.paused_until = 0.0
+        self.limit = AdaptiveLimit(max_concurrency)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.stats = Counter()
+    
+    @classmethod
+    def from_config(cls, config, cache=None):
+        return cls(
+            config.openai_model,
+            config.openai_temperature,
+            config.llm_max_concurrency,
+            cache,
+            config.review_chunk_tokens,
+            rpm=config.llm_rpm,
+            tpm=config.llm_tpm,
+            max_retries=config.llm_max_retries,
+            backoff_base=config.llm_backoff_base,
+            backoff_max=config.llm_backoff_max,
+            breaker_threshold=config.llm_breaker_threshold,
+            breaker_cooldown=config.llm_breaker_cooldown,
+            request_timeout=config.llm_request_timeout
+        )
+    
+    def cache_key(self, kind, filename, content):
+        """Return the cache key for a request, or None without a cache."""
+        if self.cache is None:
+            return None
+        return self.cache.key(kind, self.model, self.temperature, filename, content)
+    
+    def summary(self):
+        stats = self.stats
+        return (f"{stats['succeeded']} requests succeeded, {stats['failed']} failed, "
+                f"{stats['retries']} retries, {stats['throttled']} rate limited, "
+                f"{self.breaker.opens} circuit breaker openings, concurrency limit {int(self.limit.limit)}")
+    
+    async def throttle(self, tokens):
+        """Wait for a global pause to end and for quota in both buckets, first come first served."""
+        async with self.bucket_lock:
+            while True:
+                wait = max(self.paused_until - time.monotonic(), self.requests.delay(1), self.tokens.delay(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            
+            self.requests.take(1)
+            self.tokens.take(tokens)
+    
+    def backoff(self, attempt, error):
+        """Delay before retry ``attempt``; a rate limit with Retry-After pauses every request."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        requested = retry_after(error)
+        
+        if requested is not None:
+            delay = requested + random.uniform(0, self.backoff_base)
+            if isinstance(error, openai.error.RateLimitError):
+                self.paused_until = max(self.paused_until, time.monotonic() + requested)
+        
+        return delay
+    
+    async def send(self, messages, max_tokens, tokens):
+        """Send one request through the buckets, the adaptive limit and the breaker."""
+        if not await self.breaker.admit():
+            raise LLMUnavailableError("LLM API circuit breaker is open")
+        
+        failed = None
+        try:
+            await self.throttle(tokens)
+            await self.limit.acquire()
+            throttled = succeeded = False
+            
+            try:
+                response = await openai.ChatCompletion.acreate(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=max_tokens,
+                    request_timeout=self.request_timeout
+                )
+                succeeded, failed = True, False
+                return response
+            except openai.error.RateLimitError:
+                throttled = True
+                raise
+            except Exception as e:
+                failed = True if is_retryable(e) else None
+                raise
+            finally:
+                await self.limit.release(throttled, succeeded)
+        finally:
+            self.breaker.record(failed)
+    
+    async def complete(self, system_prompt, prompt, max_tokens, pr_semaphore=None, cache_key=None):
+        """Return the stripped text of a single chat completion.
+        
+        With ``cache_key`` the response cache is consulted first, and a
+        successful response is stored in it. Transient errors are retried
+        up to ``max_retries`` times; the last error is raised.
+        """
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        # The API counts max_tokens against the token quota up front
+        tokens = count_tokens(system_prompt, self.model) + count_tokens(prompt, self.model) + max_tokens
+        
+        async with contextlib.AsyncExitStack() as stack:
+            if pr_semaphore is not None:
+                await stack.enter_async_context(pr_semaphore)
+            
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self.send(messages, max_tokens, tokens)
+                    break
+                except Exception as e:
+                    if isinstance(e, openai.error.RateLimitError):
+                        self.stats['throttled'] += 1
+                    
+                    # A request that waited out a whole breaker cooldown is not retried
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        self.stats['failed'] += 1
+                        raise
+                    
+                    self.stats['retries'] += 1
+                    delay = self.backoff(attempt, e)
+                    logger.warning(f"LLM request failed ({type(e).__name__}: {e}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        
+        self.stats['succeeded'] += 1
+        content = response.choices[0].message['content'].strip()
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        
+        return content
+
+def build_summary_prompt(title, patches):
+    """Build the PR summary prompt."""
+    prompt = f"""
+        ## GitHub PR Title
+        `{title}`
+        
+        ## Changes Overview
+        The PR changes {len(patches)} files with the following modifications:
+        
+        """
+    
+    # Add a summary of each file's changes
+    for patch in patches[:5]:  # Limit to first 5 files to avoid token limits
+        prompt += f"- {patch['filename']} ({patch['status']}): {patch['additions']} additions, {patch['deletions']} deletions\n"
+    
+    if len(patches) > 5:
+        prompt += f"- ... and {len(patches) - 5} more files\n"
+    
+    prompt += """
+        ## Instructions
+        Please provide a concise summary of this PR. Your summary should:
+        1. Explain the purpose of the changes
+        2. Note significant modifications
+        3. Identify potential concerns or areas for improvement
+        4. Keep the response under 250 words
+        """
+    
+    return prompt
+
+def build_file_review_prompt(filename, patch_content, file_status, part=None):
+    """Build the review prompt for a single file's diff, or for ``part`` (index, count) of it."""
+    part_note = ""
+    if part:
+        part_note = f"""
+        ## Part: {part[0]} of {part[1]}
+        The diff of this file is too large for one request and was split on hunk boundaries. Review only this part.
+        """
+    
+    return f"""
+        ## File: {filename}
+        ## Status: {file_status}
+        {part_note}
+        ## Diff
+        ```diff
+        {patch_content}
+        ```
+        
+        ## Instructions
+        Please review this code diff and provide specific, actionable feedback. Focus on:
+        
+        1. Bugs or logical errors
+        2. Performance issues
+        3. Security vulnerabilities
+        4. Code style and best practices
+        5. Potential edge cases
+        
+        Format your response with these rules:
+        - If you find issues, start with a brief overall assessment, then list specific issues with line numbers.
+        - If the code looks good without issues, respond with "LGTM! (Looks Good To Me)"
+        - Be concise and specific.
+        """
+
+def count_tokens(text, model):
+    """Count the tokens of ``text`` for ``model``.
+    
+    Uses tiktoken when it is installed and its encoding can be loaded,
+    otherwise estimates about four characters per token.
+    """
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+_encodings = {}
+
+def _encoding_for(model):
+    if tiktoken is None:
+        return None
+    
+    if model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The encoding files are downloaded on first use
+            logger.warning(f"Could not load tokenizer for {model}, estimating token counts: {e}")
+            _encodings[model] = None
+    
+    return _encodings[model]
+
+async def summarize_pr(llm, title, patches, pr_semaphore=None):
+    """Generate a summary of the PR using OpenAI; raises if the request fails."""
+    prompt = build_summary_prompt(title, patches)
+    summary = await llm.complete(
+        "You are a helpful AI code reviewer.",
+        prompt,
+        max_tokens=500,
+        pr_semaphore=pr_semaphore,
+        cache_key=llm.cache_key("summary", "", prompt)
+    )
+    
+    logger.info("Generated PR summary")
+    return summary
+
+async def gather_or_cancel(*aws):
+    """Like ``asyncio.gather``, but cancels the rest once one fails.
+    
+    A PR whose review failed is retried as a whole, so its outstanding
+    requests would only use up quota.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def review_file(llm, filename, patch_content, file_status, pr_semaphore=None):
+    """Review a single file's changes using OpenAI.
+    
+    A patch over the client's ``chunk_tokens`` budget is split into chunks
+    on hunk boundaries. The chunks are reviewed concurrently and their
+    findings merged into one review. Raises if a request fails.
+    """
+    if not is_reviewable(patch_content):
+        return None
+    
+    chunks = chunk_patch(patch_content, llm.chunk_tokens, llm.model)
+    
+    if len(chunks) == 1:
+        review = await llm.complete(
+            "You are a helpful AI code reviewer with expertise in multiple programming languages.",
+            build_file_review_prompt(filename, patch_content, file_status),
+            max_tokens=1000,
+            pr_semaphore=pr_semaphore,
+            cache_key=llm.cache_key("file", filename, f"{file_status}\n{patch_content}")
+        )
+        
+        logger.info(f"Generated review for {filename}")
+        return finding(review)
+    
+    # Map: review every chunk concurrently
+    logger.info(f"Reviewing {filename} in {len(chunks)} chunks")
+    reviews = await gather_or_cancel(*(
+        llm.complete(
+            "You are a helpful AI code reviewer with expertise in multiple programming languages.",
+            build_file_review_prompt(filename, chunk, file_status, (index, len(chunks))),
+            max_tokens=1000,
+            pr_semaphore=pr_semaphore,
+            cache_key=llm.cache_key("chunk", filename, f"{file_status}\n{index}/{len(chunks)}\n{chunk}")
+        )
+        for index, chunk in enumerate(chunks, 1)
+    ))
+    
+    # Reduce: merge the chunks' findings into one review
+    findings = [review for review in map(finding, reviews) if review]
+    logger.info(f"Generated review for {filename} from {len(chunks)} chunks")
+    
+    if len(findings) <= 1:
+        return findings[0] if findings else None
+    
+    return await merge_findings(llm, filename, findings, pr_semaphore)
+
+HUNK_HEADER = re.compile(r'^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+def parse_hunks(patch_content):
+    """Split a unified diff into hunks, each starting with its ``@@`` header.
+    
+    Lines before the first hunk header are kept with the first hunk.
+    """
+    hunks = []
+    current = []
+    seen_header = False
+    
+    for line in patch_content.splitlines(keepends=True):
+        if HUNK_HEADER.match(line):
+            if seen_header:
+                hunks.append(''.join(current))
+                current = []
+            seen_header = True
+        current.append(line)
+    
+    if current:
+        hunks.append(''.join(current))
+    
+    return hunks
+
+HUNK_RANGES = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@', re.MULTILINE)
+
+def hunk_hash(hunk):
+    """SHA-256 of a hunk without its line numbers, which shift when earlier hunks change."""
+    body = HUNK_HEADER.sub('@@', hunk, count=1).rstrip('\n')
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+def hunk_key(hunk):
+    """Short form of ``hunk_hash``, as recorded in ai_reviewed_patches."""
+    return hunk_hash(hunk)[:16]
+
+def index_hunks(patch_content, model):
+    """Describe every hunk of a patch as a pr_hunks row.
+    
+    Positions are line offsets into the patch with the first hunk header
+    at 0, which is how GitHub numbers the positions of review comments.
+    Omitted range lengths in a header mean one line.
+    """
+    rows = []
+    position = 0
+    
+    for index, hunk in enumerate(parse_hunks(patch_content)):
+        lines = hunk.splitlines()
+        match = HUNK_RANGES.search(hunk)
+        ranges = [int(value) if value is not None else 1 for value in match.groups()] if match else [0, 0, 0, 0]
+        # Only count the lines below the header, not a file header before it
+        body = lines[hunk[:match.start()].count('\n') + 1:] if match else lines
+        
+        rows.append({
+            'hunk_index': index,
+            'old_start': ranges[0],
+            'old_lines': ranges[1],
+            'new_start': ranges[2],
+            'new_lines': ranges[3],
+            'position_start': position,
+            'position_end': position + len(lines) - 1,
+            'additions': sum(1 for line in body if line.startswith('+')),
+            'deletions': sum(1 for line in body if line.startswith('-')),
+            'content_hash': hunk_hash(hunk),
+            'tokens': count_tokens(hunk, model),
+            'content': hunk
+        })
+        position += len(lines)
+    
+    return rows
+
+def changed_hunks(patch_content, earlier_hunks):
+    """Return the hunks of a patch that were not in the earlier reviewed version, as one diff."""
+    changed = [hunk for hunk in parse_hunks(patch_content) if hunk_key(hunk) not in earlier_hunks]
+    return ''.join(hunk if hunk.endswith('\n') else hunk + '\n' for hunk in changed)
+
+def split_hunk(hunk, max_tokens, model):
+    """Split one oversized hunk on line boundaries, repeating its header on every piece."""
+    lines = hunk.splitlines(keepends=True)
+    header = ""
+    if lines and HUNK_HEADER.match(lines[0]):
+        header = lines.pop(0)
+    
+    continued = f"{header.rstrip()} (continued)\n" if header else ""
+    budget = max(1, max_tokens - count_tokens(continued or header, model))
+    pieces = []
+    current, current_tokens = [header] if header else [], 0
+    
+    for line in lines:
+        tokens = count_tokens(line, model)
+        
+        # A single line over the budget (minified code) is cut by characters
+        while tokens > budget:
+            cut = max(1, len(line) * budget // tokens)
+            if current_tokens:
+                pieces.append(''.join(current))
+                current, current_tokens = [continued], 0
+            pieces.append(''.join(current) + line[:cut] + "\n")
+            current = [continued]
+            line = line[cut:]
+            tokens = count_tokens(line, model)
+        
+        if not line:
+            continue
+        
+        if current_tokens and current_tokens + tokens > budget:
+            pieces.append(''.join(current))
+            current, current_tokens = [continued], 0
+        
+        current.append(line)
+        current_tokens += tokens
+    
+    if current_tokens:
+        pieces.append(''.join(current))
+    
+    return pieces
+
+def chunk_patch(patch_content, max_tokens, model):
+    """Group a patch's hunks, in order, into chunks of at most ``max_tokens`` tokens."""
+    if count_tokens(patch_content, model) <= max_tokens:
+        return [patch_content]
+    
+    chunks = []
+    current, current_tokens = [], 0
+    
+    for hunk in parse_hunks(patch_content):
+        tokens = count_tokens(hunk, model)
+        if tokens <= max_tokens:
+            pieces = [(hunk, tokens)]
+        else:
+            pieces = [(piece, count_tokens(piece, model)) for piece in split_hunk(hunk, max_tokens, model)]
+        
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(''.join(current))
+                current, current_tokens = [], 0
+            
+            current.append(piece)
+            current_tokens += piece_tokens
+    
+    if current:
+        chunks.append(''.join(current))
+    
+    return chunks
+
+def build_merge_prompt(filename, findings):
+    """Build the prompt merging the reviews of a file's chunks into one review."""
+    parts = "\n".join(f"### Part {index}\n{review}\n" for index, review in enumerate(findings, 1))
+    
+    return f"""
+        ## File: {filename}
+        
+        ## Partial Reviews
+        The diff of this file was reviewed in consecutive parts. These are the reviews of the parts:
+        
+        {parts}
+        
+        ## Instructions
+        Merge these into a single review of the whole file:
+        - Start with a brief overall assessment, then list the specific issues with line numbers.
+        - Remove duplicate issues and keep every distinct one.
+        - Be concise and specific.
+        """
+
+def build_incremental_review_prompt(filename, changed_patch, file_status, earlier_review):
+    """Build the prompt re-reviewing the changed hunks of a file against its earlier review."""
+    return f"""
+        ## File: {filename}
+        ## Status: {file_status}
+        
+        ## Earlier Review
+        This file was reviewed before. This is the review of the previous version:
+        
+        {earlier_review}
+        
+        ## New or Modified Hunks
+        Only these hunks changed since then:
+        ```diff
+        {changed_patch}
+        ```
+        
+        ## Instructions
+        Review the new or modified hunks and update the earlier review of the file:
+        - Keep the earlier issues that concern code outside these hunks.
+        - Drop the earlier issues these hunks resolve.
+        - Add the bugs, performance issues, security vulnerabilities, style problems and edge cases the hunks introduce.
+        - Start with a brief overall assessment, then list the specific issues with line numbers.
+        - If no issues remain, respond with "LGTM! (Looks Good To Me)"
+        - Be concise and specific.
+        """
+
+async def review_file_incremental(llm, patch, changed_patch, earlier_review, pr_semaphore=None):
+    """Update a file's earlier review from the hunks changed since; returns the new finding.
+    
+    If the changed hunks do not fit in one request the file is reviewed
+    in full instead, which then costs about as much anyway.
+    """
+    if count_tokens(changed_patch, llm.model) > llm.chunk_tokens:
+        return await review_file(llm, patch['filename'], patch['patch'], patch['status'], pr_semaphore)
+    
+    review = await llm.complete(
+        "You are a helpful AI code reviewer with expertise in multiple programming languages.",
+        build_incremental_review_prompt(patch['filename'], changed_patch, patch['status'], earlier_review),
+        max_tokens=1000,
+        pr_semaphore=pr_semaphore,
+        cache_key=llm.cache_key("incremental", patch['filename'], f"{patch['status']}\n{earlier_review}\n{changed_patch}")
+    )
+    
+    logger.info(f"Generated incremental review for {patch['filename']}")
+    return finding(review)
+
+async def merge_findings(llm, filename, findings, pr_semaphore=None):
+    """Merge per-chunk findings into one file review.
+    
+    The reviews are concatenated if the merge request fails.
+    """
+    try:
+        merged = await llm.complete(
+            "You are a helpful AI code reviewer with expertise in multiple programming languages.",
+            build_merge_prompt(filename, findings),
+            max_tokens=1500,
+            pr_semaphore=pr_semaphore,
+            cache_key=llm.cache_key("merge", filename, "\n\n".join(findings))
+        )
+        return finding(merged)
+    
+    except Exception as e:
+        logger.warning(f"Could not merge the chunk reviews of {filename}, concatenating them: {e}")
+        return "\n\n".join(f"#### Part {index}\n{review}" for index, review in enumerate(findings, 1))
+
+def is_reviewable(patch_content):
+    """Whether a patch has enough content to be worth a review."""
+    return bool(patch_content) and len(patch_content) >= 10
+
+# Generator headers, matched against the text of the comments that open a
+# file: the Go convention (also used by sqlc and protoc-gen-go), @generated
+# and the protoc banner
+GENERATED_MARKERS = re.compile(
+    r"^Code generated .* DO NOT EDIT\.$|@generated\b|"
+    r"^Generated by the protocol buffer compiler\.\s+DO NOT EDIT!"
+)
+# A comment line and its text, without the comment delimiters
+GENERATED_COMMENT = re.compile(r"^\s*(?://+|#+|/\*+|\*+|--|<!--|;+)\s*(.*?)\s*(?:\*/|-->)?\s*$")
+GENERATED_SCAN_LINES = 15
+FIRST_HUNK_START = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)')
+
+class PatchFilter:
+    """Rule-based stage deciding which patches are sent to the LLM.
+    
+    Rules run in order: missing diff (binary files, pure renames), status,
+    path glob, size, generated-file header. Globs without a ``/`` match
+    the file name, the others the whole path; ``*`` also matches ``/``.
+    The header check only sees the top of the file when the first hunk
+    starts there, which is always the case for added files.
+    """
+    def __init__(self, globs=(), statuses=(), max_chars=0, max_lines=0, skip_generated=True):
+        self.globs = list(globs)
+        self.statuses = {status.lower() for status in statuses}
+        self.max_chars = max_chars
+        self.max_lines = max_lines
+        self.skip_generated = skip_generated
+    
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.review_skip_globs,
+            config.review_skip_statuses,
+            config.review_max_patch_chars,
+            config.review_max_patch_lines,
+            config.review_skip_generated
+        )
+    
+    def _matching_glob(self, filename):
+        name = filename.rsplit('/', 1)[-1]
+        for glob in self.globs:
+            if fnmatch.fnmatch(filename if '/' in glob else name, glob):
+                return glob
+        return None
+    
+    def _is_generated(self, patch_content):
+        match = FIRST_HUNK_START.match(patch_content)
+        if match is None or int(match.group(1)) > 1:
+            return False
+        
+        lines = patch_content.split('\n', GENERATED_SCAN_LINES + 1)[1:GENERATED_SCAN_LINES + 1]
+        for line in lines:
+            if line.startswith('-'):
+                continue
+            
+            # Only the comments before the first line of code count as a header
+            text = line[1:]
+            if not text.strip():
+                continue
+            comment = GENERATED_COMMENT.match(text)
+            if comment is None:
+                return False
+            if GENERATED_MARKERS.search(comment.group(1)):
+                return True
+        
+        return False
+    
+    def check(self, patch):
+        """Return why ``patch`` should be skipped, or None to review it."""
+        content = patch['patch'] or ''
+        
+        if not content.strip():
+            return "no diff (binary file or rename only)"
+        
+        reason = self.check_listing(patch, len(content))
+        if reason:
+            return reason
+        
+        if self.skip_generated and self._is_generated(content):
+            return "generated file header"
+        
+        return None
+    
+    def check_listing(self, patch, chars):
+        """Apply the rules that do not need the diff text, for a diff of ``chars`` characters."""
+        if patch['status'] and patch['status'].lower() in self.statuses:
+            return f"status {patch['status']}"
+        
+        glob = self._matching_glob(patch['filename'])
+        if glob:
+            return f"matches {glob}"
+        
+        if self.max_chars and chars > self.max_chars:
+            return f"diff larger than {self.max_chars} characters"
+        
+        lines = (patch.get('additions') or 0) + (patch.get('deletions') or 0)
+        if self.max_lines and lines > self.max_lines:
+            return f"more than {self.max_lines} changed lines"
+        
+        return None
+    
+    def split(self, patches):
+        """Split ``patches`` into those to review and ``(patch, reason)`` pairs to skip."""
+        reviewable, skipped = [], []
+        for patch in patches:
+            reason = self.check(patch)
+            if reason:
+                skipped.append((patch, reason))
+            else:
+                reviewable.append(patch)
+        return reviewable, skipped
+
+def estimate_requests(tokens, config):
+    """Roughly how many review requests patches of ``tokens`` tokens would have taken."""
+    small = [count for count in tokens if config.review_batch_tokens and count <= config.small_patch_tokens]
+    requests = -(-sum(small) // config.review_batch_tokens) if small else 0
+    
+    for count in tokens:
+        if not (config.review_batch_tokens and count <= config.small_patch_tokens):
+            chunks = max(1, -(-count // config.review_chunk_tokens))
+            # Chunked files take one more request to merge the findings
+            requests += chunks + 1 if chunks > 1 else 1
+    
+    return requests
+
+def finding(review):
+    """Map a raw review response to its finding, None when the file looks good."""
+    if review.startswith("LGTM"):
+        return None
+    return review
+
+def build_batch_review_prompt(patches):
+    """Build one review prompt covering several small file diffs."""
+    prompt = """
+        ## Files
+        Review each of the following file diffs independently.
+        
+        """
+    
+    for patch in patches:
+        prompt += f"""
+        ### File: {patch['filename']}
+        ### Status: {patch['status']}
+        ```diff
+        {patch['patch']}
+        ```
+        """
+    
+    prompt += """
+        ## Instructions
+        For each file, provide specific, actionable feedback. Focus on:
+        
+        1. Bugs or logical errors
+        2. Performance issues
+        3. Security vulnerabilities
+        4. Code style and best practices
+        5. Potential edge cases
+        
+        Respond with only a JSON object of this form, with one entry per file:
+        {"files": [{"filename": "<file name as given>", "review": "<review>"}]}
+        - If a file has issues, its review starts with a brief overall assessment, then lists specific issues with line numbers.
+        - If a file looks good without issues, its review is "LGTM! (Looks Good To Me)"
+        - Be concise and specific.
+        """
+    
+    return prompt
+
+def parse_batch_response(response, filenames):
+    """Split a batched review response into per-file reviews, in ``filenames`` order.
+    
+    Returns None if the response is not the expected JSON or misses a file.
+    """
+    start, end = response.find('{'), response.rfind('}')
+    if start < 0 or end < start:
+        return None
+    
+    try:
+        data = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+    
+    reviews = {}
+    for item in data.get('files', []) if isinstance(data, dict) else []:
+        if isinstance(item, dict) and isinstance(item.get('filename'), str) and isinstance(item.get('review'), str):
+            reviews[item['filename']] = item['review'].strip()
+    
+    if any(not reviews.get(filename) for filename in filenames):
+        return None
+    
+    return [reviews[filename] for filename in filenames]
+
+def pack_patches(patches, token_counts, batch_tokens, max_files):
+    """Greedily pack patches, in order, into batches of at most ``batch_tokens`` tokens."""
+    batches = []
+    current, current_tokens = [], 0
+    
+    for patch, tokens in zip(patches, token_counts):
+        full = current and (current_tokens + tokens > batch_tokens or len(current) >= max_files)
+        duplicate = any(other['filename'] == patch['filename'] for other in current)
+        
+        if full or duplicate:
+            batches.append(current)
+            current, current_tokens = [], 0
+        
+        current.append(patch)
+        current_tokens += tokens
+    
+    if current:
+        batches.append(current)
+    
+    return batches
+
+async def review_file_batch(llm, patches, pr_semaphore=None):
+    """Review several small patches with one request.
+    
+    Falls back to one request per file if the API rejects the request or
+    its response cannot be split per file. Other failures are raised,
+    retrying them file by file would only add load to a struggling API.
+    """
+    filenames = [patch['filename'] for patch in patches]
+    
+    try:
+        response = await llm.complete(
+            "You are a helpful AI code reviewer with expertise in multiple programming languages.",
+            build_batch_review_prompt(patches),
+            max_tokens=min(4000, 600 + 400 * len(patches)),
+            pr_semaphore=pr_semaphore
+        )
+        reviews = parse_batch_response(response, filenames)
+    except openai.error.InvalidRequestError as e:
+        logger.warning(f"Batched review of {len(patches)} files was rejected: {e}")
+        reviews = None
+    
+    if reviews is None:
+        logger.warning(f"Falling back to single-file reviews for {', '.join(filenames)}")
+        return await gather_or_cancel(*(
+            review_file(llm, patch['filename'], patch['patch'], patch['status'], pr_semaphore) for patch in patches
+        ))
+    
+    logger.info(f"Generated batched review for {len(patches)} files")
+    
+    results = []
+    for patch, review in zip(patches, reviews):
+        # Cache per file, so a later single-file or batched review can reuse it
+        key = llm.cache_key("file", patch['filename'], f"{patch['status']}\n{patch['patch']}")
+        if key is not None:
+            llm.cache.put(key, review)
+        results.append(finding(review))
+    
+    return results
+
+async def review_patches(llm, patches, config, pr_semaphore=None, on_review=None):
+    """Review every patch of a PR; returns findings in patch order (None for no issues).
+    
+    Patches of at most ``config.small_patch_tokens`` tokens that are not
+    cached are packed into shared requests of up to
+    ``config.review_batch_tokens`` tokens. Everything else is reviewed
+    one file per request. ``on_review`` is awaited with the
+    ``(patch, finding)`` pairs of every request as soon as it completes.
+    """
+    results = [None] * len(patches)
+    singles = []
+    small, small_indexes, small_tokens = [], [], []
+    
+    for index, patch in enumerate(patches):
+        if not is_reviewable(patch['patch']):
+            continue
+        
+        tokens = count_tokens(patch['patch'], llm.model) if config.review_batch_tokens else 0
+        if not config.review_batch_tokens or tokens > config.small_patch_tokens:
+            singles.append(index)
+            continue
+        
+        key = llm.cache_key("file", patch['filename'], f"{patch['status']}\n{patch['patch']}")
+        cached = llm.cache.get(key) if key is not None else None
+        if cached is not None:
+            results[index] = finding(cached)
+            continue
+        
+        small.append(patch)
+        small_indexes.append(index)
+        small_tokens.append(tokens)
+    
+    # Pack the small patches; a batch of one is just a single-file review
+    batches = []
+    position = 0
+    for batch in pack_patches(small, small_tokens, config.review_batch_tokens, config.review_batch_max_files):
+        indexes = small_indexes[position:position + len(batch)]
+        position += len(batch)
+        
+        if len(batch) == 1:
+            singles.extend(indexes)
+        else:
+            batches.append((indexes, batch))
+    
+    async def single(patch):
+        review = await review_file(llm, patch['filename'], patch['patch'], patch['status'], pr_semaphore)
+        if on_review:
+            await on_review([(patch, review)])
+        return review
+    
+    async def batched(batch):
+        reviews = await review_file_batch(llm, batch, pr_semaphore)
+        if on_review:
+            await on_review(list(zip(batch, reviews)))
+        return reviews
+    
+    outcomes = await gather_or_cancel(
+        *(single(patches[index]) for index in singles),
+        *(batched(batch) for _, batch in batches)
+    )
+    
+    for index, review in zip(singles, outcomes):
+        results[index] = review
+    
+    for (indexes, _), reviews in zip(batches, outcomes[len(singles):]):
+        for index, review in zip(indexes, reviews):
+            results[index] = review
+    
+    return results
+
+def patch_hash(patch):
+    """Hash of what a file review depends on, so saved progress is not reused for a changed patch."""
+    return hashlib.sha256(f"{patch['status']}\n{patch['patch'] or ''}".encode('utf-8')).hexdigest()
+
+def load_review_progress(connection, pr_id):
+    """Get the results an interrupted review of a PR saved, keyed by (kind, filename).
+    
+    Values are ``(content_hash, content)``; a None content is a file
+    reviewed without findings.
+    """
+    progress = {}
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        
+        cursor.execute("""
+            SELECT kind, filename, content_hash, content
+            FROM ai_file_review_progress
+            WHERE pr_id = %s
+        """, (pr_id,))
+        
+        for row in cursor.fetchall():
+            progress[(row['kind'], row['filename'])] = (row['content_hash'], row['content'])
+        
+        cursor.close()
+        # End the read transaction so later reads see fresh data
+        connection.commit()
+        
+    except Error as e:
+        logger.error(f"Error loading review progress: {e}")
+    
+    return progress
+
+def save_review_progress(connection, pr_id, results):
+    """Save finished results of a PR's review; ``results`` are (kind, filename, content_hash, content) tuples.
+    
+    Best effort: if saving fails the review goes on, it just cannot be
+    resumed from these results.
+    """
+    try:
+        cursor = connection.cursor()
+        
+        cursor.executemany("""
+            INSERT INTO ai_file_review_progress
+            (pr_id, kind, filename, content_hash, content, created_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                content_hash = VALUES(content_hash),
+                content = VALUES(content),
+                created_at = VALUES(created_at)
+        """, [(pr_id, kind, filename, content_hash, content) for kind, filename, content_hash, content in results])
+        
+        connection.commit()
+        cursor.close()
+        return True
+        
+    except Error as e:
+        logger.error(f"Error saving review progress: {e}")
+        connection.rollback()
+        return False
+
+def store_review(connection, pr_id, repo_owner, repo_name, pr_number, summary, full_review, file_reviews=None, skipped_files=None,
+                 reviewed_patches=None, summary_hash=None, lease_owner=None):
+    """Store a PR review in the database.
+    
+    The review, its file reviews, reviewed patches and skipped files, the
+    export outbox row and the removal of the PR's saved progress are one
+    transaction.
+    With ``lease_owner`` set, the review is only stored if that reviewer
+    still holds the job's lease, checked under a row lock in the same
+    transaction that completes the job. A reviewer whose lease expired and
+    was taken over writes nothing, so a PR never gets two reviews.
+    """
+    try:
+        cursor = connection.cursor()
+        
+        if lease_owner:
+            cursor.execute("""
+                SELECT pr_id FROM review_jobs
+                WHERE pr_id = %s AND lease_owner = %s AND status = 'leased'
+                FOR UPDATE
+            """, (pr_id, lease_owner))
+            
+            if cursor.fetchone() is None:
+                logger.warning(f"Lease on PR #{pr_number} in {repo_owner}/{repo_name} was lost, discarding review")
+                connection.rollback()
+                return None
+        
+        # Insert the main PR review
+        cursor.execute("""
+            INSERT INTO ai_pr_reviews 
+            (pr_id, summary, summary_hash, full_review, created_at) 
+            VALUES (%s, %s, %s, %s, NOW())
+        """, (pr_id, summary, summary_hash, full_review))
+        
+        review_id = cursor.lastrowid
+        
+        # Insert individual file reviews if provided
+        rows = [
+            (review_id, pr_id, file_review['filename'], file_review['content'], file_review.get('patch_hash'))
+            for file_review in file_reviews or []
+            if file_review.get('content') and file_review.get('filename')
+        ]
+        if rows:
+            cursor.executemany("""
+                INSERT INTO ai_file_reviews
+                (review_id, pr_id, filename, content, patch_hash, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+            """, rows)
+        
+        # Record the patch every file was reviewed at, for incremental re-reviews
+        if reviewed_patches:
+            cursor.executemany("""
+                INSERT INTO ai_reviewed_patches
+                (review_id, pr_id, filename, patch_hash, hunk_hashes, finding, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            """, [
+                (review_id, pr_id, reviewed['filename'], reviewed['patch_hash'], json.dumps(reviewed['hunks']), reviewed['finding'])
+                for reviewed in reviewed_patches
+            ])
+        
+        # Record the files the patch filter skipped
+        if skipped_files:
+            cursor.executemany("""
+                INSERT INTO ai_skipped_files
+                (review_id, pr_id, filename, reason, tokens, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+            """, [(review_id, pr_id, skipped['filename'], skipped['reason'], skipped['tokens']) for skipped in skipped_files])
+        
+        # The saved progress is now part of the review
+        cursor.execute("DELETE FROM ai_file_review_progress WHERE pr_id = %s", (pr_id,))
+        
+        # Signal the exporter in the same transaction as the review
+        cursor.execute("INSERT INTO export_outbox (pr_id) VALUES (%s)", (pr_id,))
+        
+        # Complete the job in the same transaction as well
+        if lease_owner:
+            cursor.execute("""
+                UPDATE review_jobs
+                SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL
+                WHERE pr_id = %s
+            """, (pr_id,))
+        
+        connection.commit()
+        
+        logger.info(f"Stored review for PR #{pr_number} in {repo_owner}/{repo_name}, review ID: {review_id}")
+        return review_id
+        
+    except Error as e:
+        logger.error(f"Error storing review in database: {e}")
+        connection.rollback()
+        return None
+
+def notify_exporter(config, pr_id):
+    """Wake the exporter daemon, if it listens on a socket; best effort."""
+    if not config.export_notify_socket:
+        return
+    
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(str(pr_id).encode('ascii'), config.export_notify_socket)
+    except OSError as e:
+        # The outbox row is already committed, the exporter will find it on its next poll
+        logger.debug(f"Could not notify exporter: {e}")
+
+def update_review_status(connection, pr_id):
+    """Mark a PR as reviewed in the database."""
+    try:
+        cursor = connection.cursor()
+        
+        # Update the PR's last_processed_time
+        query = """
+            UPDATE pull_requests
+            SET last_processed_time = NOW()
+            WHERE id = %s
+        """
+        
+        cursor.execute(query, (pr_id,))
+        connection.commit()
+        
+        cursor.close()
+        return True
+        
+    except Error as e:
+        logger.error(f"Error updating PR review status: {e}")
+        return False
+
+# Scales of the priority features: the update age that halves recency, the
+# discussion size and changed lines that count fully, the wait adding 1
+RECENCY_HALF_LIFE_HOURS = 24
+ACTIVITY_SCALE = 20
+SIZE_SCALE_LINES = 5000
+WAIT_SCALE_HOURS = 72
+
+# Lines of review work a changed file is worth on top of its changed lines
+FILE_SIZE_LINES = 20
+
+# Prompt template and response tokens per request, on top of the diff
+REQUEST_OVERHEAD_TOKENS = 700
+
+class ReviewScheduler:
+    """Plans which claimable PRs a cycle reviews, most urgent first, within budget.
+    
+    Every candidate gets a priority score, the weighted sum of its features:
+    how recently it was updated, whether it is open, how much discussion it
+    has and how long it has waited since its last review (or since it was
+    opened), minus its size. Its cost is estimated from the diffs the
+    patch filter would let through, in tokens and in seconds of the cycle
+    at full LLM concurrency.
+    
+    The plan takes candidates in score order as long as they fit the token
+    and time budgets, so small urgent PRs are not stuck behind a large
+    refactor. The wait term grows without bound, so a large PR still
+    reaches the top of a later cycle, and the top candidate is always
+    taken even when it alone exceeds the budgets.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.weights = config.review_priority_weights
+        self.patch_filter = PatchFilter.from_config(config)
+        self.plan = []
+    
+    def features(self, candidate):
+        """The priority features of a candidate, each about 0 to 1 except the wait."""
+        now = candidate['now']
+        hours_since_update = max(0.0, (now - candidate['updated_at']).total_seconds() / 3600)
+        waiting_since = candidate['last_reviewed_at'] or candidate['created_at']
+        hours_waiting = max(0.0, (now - waiting_since).total_seconds() / 3600)
+        lines = candidate['additions'] + candidate['deletions'] + FILE_SIZE_LINES * candidate['files_changed']
+        
+        return {
+            "recency": 0.5 ** (hours_since_update / RECENCY_HALF_LIFE_HOURS),
+            "open": 1.0 if candidate['state'] == 'open' else 0.0,
+            "activity": min(1.0, math.log1p(candidate['discussion']) / math.log1p(ACTIVITY_SCALE)),
+            "waiting": hours_waiting / WAIT_SCALE_HOURS,
+            "size": min(1.0, math.log1p(lines) / math.log1p(SIZE_SCALE_LINES)),
+        }
+    
+    def score(self, features):
+        return sum(self.weights[name] * value for name, value in features.items() if name != "size") - self.weights["size"] * features["size"]
+    
+    def estimate(self, candidate):
+        """Estimate the tokens and seconds of the cycle reviewing a candidate takes."""
+        # Token counts come from pr_hunks; patches not indexed yet fall back to characters
+        tokens = [
+            int(patch['tokens']) if patch['tokens'] is not None else -(-patch['chars'] // 4)
+            for patch in candidate['patches']
+            if patch['chars'] and not self.patch_filter.check_listing(patch, patch['chars'])
+        ]
+        # One more request for the summary
+        requests = estimate_requests(tokens, self.config) + 1
+        total = sum(tokens) + requests * REQUEST_OVERHEAD_TOKENS
+        
+        seconds = requests * self.config.review_seconds_per_request / self.config.llm_max_concurrency
+        if self.config.llm_rpm:
+            seconds = max(seconds, requests * 60 / self.config.llm_rpm)
+        if self.config.llm_tpm:
+            seconds = max(seconds, total * 60 / self.config.llm_tpm)
+        
+        return total, seconds
+    
+    def make_plan(self, candidates):
+        """Rank ``candidates`` and mark the ones this cycle takes; returns the plan entries."""
+        entries = []
+        for candidate in candidates:
+            features = self.features(candidate)
+            tokens, seconds = self.estimate(candidate)
+            entries.append({
+                "pr": candidate,
+                "score": self.score(features),
+                "features": features,
+                "tokens": tokens,
+                "seconds": seconds,
+                "chosen": False,
+                "reason": ""
+            })
+        
+        entries.sort(key=lambda entry: entry['score'], reverse=True)
+        
+        used_tokens, used_seconds, chosen = 0, 0.0, 0
+        for entry in entries:
+            if chosen >= self.config.max_prs_to_review:
+                entry['reason'] = "PR limit reached"
+            elif chosen and self.config.review_cycle_tokens and used_tokens + entry['tokens'] > self.config.review_cycle_tokens:
+                entry['reason'] = "over token budget"
+            elif chosen and self.config.review_cycle_seconds and used_seconds + entry['seconds'] > self.config.review_cycle_seconds:
+                entry['reason'] = "over time budget"
+            else:
+                entry['chosen'] = True
+                used_tokens += entry['tokens']
+                used_seconds += entry['seconds']
+                chosen += 1
+        
+        return entries
+    
+    def choose(self, connection, pr_ids):
+        """Plan the claimable ``pr_ids`` and return the chosen ones, for claim_review_jobs."""
+        candidates = get_review_candidates(connection, pr_ids)
+        self.plan = self.make_plan(candidates.values())
+        return [entry['pr']['id'] for entry in self.plan if entry['chosen']]
+    
+    def chosen(self):
+        """The chosen PRs in plan order."""
+        return [entry['pr'] for entry in self.plan if entry['chosen']]
+    
+    def report(self):
+        """Render the plan, chosen PRs first, as text for the plan file and the log."""
+        chosen = [entry for entry in self.plan if entry['chosen']]
+        tokens = sum(entry['tokens'] for entry in chosen)
+        seconds = sum(entry['seconds'] for entry in chosen)
+        budget = (f"{self.config.review_cycle_tokens or 'unlimited'} tokens, "
+                  f"{self.config.review_cycle_seconds or 'unlimited'} seconds")
+        
+        lines = [f"Review plan: {len(chosen)} of {len(self.plan)} candidates, ~{tokens} tokens, ~{seconds:.0f}s (budget {budget})"]
+        for entry in sorted(self.plan, key=lambda entry: not entry['chosen']):
+            pr = entry['pr']
+            features = ", ".join(f"{name} {value:.2f}" for name, value in entry['features'].items())
+            status = "review" if entry['chosen'] else f"defer ({entry['reason']})"
+            lines.append(f"- {status} #{pr['number']} ({pr['state']}) [{pr['repo_owner']}/{pr['repo_name']}] {pr['title']}: "
+                         f"score {entry['score']:.2f} ({features}), ~{entry['tokens']} tokens, ~{entry['seconds']:.0f}s")
+        return "\n".join(lines)
+
+class ReviewEngine:
+    """Reviews several PRs at once with bounded LLM concurrency.
+    
+    A PR's summary and all of its file reviews are requested concurrently
+    and assembled in patch order, so the stored review does not depend on
+    which request finished first. The database connection is shared, so
+    all queries go through one lock and run off the event loop.
+    
+    The PRs come from jobs leased in review_jobs. Their leases are renewed
+    while the reviews run, and every job is handed back when its PR is
+    done, skipped or failed.
+    """
+    def __init__(self, config, connection, llm):
+        self.config = config
+        self.connection = connection
+        self.llm = llm
+        self.db_lock = asyncio.Lock()
+        self.held = set()
+        self.patch_filter = PatchFilter.from_config(config)
+        self.filter_stats = {"files": 0, "tokens": 0, "requests": 0, "reasons": Counter()}
+        self.deadline = time.monotonic() + config.review_cycle_seconds if config.review_cycle_seconds else None
+    
+    async def db_call(self, func, *args):
+        """Run a blocking database helper in a thread, one at a time."""
+        async with self.db_lock:
+            return await asyncio.to_thread(func, self.connection, *args)
+    
+    async def release(self, pr_id, error=None, done=False, count_attempt=True):
+        """Hand a leased job back to the queue."""
+        self.held.discard(pr_id)
+        await self.db_call(
+            release_review_job,
+            self.config.reviewer_id,
+            pr_id,
+            self.config.review_max_attempts,
+            error,
+            done,
+            count_attempt
+        )
+    
+    def record_skipped(self, pr, skipped):
+        """Log the patches the filter skipped and add them to the filter totals."""
+        skipped_files = []
+        for patch, reason in skipped:
+            tokens = count_tokens(patch['patch'], self.llm.model) if patch['patch'] else 0
+            skipped_files.append({'filename': patch['filename'], 'reason': reason, 'tokens': tokens})
+            logger.info(f"Skipping {patch['filename']} in PR #{pr['number']}: {reason}")
+            self.filter_stats["reasons"][reason] += 1
+        
+        tokens = [skipped['tokens'] for skipped in skipped_files if skipped['tokens']]
+        self.filter_stats["files"] += len(skipped_files)
+        self.filter_stats["tokens"] += sum(tokens)
+        self.filter_stats["requests"] += estimate_requests(tokens, self.config)
+        return skipped_files
+    
+    def filter_summary(self):
+        stats = self.filter_stats
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in stats["reasons"].most_common())
+        return f"skipped {stats['files']} files, saving ~{stats['tokens']} tokens in ~{stats['requests']} requests" + (f" ({reasons})" if reasons else "")
+    
+    async def heartbeat(self):
+        """Renew the leases of the jobs still in progress until cancelled."""
+        interval = self.config.review_lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not self.held:
+                continue
+            
+            held = sorted(self.held)
+            renewed = await self.db_call(renew_leases, self.config.reviewer_id, held, self.config.review_lease_seconds)
+            if renewed < len(held):
+                logger.warning(f"Renewed {renewed} of {len(held)} review leases, the others expired and may be reviewed elsewhere")
+    
+    async def review_pr(self, pr, patches, comments, previous=None):
+        """Review one PR from its prefetched inputs; returns True if a review was stored.
+        
+        With the PR's ``previous`` review, files whose patch is unchanged
+        keep their earlier finding, and changed files are only reviewed
+        for the hunks that are new since.
+        """
+        logger.info(f"Reviewing PR #{pr['number']} in {pr['repo_owner']}/{pr['repo_name']}: {pr['title']}")
+        
+        # The tracker may not have written the patches yet, retry on a later run
+        if not patches:
+            logger.warning(f"No patches found for PR #{pr['number']}. Handing it back to the queue.")
+            await self.release(pr['id'], "No patches")
+            return False
+        
+        # Keep lockfiles, generated and vendored code and the like away from the LLM
+        reviewable, skipped = self.patch_filter.split(patches)
+        skipped_files = self.record_skipped(pr, skipped)
+        
+        hashes = {patch['filename']: patch_hash(patch) for patch in reviewable}
+        earlier_files = previous['files'] if previous else {}
+        
+        # Resume from the results an interrupted attempt saved
+        progress = await self.db_call(load_review_progress, pr['id'])
+        found, todo, incremental = {}, [], []
+        carried = 0
+        
+        for patch in reviewable:
+            filename = patch['filename']
+            saved = progress.get(('file', filename))
+            earlier = earlier_files.get(filename)
+            
+            if saved and saved[0] == hashes[filename]:
+                found[filename] = saved[1]
+                continue
+            
+            if earlier is None:
+                todo.append(patch)
+                continue
+            
+            # Carry the earlier finding forward only if the file has exactly the same hunks
+            keys = {hunk_key(hunk) for hunk in parse_hunks(patch['patch'])}
+            if earlier['patch_hash'] == hashes[filename] or keys == earlier['hunks']:
+                found[filename] = earlier['finding']
+                carried += 1
+            elif not earlier['hunks'] <= keys:
+                # Hunks were removed or reverted, which the earlier finding may
+                # still describe, so the whole file is reviewed again
+                todo.append(patch)
+            elif earlier['finding'] is None:
+                # Nothing earlier to reconcile, a plain review of the new hunks will do
+                todo.append(dict(patch, patch=changed_hunks(patch['patch'], earlier['hunks'])))
+            else:
+                incremental.append((patch, changed_hunks(patch['patch'], earlier['hunks']), earlier['finding']))
+        
+        if len(found) > carried:
+            logger.info(f"Resuming PR #{pr['number']}: {len(found) - carried} of {len(reviewable)} files were already reviewed")
+        
+        if previous:
+            logger.info(f"Re-reviewing PR #{pr['number']}: {carried} files unchanged, "
+                        f"{len(incremental) + sum(1 for patch in todo if patch['filename'] in earlier_files)} changed, "
+                        f"{sum(1 for patch in todo if patch['filename'] not in earlier_files)} new")
+        
+        summary_hash = hashlib.sha256(build_summary_prompt(pr['title'], patches).encode('utf-8')).hexdigest()
+        saved_summary = progress.get(('summary', ''))
+        
+        async def summarize():
+            if saved_summary and saved_summary[0] == summary_hash:
+                return saved_summary[1]
+            if previous and previous['summary_hash'] == summary_hash:
+                return previous['summary']
+            summary = await summarize_pr(self.llm, pr['title'], patches, pr_semaphore)
+            await self.db_call(save_review_progress, pr['id'], [('summary', '', summary_hash, summary)])
+            return summary
+        
+        async def save_reviews(results):
+            rows = [('file', patch['filename'], hashes[patch['filename']], review) for patch, review in results]
+            await self.db_call(save_review_progress, pr['id'], rows)
+        
+        async def review_incremental(patch, changed, earlier_finding):
+            review = await review_file_incremental(self.llm, patch, changed, earlier_finding, pr_semaphore)
+            await save_reviews([(patch, review)])
+            return review
+        
+        # Generate the PR summary and the missing file reviews concurrently, saving each as it completes
+        pr_semaphore = asyncio.Semaphore(self.config.llm_per_pr_concurrency)
+        pr_summary, reviews, updated = await gather_or_cancel(
+            summarize(),
+            review_patches(self.llm, todo, self.config, pr_semaphore, save_reviews),
+            gather_or_cancel(*(review_incremental(*item) for item in incremental))
+        )
+        found.update((patch['filename'], review) for patch, review in zip(todo, reviews))
+        found.update((patch['filename'], review) for (patch, _, _), review in zip(incremental, updated))
+        
+        # Generate the header for the review
+        review_header = f"""# AI Review 🤖
+
+## Summary
+{pr_summary}
+
+## Detailed Review
+"""
+        
+        # Assemble file reviews in patch order
+        file_reviews = []
+        structured_file_reviews = []
+        
+        for patch in reviewable:
+            review_content = found.get(patch['filename'])
+            if review_content:
+                file_reviews.append(f"### {patch['filename']}\n{review_content}\n")
+                structured_file_reviews.append({
+                    'filename': patch['filename'],
+                    'content': review_content,
+                    'patch_hash': hashes[patch['filename']]
+                })
+        
+        # Skip if no issues found
+        if not reviewable:
+            review_text = f"{review_header}\nNo files were reviewed, the patch filter skipped all of them."
+        elif not file_reviews:
+            review_text = f"{review_header}\nAll changes look good! 👍"
+        else:
+            review_text = f"{review_header}\n{''.join(file_reviews)}"
+        
+        if skipped_files:
+            review_text += "\n\n## Skipped Files\n"
+            review_text += "".join(f"- `{skipped['filename']}`: {skipped['reason']}\n" for skipped in skipped_files)
+        
+        review_text += "\n\n---\n*This review was automatically generated by an AI assistant.*"
+        
+        # Record which hunks this review covered so the next one can skip them
+        reviewed_patches = [{
+            'filename': patch['filename'],
+            'patch_hash': hashes[patch['filename']],
+            'hunks': [hunk_key(hunk) for hunk in parse_hunks(patch['patch'])],
+            'finding': found.get(patch['filename'])
+        } for patch in reviewable]
+        
+        # Store the review in the database
+        review_id = await self.db_call(
+            store_review,
+            pr['id'],
+            pr['repo_owner'],
+            pr['repo_name'],
+            pr['number'],
+            pr_summary,
+            review_text,
+            structured_file_reviews,
+            skipped_files,
+            reviewed_patches,
+            summary_hash,
+            self.config.reviewer_id
+        )
+        
+        if not review_id:
+            await self.release(pr['id'], "Review could not be stored")
+            return False
+        
+        self.held.discard(pr['id'])
+        await self.db_call(update_review_status, pr['id'])
+        notify_exporter(self.config, pr['id'])
+        logger.info(f"Stored review {review_id} for PR #{pr['number']}")
+        
+        # Write review file to disk for export
+        review_dir = os.path.join("reviews", f"{pr['repo_owner']}-{pr['repo_name']}")
+        os.makedirs(review_dir, exist_ok=True)
+        
+        review_file_path = os.path.join(review_dir, f"PR-{pr['number']}.md")
+        with open(review_file_path, "w") as f:
+            f.write(review_text)
+        
+        logger.info(f"Exported review to {review_file_path}")
+        return True
+    
+    async def prefetch(self, prs, queue, workers):
+        """Load review inputs batch by batch and queue them for the review workers.
+        
+        Loading uses its own connection in a thread, so the next batch is
+        read while the workers are still waiting on the LLM for the current
+        one. The bounded queue keeps the loader about one batch ahead.
+        """
+        batch_size = self.config.review_prefetch_batch
+        connection = await asyncio.to_thread(connect_to_database, self.config)
+        
+        try:
+            for start in range(0, len(prs), batch_size):
+                batch = prs[start:start + batch_size]
+                pr_ids = [pr['id'] for pr in batch]
+                
+                try:
+                    if connection:
+                        patches, comments, previous = await asyncio.to_thread(load_review_inputs, connection, pr_ids)
+                    else:
+                        patches, comments, previous = await self.db_call(load_review_inputs, pr_ids)
+                except Error as e:
+                    # A failed read says nothing about the PRs, hand them back untried
+                    logger.error(f"Could not load review inputs for {len(batch)} PRs, handing them back to the queue: {e}")
+                    for pr in batch:
+                        await self.release(pr['id'], f"Could not load review inputs: {e}", count_attempt=False)
+                    continue
+                
+                logger.info(f"Loaded review inputs for {len(batch)} PRs")
+                for pr in batch:
+                    await queue.put((pr, patches[pr['id']], comments[pr['id']], previous.get(pr['id'])))
+        finally:
+            if connection:
+                connection.close()
+            
+            for _ in range(workers):
+                await queue.put(None)
+    
+    async def run(self, prs):
+        """Review ``prs``, at most REVIEW_PR_CONCURRENCY at a time; returns the number stored."""
+        workers = min(self.config.review_pr_concurrency, len(prs))
+        queue = asyncio.Queue(maxsize=self.config.review_prefetch_batch)
+        reviewed = 0
+        
+        async def review_worker():
+            nonlocal reviewed
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                
+                pr, patches, comments, previous = item
+                
+                # Do not start PRs while the API is down, they would only fail
+                if self.llm.breaker.is_open:
+                    logger.warning(f"LLM API unavailable, handing PR #{pr['number']} back to the queue")
+                    await self.release(pr['id'], "LLM API unavailable", count_attempt=False)
+                    continue
+                
+                # PRs not started within the cycle's time budget wait for the next cycle
+                if self.deadline and time.monotonic() > self.deadline:
+                    logger.warning(f"Cycle time budget used up, handing PR #{pr['number']} back to the queue")
+                    await self.release(pr['id'], "Cycle time budget used up", count_attempt=False)
+                    continue
+                
+                try:
+                    if await self.review_pr(pr, patches, comments, previous):
+                        reviewed += 1
+                except Exception as e:
+                    logger.error(f"Error reviewing PR #{pr['number']} in {pr['repo_owner']}/{pr['repo_name']}: {e}")
+                    if pr['id'] in self.held:
+                        await self.release(pr['id'], str(e))
+        
+        self.held = {pr['id'] for pr in prs}
+        heartbeat = asyncio.create_task(self.heartbeat())
+        
+        try:
+            # Share one HTTP connection pool between all API requests
+            async with aiohttp.ClientSession() as session:
+                openai.aiosession.set(session)
+                await asyncio.gather(
+                    self.prefetch(prs, queue, workers),
+                    *(review_worker() for _ in range(workers))
+                )
+        finally:
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+            
+            # Anything still held was never reviewed, let another run pick it up
+            for pr_id in sorted(self.held):
+                await self.release(pr_id, "Review run ended before the PR was reviewed", count_attempt=False)
+        
+        return reviewed
+
+def claim_prs_for_review(connection, config):
+    """Lease the most urgent queued PRs that fit this cycle's budget.
+    
+    Returns the claimed PR rows, most urgent first, and the scheduler that
+    planned them.
+    """
+    scheduler = ReviewScheduler(config)
+    claimed = set(claim_review_jobs(
+        connection,
+        config.reviewer_id,
+        config.review_enqueue_limit,
+        config.review_lease_seconds,
+        config.review_max_attempts,
+        scheduler.choose
+    ))
+    return [pr for pr in scheduler.chosen() if pr['id'] in claimed], scheduler
 
 def main():
     """Main entry point for the AI PR reviewer."""
@@ -426,98 +2764,60 @@ def main():
             logger.error("Failed to create or verify review tables. Exiting.")
             return 1
         
-        # Get PRs to review (using simplified approach without constraints)
-        prs = get_all_prs_for_review(connection, config.max_prs_to_review)
-        logger.info(f"Found {len(prs)} PRs to review")
+        # Queue PRs that are new or changed since their last review
+        candidates = get_prs_for_review(
+            connection,
+            config.review_enqueue_limit,
+            config.review_only_open_prs,
+            config.days_since_update
+        )
+        if not enqueue_review_jobs(connection, candidates):
+            logger.error("Failed to enqueue review jobs. Exiting.")
+            return 1
+        
+        # Lease the most urgent PRs of the queue that fit this cycle's budget
+        prs, scheduler = claim_prs_for_review(connection, config)
+        logger.info(f"Claimed {len(prs)} PRs to review as {config.reviewer_id}")
         
         if len(prs) == 0:
-            logger.warning("No PRs found for review. Check if PRs have been fetched.")
+            logger.info("No new or updated PRs to review.")
             return 0
         
-        # Create a txt file with PRs to be reviewed
-        with open("prs_to_review.txt", "w") as f:
-            f.write(f"PRs to be reviewed ({len(prs)}):\n")
-            for pr in prs:
-                f.write(f"- #{pr['number']} ({pr['state']}): {pr['title']} [{pr['repo_owner']}/{pr['repo_name']}]\n")
+        # Parse the patches of the claimed PRs that changed into pr_hunks
+        indexed = index_pr_hunks(connection, config.openai_model, config.reviewer_id, [pr['id'] for pr in prs])
+        logger.info(f"Indexed the hunks of {indexed} new or changed PRs")
         
-        logger.info("Exported list of PRs to be reviewed to prs_to_review.txt")
+        # Log the plan and keep a copy next to the reviews
+        plan = scheduler.report()
+        for line in plan.splitlines():
+            logger.info(line)
         
-        # Process each PR
-        for pr in prs:
-            logger.info(f"Reviewing PR #{pr['number']} in {pr['repo_owner']}/{pr['repo_name']}: {pr['title']}")
-            
-            # Get PR details
-            patches = get_pr_patches(connection, pr['id'])
-            comments = get_pr_comments(connection, pr['id'])
-            
-            # Skip if no patches
-            if not patches:
-                logger.warning(f"No patches found for PR #{pr['number']}. Skipping review.")
-                continue
-            
-            # Generate PR summary
-            pr_summary = summarize_pr(openai, config.openai_model, pr['title'], patches)
-            
-            # Generate the header for the review
-            review_header = f"""# AI Review 🤖
-
-## Summary
-{pr_summary}
-
-## Detailed Review
-"""
-            
-            # Review each file
-            file_reviews = []
-            structured_file_reviews = []
-            
-            for patch in patches:
-                review_content = review_file(openai, config.openai_model, patch['filename'], patch['patch'], patch['status'])
-                if review_content:
-                    file_reviews.append(f"### {patch['filename']}\n{review_content}\n")
-                    structured_file_reviews.append({
-                        'filename': patch['filename'],
-                        'content': review_content
-                    })
-            
-            # Skip if no issues found
-            if not file_reviews:
-                review_text = f"{review_header}\nAll changes look good! 👍"
-            else:
-                review_text = f"{review_header}\n{''.join(file_reviews)}"
-            
-            review_text += "\n\n---\n*This review was automatically generated by an AI assistant.*"
-            
-            # Store the review in the database
-            review_id = store_review(
-                connection,
-                pr['id'],
-                pr['repo_owner'],
-                pr['repo_name'],
-                pr['number'],
-                pr_summary,
-                review_text,
-                structured_file_reviews
+        with open("review_plan.txt", "w") as f:
+            f.write(plan + "\n")
+        
+        logger.info("Exported the review plan to review_plan.txt")
+        
+        # Reuse responses for unchanged patches across runs
+        cache = None
+        if config.review_cache_dir:
+            cache = ReviewCache(
+                config.review_cache_dir,
+                config.review_cache_max_mb * 1024 * 1024,
+                config.review_cache_max_age_days * 86400
             )
-            
-            if review_id:
-                update_review_status(connection, pr['id'])
-                logger.info(f"Stored review {review_id} for PR #{pr['number']}")
-                
-                # Write review file to disk for export
-                review_dir = os.path.join("reviews", f"{pr['repo_owner']}-{pr['repo_name']}")
-                os.makedirs(review_dir, exist_ok=True)
-                
-                review_file_path = os.path.join(review_dir, f"PR-{pr['number']}.md")
-                with open(review_file_path, "w") as f:
-                    f.write(review_text)
-                
-                logger.info(f"Exported review to {review_file_path}")
-            
-            # Small pause between reviews
-            time.sleep(1)
         
-        logger.info(f"Reviewed {len(prs)} PRs")
+        # Review the PRs concurrently
+        llm = LLMClient.from_config(config, cache)
+        engine = ReviewEngine(config, connection, llm)
+        reviewed = asyncio.run(engine.run(prs))
+        
+        logger.info(f"Reviewed {reviewed} of {len(prs)} PRs")
+        logger.info(f"Patch filter {engine.filter_summary()}")
+        logger.info(f"LLM client: {llm.summary()}")
+        
+        if cache:
+            logger.info(f"Review cache: {cache.summary()}")
+            cache.evict()
         
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenAI chat completions API.
+
+Answers ``POST .../chat/completions`` with canned reviews after a
+simulated latency, so ai-pr-reviewer.py can be run and tuned without
+spending API quota. Point the reviewer at it with ``OPENAI_API_BASE``:
+
+    python benchmarks/mock_llm_server.py --port 8089 --latency lognormal:800:0.5 --rate-429 0.02
+    OPENAI_API_BASE=http://localhost:8089/v1 OPENAI_API_KEY=mock python ai-pr-reviewer.py
+
+The response depends on the prompt: batched file reviews get the JSON
+object the reviewer asks for, with one entry per file, and summaries,
+file reviews and merges get text. Latency is drawn from a configurable
+distribution plus a per-output-token cost. Rate limits (429 with
+``Retry-After``) and server errors (500/502/503) can be injected at a
+fixed rate, and requests above ``--max-concurrency`` get a 429 like an
+account over its concurrency limit. ``GET /stats`` reports counters and
+``POST /reset`` clears them.
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Canned answers by prompt kind; file reviews alternate with LGTM by prompt hash
+DEFAULT_RESPONSES = {
+    "summary": (
+        "This PR refactors the request handling path and adds caching for repeated lookups. "
+        "The changes are mostly mechanical; the new cache needs an eviction bound and the "
+        "error handling around the retry loop should be double-checked."
+    ),
+    "file": (
+        "The change is reasonable overall, with a few issues:\n"
+        "- Line 12: the loop re-reads the same value on every iteration; hoist it out.\n"
+        "- Line 27: the exception is swallowed, log it or re-raise.\n"
+        "- Line 40: this branch is never reached when the list is empty."
+    ),
+    "merge": (
+        "Overall the file is in good shape. Issues found across the parts:\n"
+        "- Line 12: hoist the repeated lookup out of the loop.\n"
+        "- Line 27: do not swallow the exception."
+    ),
+    "lgtm": "LGTM! (Looks Good To Me)",
+}
+
+FILE_HEADER = re.compile(r"^\s*### File: (.+?)\s*$", re.MULTILINE)
+
+class LatencyModel:
+    """Request latency in seconds, drawn from a distribution given as ``kind:params`` in ms.
+
+    * ``fixed:MS``
+    * ``uniform:LOW:HIGH``
+    * ``normal:MEAN:STDDEV`` (clipped at zero)
+    * ``lognormal:MEDIAN:SIGMA`` (long tail, like real API latency)
+    * ``exp:MEAN``
+    """
+    def __init__(self, spec, per_token_ms=0.0, seed=None):
+        self.spec = spec
+        self.per_token_ms = per_token_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(value) for value in params.split(":")] if params else []
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+        arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+        if arity.get(kind) != len(values):
+            raise ValueError(f"Invalid latency spec: {spec}")
+        self.kind = kind
+        self.values = values
+
+    def sample(self, output_tokens=0):
+        with self.lock:
+            if self.kind == "fixed":
+                ms = self.values[0]
+            elif self.kind == "uniform":
+                ms = self.rng.uniform(*self.values)
+            elif self.kind == "normal":
+                ms = max(0.0, self.rng.gauss(*self.values))
+            elif self.kind == "lognormal":
+                ms = self.values[0] * self.rng.lognormvariate(0.0, self.values[1])
+            else:
+                ms = self.rng.expovariate(1 / self.values[0]) if self.values[0] > 0 else 0.0
+        return (ms + output_tokens * self.per_token_ms) / 1000
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the mock's settings and counters."""
+    daemon_threads = True
+
+    def __init__(self, address, latency, rate_429=0.0, rate_5xx=0.0, retry_after=1.0,
+                 max_concurrency=0, responses=None, seed=None):
+        super().__init__(address, MockLLMHandler)
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.max_concurrency = max_concurrency
+        self.responses = dict(DEFAULT_RESPONSES, **(responses or {}))
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.inflight = 0
+            self.stats = {
+                "requests": 0,
+                "statuses": Counter(),
+                "kinds": Counter(),
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "max_inflight": 0,
+            }
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["statuses"] = {str(status): count for status, count in sorted(stats["statuses"].items())}
+            stats["kinds"] = dict(stats["kinds"])
+            stats["inflight"] = self.inflight
+        return stats
+
+    def admit(self):
+        """Count a request in; returns the injected error status, if any."""
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.max_concurrency and self.inflight >= self.max_concurrency:
+                return 429
+            roll = self.rng.random()
+            if roll < self.rate_429:
+                return 429
+            if roll < self.rate_429 + self.rate_5xx:
+                return self.rng.choice([500, 502, 503])
+            self.inflight += 1
+            self.stats["max_inflight"] = max(self.stats["max_inflight"], self.inflight)
+            return None
+
+    def finish(self, status, kind=None, prompt_tokens=0, completion_tokens=0, admitted=True):
+        with self.lock:
+            if admitted:
+                self.inflight -= 1
+            self.stats["statuses"][status] += 1
+            if kind:
+                self.stats["kinds"][kind] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+
+    def respond(self, prompt):
+        """Return ``(kind, text)`` for a user prompt built by the reviewer."""
+        if '{"files": [' in prompt:
+            filenames = FILE_HEADER.findall(prompt)
+            files = [{"filename": name, "review": self._file_review(prompt + name)} for name in filenames]
+            return "batch", json.dumps({"files": files})
+        if "## Partial Reviews" in prompt:
+            return "merge", self.responses["merge"]
+        if "## File:" in prompt:
+            return "file", self._file_review(prompt)
+        return "summary", self.responses["summary"]
+
+    def _file_review(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        return self.responses["lgtm"] if digest[0] % 3 == 0 else self.responses["file"]
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request, e.g. its run was cancelled
+            self.close_connection = True
+
+    def send_error_json(self, status, message, error_type, headers=None):
+        self.send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": None}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self.send_json(200, self.server.snapshot())
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+
+        if self.path.rstrip("/") == "/reset":
+            self.server.reset_stats()
+            self.send_json(200, {"reset": True})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+
+        try:
+            request = json.loads(raw)
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError):
+            self.send_error_json(400, "Request body is not a chat completion request", "invalid_request_error")
+            return
+
+        server = self.server
+        injected = server.admit()
+        if injected == 429:
+            server.finish(429, admitted=False)
+            self.send_error_json(429, "Rate limit reached for requests", "requests",
+                                 {"Retry-After": f"{server.retry_after:g}"})
+            return
+        if injected:
+            server.finish(injected, admitted=False)
+            self.send_error_json(injected, "The server had an error while processing your request", "server_error")
+            return
+
+        prompt = messages[-1].get("content", "") if messages else ""
+        kind, text = server.respond(prompt)
+        prompt_tokens = sum(estimate_tokens(message.get("content", "")) for message in messages)
+        completion_tokens = estimate_tokens(text)
+
+        try:
+            time.sleep(server.latency.sample(completion_tokens))
+            self.send_json(200, {
+                "id": f"chatcmpl-mock-{hashlib.sha1(raw).hexdigest()[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        finally:
+            server.finish(200, kind, prompt_tokens, completion_tokens)
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a mock server on a background thread and return it; ``port=0`` picks a free port."""
+    server = MockLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+def load_responses(path):
+    """Read canned response overrides: a JSON object keyed by summary, file, merge or lgtm."""
+    with open(path) as f:
+        responses = json.load(f)
+    unknown = set(responses) - set(DEFAULT_RESPONSES)
+    if unknown:
+        raise ValueError(f"Unknown response kinds: {', '.join(sorted(unknown))}")
+    return responses
+
+def add_server_arguments(parser):
+    """Add the mock's behaviour options to ``parser``; shared with the reviewer benchmark."""
+    parser.add_argument("--latency", default="lognormal:600:0.5", help="Latency distribution in ms, e.g. fixed:200, uniform:100:900, lognormal:600:0.5")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="Extra latency per completion token, in ms")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of requests answered with 500/502/503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Answer 429 above this many requests in flight (0 = unlimited)")
+    parser.add_argument("--responses", help="JSON file overriding the canned responses")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for latency and error injection")
+
+def server_options(args):
+    return {
+        "latency": LatencyModel(args.latency, args.ms_per_token, args.seed),
+        "rate_429": args.rate_429,
+        "rate_5xx": args.rate_5xx,
+        "retry_after": args.retry_after,
+        "max_concurrency": args.max_concurrency,
+        "responses": load_responses(args.responses) if args.responses else None,
+        "seed": args.seed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        options = server_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = MockLLMServer((args.host, args.port), **options)
+    print(f"Mock LLM server listening on {server.url}/v1", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.snapshot(), indent=2))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for ai-pr-reviewer.py against the mock LLM server.
+
+Seeds a scratch MySQL database with a deterministic synthetic backlog
+(PRs with long-tailed patch counts and sizes, plus comments), starts
+``mock_llm_server`` in-process and reviews the whole backlog once per
+concurrency setting, through the same enqueue, claim and review path as
+a reviewer run. Per setting it reports PRs/min, files/min, p50/p95/max
+API request latency, request errors and the time spent writing reviews
+to the database. Results are written as JSON.
+
+Settings are ``LLM_MAX_CONCURRENCY/LLM_PER_PR_CONCURRENCY/REVIEW_PR_CONCURRENCY``
+triples. The scratch database is dropped and recreated, so point
+``--bench-db`` at a throwaway schema, e.g. a local ``mysql:8`` container:
+
+    docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench mysql:8
+    DB_USER=root DB_PASSWORD=bench python benchmarks/reviewer_benchmark.py \\
+        --prs 200 --settings 1/1/1,8/4/2,16/4/4 --latency lognormal:800:0.5 --rate-429 0.01
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import importlib.util
+from datetime import datetime, timedelta
+
+import mysql.connector
+import openai
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+import mock_llm_server
+
+REVIEWER_PATH = os.path.join(BENCH_DIR, "..", "ai-pr-reviewer.py")
+
+# Schema of the tracker tables the reviewer reads; it creates its own tables
+SCHEMA = [
+    """
+    CREATE TABLE pull_requests (
+        id BIGINT PRIMARY KEY,
+        repo_owner VARCHAR(100) NOT NULL,
+        repo_name VARCHAR(100) NOT NULL,
+        number INT NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        state VARCHAR(20) NOT NULL,
+        user_login VARCHAR(100) NOT NULL,
+        diffs LONGTEXT,
+        files_changed INT NOT NULL DEFAULT 0,
+        additions INT NOT NULL DEFAULT 0,
+        deletions INT NOT NULL DEFAULT 0,
+        commit_count INT NOT NULL DEFAULT 0,
+        mergeable_state VARCHAR(50),
+        base_commit_sha VARCHAR(40),
+        base_commit_link VARCHAR(255),
+        last_processed_time DATETIME,
+        UNIQUE INDEX idx_repo_number (repo_owner, repo_name, number),
+        INDEX idx_state (state),
+        INDEX idx_updated (updated_at)
+    )
+    """,
+    """
+    CREATE TABLE pr_comments (
+        id BIGINT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        body TEXT NOT NULL,
+        created_at DATETIME NOT NULL,
+        user_login VARCHAR(100) NOT NULL,
+        path VARCHAR(255),
+        position INT,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        INDEX idx_pr_id (pr_id)
+    )
+    """,
+    """
+    CREATE TABLE pr_patches (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        path VARCHAR(255) NOT NULL,
+        patch LONGTEXT,
+        filename VARCHAR(255) NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        changes INT NOT NULL DEFAULT 0,
+        additions INT NOT NULL DEFAULT 0,
+        deletions INT NOT NULL DEFAULT 0,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        UNIQUE INDEX idx_pr_path (pr_id, path)
+    )
+    """,
+]
+
+WORDS = ["fix", "refactor", "cache", "parser", "handler", "retry", "config", "test", "update", "remove",
+         "client", "server", "query", "index", "export", "review", "timeout", "logging", "schema", "worker"]
+
+class SyntheticBacklog:
+    """Deterministic open PRs awaiting review, with long-tailed file counts and patch sizes."""
+    def __init__(self, n_prs, seed=42):
+        self.n_prs = n_prs
+        self.rng = random.Random(seed)
+        self.base_time = datetime(2025, 1, 1)
+
+    def _text(self, words):
+        return " ".join(self.rng.choice(WORDS) for _ in range(words))
+
+    def _patch(self, lines):
+        """A diff of ``lines`` changed lines, in hunks of up to 40 lines."""
+        body = []
+        for start in range(0, lines, 40):
+            size = min(40, lines - start)
+            body.append(f"@@ -{start + 1},{size} +{start + 1},{size} @@ def {self.rng.choice(WORDS)}_{start}():")
+            for n in range(size):
+                body.append(f"{self.rng.choice('+- ')}    {self._text(self.rng.randint(3, 10))} = value_{start + n}")
+        return "\n".join(body)
+
+    def rows(self):
+        """Yield ``(table, row)`` pairs in foreign-key order."""
+        comment_id = 1
+        for pr_id in range(1, self.n_prs + 1):
+            created = self.base_time + timedelta(minutes=self.rng.randint(0, 300 * 24 * 60))
+            updated = created + timedelta(minutes=self.rng.randint(0, 30 * 24 * 60))
+            files = min(60, max(1, int(self.rng.lognormvariate(1.3, 0.9))))
+
+            patches = []
+            for f in range(files):
+                lines = min(3000, max(1, int(self.rng.lognormvariate(3.0, 1.2))))
+                path = f"src/{self.rng.choice(WORDS)}/{self.rng.choice(WORDS)}_{f}.py"
+                patches.append((pr_id, path, self._patch(lines), path,
+                                self.rng.choice(["modified", "modified", "added", "removed"]),
+                                lines, lines // 2 + 1, lines // 2))
+
+            yield "pull_requests", (pr_id, "bench", f"repo{pr_id % 5}", pr_id, self._text(6)[:255], created, updated,
+                                    "open", f"user{self.rng.randint(1, 200)}", files,
+                                    sum(p[6] for p in patches), sum(p[7] for p in patches))
+            for patch in patches:
+                yield "pr_patches", patch
+
+            for _ in range(int(self.rng.expovariate(1 / 3))):
+                yield "pr_comments", (comment_id, pr_id, self._text(self.rng.randint(5, 80)), updated,
+                                      f"user{self.rng.randint(1, 200)}", self.rng.choice(patches)[1], self.rng.randint(1, 40))
+                comment_id += 1
+
+TABLE_COLUMNS = {
+    "pull_requests": ("id", "repo_owner", "repo_name", "number", "title", "created_at", "updated_at", "state",
+                      "user_login", "files_changed", "additions", "deletions"),
+    "pr_patches": ("pr_id", "path", "patch", "filename", "status", "changes", "additions", "deletions"),
+    "pr_comments": ("id", "pr_id", "body", "created_at", "user_login", "path", "position"),
+}
+
+def seed_database(server_config, bench_db, backlog):
+    """Recreate ``bench_db`` and load ``backlog``; return row counts."""
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{bench_db}`")
+    cursor.execute(f"CREATE DATABASE `{bench_db}` CHARACTER SET utf8mb4")
+    cursor.execute(f"USE `{bench_db}`")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    counts = {table: 0 for table in TABLE_COLUMNS}
+    pending = {table: [] for table in TABLE_COLUMNS}
+
+    def flush():
+        # Parents before children
+        for table, columns in TABLE_COLUMNS.items():
+            if pending[table]:
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                    pending[table]
+                )
+                pending[table] = []
+
+    for table, row in backlog.rows():
+        pending[table].append(row)
+        counts[table] += 1
+        if len(pending[table]) >= 500:
+            flush()
+    flush()
+
+    connection.commit()
+    cursor.execute("SELECT VERSION()")
+    version = cursor.fetchone()[0]
+    cursor.close()
+    connection.close()
+    return counts, version
+
+def load_reviewer():
+    """Import ai-pr-reviewer.py, whose file name is not a module name."""
+    spec = importlib.util.spec_from_file_location("ai_pr_reviewer", REVIEWER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+class Probe:
+    """Times API requests and database writes by wrapping the functions the reviewer calls."""
+    def __init__(self, reviewer):
+        self.reset()
+
+        acreate = openai.ChatCompletion.acreate
+        async def timed_acreate(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await acreate(*args, **kwargs)
+            except Exception as e:
+                self.errors[type(e).__name__] = self.errors.get(type(e).__name__, 0) + 1
+                raise
+            finally:
+                self.request_seconds.append(time.perf_counter() - start)
+        openai.ChatCompletion.acreate = timed_acreate
+
+        for name in ("store_review", "update_review_status"):
+            setattr(reviewer, name, self._timed_write(getattr(reviewer, name)))
+
+    def _timed_write(self, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.write_seconds.append(time.perf_counter() - start)
+        return timed
+
+    def reset(self):
+        self.request_seconds = []
+        self.write_seconds = []
+        self.errors = {}
+
+def parse_setting(text):
+    try:
+        llm, per_pr, prs = (int(value) for value in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid setting {text!r}, expected LLM/PER_PR/PRS, e.g. 8/4/2")
+    if min(llm, per_pr, prs) < 1:
+        raise argparse.ArgumentTypeError(f"Invalid setting {text!r}, values must be at least 1")
+    return llm, per_pr, prs
+
+def reset_reviews(reviewer, config):
+    """Drop the reviews and jobs of the previous setting so the whole backlog is pending again."""
+    connection = reviewer.connect_to_database(config)
+    if not connection or not reviewer.ensure_tables_exist(connection):
+        raise SystemExit(f"Could not prepare benchmark database {config.db_name}")
+    cursor = connection.cursor()
+    for table in ("export_outbox", "review_jobs", "ai_file_review_progress", "ai_reviewed_patches", "ai_file_reviews", "ai_pr_reviews"):
+        cursor.execute(f"DELETE FROM {table}")
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+def run_setting(reviewer, probe, server, args, setting):
+    """Review the whole backlog with one concurrency setting."""
+    config = reviewer.Config()
+    config.db_host, config.db_port = args.db_host, args.db_port
+    config.db_user, config.db_password, config.db_name = args.db_user, args.db_password, args.bench_db
+    config.openai_api_key = "mock"
+    config.openai_model = args.model
+    config.llm_max_concurrency, config.llm_per_pr_concurrency, config.review_pr_concurrency = setting
+    config.max_prs_to_review = config.review_enqueue_limit = args.prs
+    config.review_only_open_prs, config.days_since_update = False, 0
+    config.review_cycle_tokens = config.review_cycle_seconds = 0
+    config.review_cache_dir = ""
+    config.export_notify_socket = ""
+    config.reviewer_id = "benchmark"
+
+    reset_reviews(reviewer, config)
+    server.reset_stats()
+    probe.reset()
+
+    connection = reviewer.connect_to_database(config)
+    try:
+        start = time.perf_counter()
+        reviewer.enqueue_review_jobs(connection, reviewer.get_prs_for_review(connection, args.prs))
+        prs, _ = reviewer.claim_prs_for_review(connection, config)
+        select_seconds = time.perf_counter() - start
+
+        llm = reviewer.LLMClient.from_config(config)
+        engine = reviewer.ReviewEngine(config, connection, llm)
+
+        start = time.perf_counter()
+        reviewed = asyncio.run(engine.run(prs))
+        elapsed = time.perf_counter() - start
+
+        # Files the reviews covered, without the ones the patch filter skipped
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM ai_reviewed_patches")
+        files = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        connection.close()
+
+    requests = probe.request_seconds
+    writes = probe.write_seconds
+    minutes = elapsed / 60
+    return {
+        "llm_max_concurrency": setting[0],
+        "llm_per_pr_concurrency": setting[1],
+        "review_pr_concurrency": setting[2],
+        "prs": len(prs),
+        "reviewed": reviewed,
+        "files": files,
+        "seconds": round(elapsed, 3),
+        "select_seconds": round(select_seconds, 4),
+        "prs_per_minute": round(reviewed / minutes, 1) if minutes else None,
+        "files_per_minute": round(files / minutes, 1) if minutes else None,
+        "requests": len(requests),
+        "request_errors": probe.errors,
+        "request_p50_ms": ms(percentile(requests, 0.50)),
+        "request_p95_ms": ms(percentile(requests, 0.95)),
+        "request_max_ms": ms(max(requests) if requests else None),
+        "db_write_seconds": round(sum(writes), 4),
+        "db_write_p50_ms": ms(percentile(writes, 0.50)),
+        "db_write_p95_ms": ms(percentile(writes, 0.95)),
+        "llm_client": dict(llm.stats, breaker_opens=llm.breaker.opens, final_concurrency_limit=int(llm.limit.limit)),
+        "patch_filter": dict(engine.filter_stats, reasons=dict(engine.filter_stats["reasons"])),
+        "server": server.snapshot(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ai-pr-reviewer.py against a mock LLM server")
+    parser.add_argument("--prs", type=int, default=100, help="Number of PRs to seed and review per setting")
+    parser.add_argument("--settings", default="1/1/1,8/4/2,16/4/4",
+                        help="Comma-separated LLM_MAX_CONCURRENCY/LLM_PER_PR_CONCURRENCY/REVIEW_PR_CONCURRENCY triples")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name sent to the mock (affects token counting only)")
+    parser.add_argument("--bench-db", default=os.getenv("BENCH_DB_NAME", "github_prs_bench"), help="Scratch database, dropped and recreated on every run")
+    parser.add_argument("--db-host", default=os.getenv("DB_HOST", "localhost"), help="Database host")
+    parser.add_argument("--db-port", type=int, default=int(os.getenv("DB_PORT", "3306")), help="Database port")
+    parser.add_argument("--db-user", default=os.getenv("DB_USER", "pruser"), help="Database user (needs CREATE and DROP)")
+    parser.add_argument("--db-password", default=os.getenv("DB_PASSWORD", "prpassword"), help="Database password")
+    parser.add_argument("--output", default="-", help="Write JSON results to this file instead of stdout")
+    mock_llm_server.add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if args.bench_db == os.getenv("DB_NAME", "github_prs"):
+        parser.error("--bench-db must not be the tracker database; it is dropped on every run")
+
+    try:
+        settings = [parse_setting(text) for text in args.settings.split(",") if text.strip()]
+        options = mock_llm_server.server_options(args)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+
+    # The reviewer writes its log and review files to the working directory
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="ai-reviewer-bench-")
+    os.chdir(workdir)
+
+    try:
+        reviewer = load_reviewer()
+
+        # Keep stdout for the results and quiet the per-PR review logging
+        for handler in logging.getLogger().handlers:
+            if type(handler) is logging.StreamHandler and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+        reviewer.logger.setLevel(logging.WARNING)
+
+        server_config = {"host": args.db_host, "port": args.db_port, "user": args.db_user, "password": args.db_password}
+        print(f"Seeding {args.prs} PRs...", file=sys.stderr)
+        counts, version = seed_database(server_config, args.bench_db, SyntheticBacklog(args.prs, args.seed))
+
+        server = mock_llm_server.start_server(**options)
+        openai.api_base = f"{server.url}/v1"
+        openai.api_key = "mock"
+        probe = Probe(reviewer)
+
+        results = {
+            "benchmark": "ai_pr_reviewer",
+            "started_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "mysql_version": version,
+            "dataset": {"rows": counts, "seed": args.seed},
+            "mock": {
+                "latency": args.latency,
+                "ms_per_token": args.ms_per_token,
+                "rate_429": args.rate_429,
+                "rate_5xx": args.rate_5xx,
+                "max_concurrency": args.max_concurrency,
+            },
+            "runs": [],
+        }
+
+        try:
+            for setting in settings:
+                print(f"Reviewing with concurrency {'/'.join(map(str, setting))}...", file=sys.stderr)
+                results["runs"].append(run_setting(reviewer, probe, server, args, setting))
+        finally:
+            server.shutdown()
+            server.server_close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
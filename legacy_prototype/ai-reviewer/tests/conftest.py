@@ -0,0 +1,22 @@
+import os
+import importlib.util
+
+import pytest
+
+REVIEWER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai-pr-reviewer.py")
+
+@pytest.fixture(scope="session")
+def reviewer(tmp_path_factory):
+    """The ai-pr-reviewer.py module, imported from a scratch directory for its log file."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("reviewer"))
+    try:
+        spec = importlib.util.spec_from_file_location("ai_pr_reviewer", REVIEWER_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+
+    # Token counts fall back to the four-characters estimate, no encoding download
+    module.tiktoken = None
+    return module
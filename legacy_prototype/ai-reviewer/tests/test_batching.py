@@ -0,0 +1,50 @@
+import json
+
+def patches(*names):
+    return [{'filename': name, 'status': 'modified', 'patch': f"@@ -1 +1 @@\n+{name}\n"} for name in names]
+
+def filenames(batches):
+    return [[patch['filename'] for patch in batch] for batch in batches]
+
+def test_pack_patches_respects_token_budget(reviewer):
+    batches = reviewer.pack_patches(patches("a", "b", "c", "d"), [400, 500, 300, 900], 1000, 10)
+
+    assert filenames(batches) == [["a", "b"], ["c"], ["d"]]
+
+def test_pack_patches_respects_max_files(reviewer):
+    batches = reviewer.pack_patches(patches("a", "b", "c", "d", "e"), [1] * 5, 1000, 2)
+
+    assert filenames(batches) == [["a", "b"], ["c", "d"], ["e"]]
+
+def test_pack_patches_never_batches_a_filename_twice(reviewer):
+    batches = reviewer.pack_patches(patches("a", "b", "a"), [1, 1, 1], 1000, 10)
+
+    assert filenames(batches) == [["a", "b"], ["a"]]
+
+def test_pack_patches_keeps_oversized_patch_alone(reviewer):
+    batches = reviewer.pack_patches(patches("a", "b"), [5000, 10], 1000, 10)
+
+    assert filenames(batches) == [["a"], ["b"]]
+
+def test_parse_batch_response_orders_by_filename(reviewer):
+    response = json.dumps({"files": [
+        {"filename": "b.py", "review": "LGTM! (Looks Good To Me)"},
+        {"filename": "a.py", "review": " Bug on line 3. "},
+    ]})
+
+    assert reviewer.parse_batch_response(response, ["a.py", "b.py"]) == ["Bug on line 3.", "LGTM! (Looks Good To Me)"]
+
+def test_parse_batch_response_tolerates_surrounding_text(reviewer):
+    response = 'Here you go:\n```json\n{"files": [{"filename": "a.py", "review": "LGTM"}]}\n```'
+
+    assert reviewer.parse_batch_response(response, ["a.py"]) == ["LGTM"]
+
+def test_parse_batch_response_rejects_incomplete_or_invalid(reviewer):
+    partial = json.dumps({"files": [{"filename": "a.py", "review": "LGTM"}]})
+    empty = json.dumps({"files": [{"filename": "a.py", "review": "LGTM"}, {"filename": "b.py", "review": "  "}]})
+
+    assert reviewer.parse_batch_response(partial, ["a.py", "b.py"]) is None
+    assert reviewer.parse_batch_response(empty, ["a.py", "b.py"]) is None
+    assert reviewer.parse_batch_response("LGTM", ["a.py"]) is None
+    assert reviewer.parse_batch_response("{not json}", ["a.py"]) is None
+    assert reviewer.parse_batch_response("[1, 2]", ["a.py"]) is None
@@ -0,0 +1,89 @@
+MODEL = "test-model"
+
+PATCH = (
+    "@@ -1,2 +1,3 @@\n"
+    " a\n"
+    "-b\n"
+    "+c\n"
+    "+d\n"
+    "@@ -10 +11,2 @@ def f():\n"
+    " x\n"
+    "+y\n"
+)
+
+def hunks(count, tag="", offset=0):
+    return "".join(
+        f"@@ -{10 * k + 1 + offset},1 +{10 * k + 1 + offset},2 @@\n a\n+change {k}{tag}\n"
+        for k in range(count)
+    )
+
+def test_parse_hunks_keeps_file_header_with_first_hunk(reviewer):
+    patch = "diff --git a/x b/x\n--- a/x\n+++ b/x\n" + PATCH
+
+    parsed = reviewer.parse_hunks(patch)
+
+    assert len(parsed) == 2
+    assert parsed[0].startswith("diff --git")
+    assert parsed[1].startswith("@@ -10 +11,2 @@")
+    assert "".join(parsed) == patch
+
+def test_index_hunks_positions_and_ranges(reviewer):
+    rows = reviewer.index_hunks(PATCH, MODEL)
+
+    assert [(row['position_start'], row['position_end']) for row in rows] == [(0, 4), (5, 7)]
+    assert [(row['old_start'], row['old_lines'], row['new_start'], row['new_lines']) for row in rows] == [
+        (1, 2, 1, 3),
+        (10, 1, 11, 2),
+    ]
+    assert [(row['additions'], row['deletions']) for row in rows] == [(2, 1), (1, 0)]
+    assert [row['hunk_index'] for row in rows] == [0, 1]
+
+def test_index_hunks_ignores_file_header_lines_in_counts(reviewer):
+    rows = reviewer.index_hunks("diff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b\n", MODEL)
+
+    assert (rows[0]['additions'], rows[0]['deletions']) == (1, 1)
+
+def test_changed_hunks_ignores_shifted_line_numbers(reviewer):
+    earlier = {reviewer.hunk_key(hunk) for hunk in reviewer.parse_hunks(hunks(3))}
+    new_top = "@@ -1,1 +1,2 @@\n x\n+new top\n"
+
+    changed = reviewer.changed_hunks(new_top + hunks(3, offset=4), earlier)
+
+    assert changed == new_top
+
+def test_changed_hunks_empty_when_nothing_new(reviewer):
+    earlier = {reviewer.hunk_key(hunk) for hunk in reviewer.parse_hunks(hunks(3))}
+
+    assert reviewer.changed_hunks(hunks(2), earlier) == ""
+
+def test_split_hunk_repeats_header_and_keeps_lines(reviewer):
+    header = "@@ -1,40 +1,40 @@\n"
+    body = "".join(f"+line number {n} of the hunk\n" for n in range(40))
+
+    pieces = reviewer.split_hunk(header + body, 60, MODEL)
+
+    assert len(pieces) > 1
+    assert pieces[0].startswith(header)
+    assert all(piece.startswith("@@ -1,40 +1,40 @@ (continued)\n") for piece in pieces[1:])
+    assert "".join(piece.split("\n", 1)[1] for piece in pieces) == body
+
+def test_split_hunk_cuts_overlong_line(reviewer):
+    line = "+" + "x" * 2000 + "\n"
+
+    pieces = reviewer.split_hunk("@@ -0,0 +1 @@\n" + line, 100, MODEL)
+
+    assert len(pieces) > 1
+    assert "".join(piece.split("\n", 1)[1].replace("\n", "") for piece in pieces) == line.rstrip("\n")
+
+def test_chunk_patch_returns_small_patch_whole(reviewer):
+    assert reviewer.chunk_patch(PATCH, 6000, MODEL) == [PATCH]
+
+def test_chunk_patch_splits_on_hunk_boundaries(reviewer):
+    patch = hunks(30)
+
+    chunks = reviewer.chunk_patch(patch, 40, MODEL)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == patch
+    assert all(chunk.startswith("@@ ") for chunk in chunks)
+    assert all(reviewer.count_tokens(chunk, MODEL) <= 40 for chunk in chunks)
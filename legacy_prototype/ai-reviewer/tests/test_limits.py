@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+class Clock:
+    """Stands in for time.monotonic, advanced by hand."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(reviewer, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(reviewer.time, "monotonic", clock)
+    return clock
+
+def test_token_bucket_unlimited(reviewer, clock):
+    bucket = reviewer.TokenBucket(0)
+    bucket.take(10 ** 9)
+
+    assert bucket.delay(10 ** 9) == 0.0
+
+def test_token_bucket_refills_over_a_minute(reviewer, clock):
+    bucket = reviewer.TokenBucket(600)
+
+    assert bucket.delay(600) == 0.0
+    bucket.take(600)
+    assert bucket.delay(60) == pytest.approx(6.0)
+
+    clock.now += 3
+    assert bucket.delay(60) == pytest.approx(3.0)
+
+    clock.now += 120
+    assert bucket.delay(600) == 0.0
+
+def test_token_bucket_lets_oversized_request_through_when_full(reviewer, clock):
+    bucket = reviewer.TokenBucket(100)
+
+    assert bucket.delay(1000) == 0.0
+    bucket.take(1000)
+    assert bucket.delay(1) == pytest.approx(0.6)
+
+def test_adaptive_limit_halves_once_per_interval(reviewer, clock):
+    limit = reviewer.AdaptiveLimit(16, decrease_interval=2.0)
+
+    async def throttled_requests(count):
+        for _ in range(count):
+            await limit.acquire()
+        for _ in range(count):
+            await limit.release(throttled=True)
+
+    asyncio.run(throttled_requests(4))
+    assert limit.limit == 8.0
+    assert limit.inflight == 0
+
+    clock.now += 2.0
+    asyncio.run(throttled_requests(1))
+    assert limit.limit == 4.0
+
+def test_adaptive_limit_grows_by_one_slot_per_round(reviewer, clock):
+    limit = reviewer.AdaptiveLimit(5)
+    limit.limit = 4.0
+
+    async def successful_requests(count):
+        for _ in range(count):
+            await limit.acquire()
+            await limit.release(succeeded=True)
+
+    asyncio.run(successful_requests(4))
+    assert 4.9 < limit.limit < 5.0
+
+    asyncio.run(successful_requests(10))
+    assert limit.limit == 5.0
+
+def test_adaptive_limit_never_drops_below_one(reviewer, clock):
+    limit = reviewer.AdaptiveLimit(2, decrease_interval=0)
+
+    async def throttled():
+        for _ in range(5):
+            await limit.acquire()
+            await limit.release(throttled=True)
+
+    asyncio.run(throttled())
+    assert limit.limit == 1.0
+
+def test_circuit_breaker_opens_after_threshold(reviewer, clock):
+    breaker = reviewer.CircuitBreaker(3, 30)
+
+    breaker.record(True)
+    breaker.record(True)
+    breaker.record(None)
+    assert not breaker.is_open
+
+    breaker.record(True)
+    assert breaker.is_open
+    assert breaker.opened_until == clock.now + 30
+
+def test_circuit_breaker_success_closes(reviewer, clock):
+    breaker = reviewer.CircuitBreaker(2, 30)
+    breaker.record(True)
+    breaker.record(True)
+
+    breaker.record(False)
+
+    assert not breaker.is_open
+    assert breaker.current_cooldown == 30
+
+def test_circuit_breaker_failed_probe_doubles_cooldown_up_to_ten_times(reviewer, clock):
+    breaker = reviewer.CircuitBreaker(1, 30)
+    breaker.record(True)
+
+    cooldowns = []
+    for _ in range(6):
+        clock.now = breaker.opened_until
+        assert asyncio.run(breaker.admit())
+        assert breaker.probing
+        breaker.record(True)
+        cooldowns.append(breaker.current_cooldown)
+
+    assert cooldowns == [60, 120, 240, 300, 300, 300]
+
+def test_circuit_breaker_admits_one_probe_at_a_time(reviewer, clock):
+    breaker = reviewer.CircuitBreaker(1, 30)
+    breaker.record(True)
+    clock.now = breaker.opened_until
+
+    assert asyncio.run(breaker.admit())
+    # The deadline of a second request has already passed on the frozen clock
+    breaker.current_cooldown = 0
+    assert not asyncio.run(breaker.admit())
+
+def test_circuit_breaker_disabled_with_zero_threshold(reviewer, clock):
+    breaker = reviewer.CircuitBreaker(0, 30)
+    for _ in range(10):
+        breaker.record(True)
+
+    assert not breaker.is_open
+    assert asyncio.run(breaker.admit())
@@ -0,0 +1,56 @@
+import pytest
+
+def patch(content, filename="src/app.py", status="added", additions=1, deletions=0):
+    return {'filename': filename, 'status': status, 'patch': content, 'additions': additions, 'deletions': deletions}
+
+@pytest.mark.parametrize("content", [
+    "@@ -0,0 +1,3 @@\n+// Code generated by protoc-gen-go. DO NOT EDIT.\n+\n+package x\n",
+    "@@ -0,0 +1,3 @@\n+# Code generated by sqlc. DO NOT EDIT.\n+# versions:\n+import x\n",
+    "@@ -0,0 +1,2 @@\n+# -*- coding: utf-8 -*-\n+# Generated by the protocol buffer compiler.  DO NOT EDIT!\n",
+    "@@ -1,3 +1,4 @@\n /**\n+ * @generated SignedSource<<abc>>\n  */\n",
+    "@@ -0,0 +1 @@\n+/* Code generated by foo. DO NOT EDIT. */\n",
+])
+def test_generated_headers_are_skipped(reviewer, content):
+    assert reviewer.PatchFilter().check(patch(content)) == "generated file header"
+
+@pytest.mark.parametrize("content", [
+    # A header after the first line of code
+    "@@ -0,0 +1,2 @@\n+package x\n+// Code generated by x. DO NOT EDIT.\n",
+    # Marker text in code, not in a comment
+    "@@ -0,0 +1 @@\n+MSG = 'This file is auto-generated, DO NOT EDIT'\n",
+    # Loose wording in a comment
+    "@@ -0,0 +1 @@\n+# TODO: DO NOT EDIT the autogenerated config below\n",
+    # The Go convention is case sensitive
+    "@@ -0,0 +1 @@\n+// code generated by x. do not edit.\n",
+    # Not the top of the file
+    "@@ -40,0 +41 @@\n+// Code generated by x. DO NOT EDIT.\n",
+    # The header is being removed
+    "@@ -1,2 +1 @@\n-// Code generated by x. DO NOT EDIT.\n package x\n",
+])
+def test_hand_written_files_are_reviewed(reviewer, content):
+    assert reviewer.PatchFilter().check(patch(content)) is None
+
+def test_generated_check_can_be_disabled(reviewer):
+    content = "@@ -0,0 +1 @@\n+// Code generated by x. DO NOT EDIT.\n"
+
+    assert reviewer.PatchFilter(skip_generated=False).check(patch(content)) is None
+
+def test_listing_rules(reviewer):
+    patch_filter = reviewer.PatchFilter(globs=["*.lock", "vendor/*"], statuses=["removed"], max_chars=100, max_lines=10)
+    content = "@@ -1 +1 @@\n-a\n+b\n"
+
+    assert patch_filter.check(patch("", filename="logo.png")) == "no diff (binary file or rename only)"
+    assert patch_filter.check(patch(content, status="Removed")) == "status Removed"
+    assert patch_filter.check(patch(content, filename="deep/dir/yarn.lock")) == "matches *.lock"
+    assert patch_filter.check(patch(content, filename="vendor/lib/x.go")) == "matches vendor/*"
+    assert patch_filter.check(patch(content + "+x\n" * 50)) == "diff larger than 100 characters"
+    assert patch_filter.check(patch(content, additions=8, deletions=3)) == "more than 10 changed lines"
+    assert patch_filter.check(patch(content)) is None
+
+def test_split_keeps_order(reviewer):
+    patches = [patch("@@ -1 +1 @@\n+a\n", filename=name) for name in ("a.py", "b.lock", "c.py")]
+
+    reviewable, skipped = reviewer.PatchFilter(globs=["*.lock"]).split(patches)
+
+    assert [p['filename'] for p in reviewable] == ["a.py", "c.py"]
+    assert [(p['filename'], reason) for p, reason in skipped] == [("b.lock", "matches *.lock")]
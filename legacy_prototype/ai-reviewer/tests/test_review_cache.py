@@ -0,0 +1,22 @@
+import os
+
+def test_repeated_lookup_counts_one_miss(reviewer, tmp_path):
+    cache = reviewer.ReviewCache(str(tmp_path), 10 ** 6, 3600)
+    key = cache.key("file", "model", 0.0, "a.py", "diff")
+
+    assert cache.get(key) is None
+    assert cache.get(key) is None
+    cache.put(key, "LGTM")
+
+    assert cache.get(key) == "LGTM"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_expired_entry_is_a_miss(reviewer, tmp_path):
+    cache = reviewer.ReviewCache(str(tmp_path), 10 ** 6, 60)
+    key = cache.key("file", "model", 0.0, "a.py", "diff")
+    cache.put(key, "LGTM")
+    path = cache._path(key)
+    os.utime(path, (os.path.getatime(path) - 120, os.path.getmtime(path) - 120))
+
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (0, 1)
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark for pr_export.py.
+
+Seeds a scratch MySQL database with a deterministic synthetic dataset
+(repositories, PRs, comments, GitHub reviews, patches and their hunks,
+AI reviews, with long-tailed size distributions), then times at each
+dataset size:
+
+* a full JSON export,
+* an incremental export with nothing changed,
+* an incremental export after touching a fraction of the PRs,
+* ``get_pr_details`` called per PR versus ``get_pr_details_bulk``.
+
+Results are written as JSON so runs can be compared for regressions.
+The scratch database is dropped and recreated for every size, so point
+``--bench-db`` at a throwaway schema, e.g. a local ``mysql:8`` container:
+
+    docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench mysql:8
+    DB_USER=root DB_PASSWORD=bench python benchmarks/export_benchmark.py --sizes 100,1000,5000
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import shutil
+import hashlib
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pr_export
+
+# Schema of the tables pr_export.py reads, as created by the Go tracker and the AI reviewer
+SCHEMA = [
+    """
+    CREATE TABLE repositories (
+        id VARCHAR(100) PRIMARY KEY,
+        owner VARCHAR(100) NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        UNIQUE INDEX idx_owner_name (owner, name)
+    )
+    """,
+    """
+    CREATE TABLE pull_requests (
+        id BIGINT PRIMARY KEY,
+        repo_owner VARCHAR(100) NOT NULL,
+        repo_name VARCHAR(100) NOT NULL,
+        number INT NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        state VARCHAR(20) NOT NULL,
+        user_login VARCHAR(100) NOT NULL,
+        diffs LONGTEXT,
+        files_changed INT NOT NULL DEFAULT 0,
+        additions INT NOT NULL DEFAULT 0,
+        deletions INT NOT NULL DEFAULT 0,
+        commit_count INT NOT NULL DEFAULT 0,
+        mergeable_state VARCHAR(50),
+        base_commit_sha VARCHAR(40),
+        base_commit_link VARCHAR(255),
+        last_processed_time DATETIME,
+        UNIQUE INDEX idx_repo_number (repo_owner, repo_name, number),
+        INDEX idx_user (user_login),
+        INDEX idx_state (state),
+        INDEX idx_updated (updated_at)
+    )
+    """,
+    """
+    CREATE TABLE pr_comments (
+        id BIGINT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        body TEXT NOT NULL,
+        created_at DATETIME NOT NULL,
+        user_login VARCHAR(100) NOT NULL,
+        path VARCHAR(255),
+        position INT,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        INDEX idx_pr_id (pr_id)
+    )
+    """,
+    """
+    CREATE TABLE pr_reviews (
+        id BIGINT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        body TEXT,
+        state VARCHAR(50) NOT NULL,
+        created_at DATETIME NOT NULL,
+        user_login VARCHAR(100) NOT NULL,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        INDEX idx_pr_id (pr_id)
+    )
+    """,
+    """
+    CREATE TABLE pr_patches (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        path VARCHAR(255) NOT NULL,
+        patch LONGTEXT,
+        filename VARCHAR(255) NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        changes INT NOT NULL DEFAULT 0,
+        additions INT NOT NULL DEFAULT 0,
+        deletions INT NOT NULL DEFAULT 0,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        UNIQUE INDEX idx_pr_path (pr_id, path)
+    )
+    """,
+    """
+    CREATE TABLE pr_hunks (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        hunk_index INT NOT NULL,
+        old_start INT NOT NULL,
+        old_lines INT NOT NULL,
+        new_start INT NOT NULL,
+        new_lines INT NOT NULL,
+        position_start INT NOT NULL,
+        position_end INT NOT NULL,
+        additions INT NOT NULL DEFAULT 0,
+        deletions INT NOT NULL DEFAULT 0,
+        content_hash CHAR(64) NOT NULL,
+        tokens INT NOT NULL,
+        content MEDIUMTEXT NOT NULL,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        UNIQUE INDEX idx_pr_file_hunk (pr_id, filename, hunk_index),
+        INDEX idx_content_hash (content_hash)
+    )
+    """,
+    """
+    CREATE TABLE ai_pr_reviews (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        pr_id BIGINT NOT NULL,
+        summary TEXT NOT NULL,
+        full_review LONGTEXT NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        INDEX idx_pr_id (pr_id),
+        INDEX idx_created_at (created_at)
+    )
+    """,
+    """
+    CREATE TABLE ai_file_reviews (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        review_id BIGINT NOT NULL,
+        pr_id BIGINT NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (review_id) REFERENCES ai_pr_reviews(id) ON DELETE CASCADE,
+        FOREIGN KEY (pr_id) REFERENCES pull_requests(id) ON DELETE CASCADE,
+        INDEX idx_review_id (review_id),
+        INDEX idx_pr_id (pr_id),
+        INDEX idx_filename (filename)
+    )
+    """,
+]
+
+TABLE_COLUMNS = {
+    "repositories": ("id", "owner", "name", "created_at", "updated_at"),
+    "pull_requests": ("id", "repo_owner", "repo_name", "number", "title", "created_at", "updated_at", "state",
+                      "user_login", "diffs", "files_changed", "additions", "deletions", "commit_count",
+                      "mergeable_state", "base_commit_sha", "base_commit_link", "last_processed_time"),
+    "pr_comments": ("id", "pr_id", "body", "created_at", "user_login", "path", "position"),
+    "pr_reviews": ("id", "pr_id", "body", "state", "created_at", "user_login"),
+    "pr_patches": ("pr_id", "path", "patch", "filename", "status", "changes", "additions", "deletions"),
+    "pr_hunks": ("pr_id", "filename", "hunk_index", "old_start", "old_lines", "new_start", "new_lines",
+                 "position_start", "position_end", "additions", "deletions", "content_hash", "tokens", "content"),
+    "ai_pr_reviews": ("id", "pr_id", "summary", "full_review", "created_at"),
+    "ai_file_reviews": ("review_id", "pr_id", "filename", "content", "created_at"),
+}
+
+# Flush a multi-row INSERT once it carries this many bytes, well below max_allowed_packet
+INSERT_BATCH_BYTES = 8 * 1024 * 1024
+
+WORDS = ["fix", "refactor", "cache", "parser", "handler", "retry", "config", "test", "update", "remove",
+         "client", "server", "query", "index", "export", "review", "timeout", "logging", "schema", "worker"]
+
+class SyntheticDataset:
+    """Deterministic generator of tracker rows with long-tailed sizes.
+
+    File counts per PR, lines per patch and comment counts follow
+    log-normal / exponential distributions, so most PRs are small and a
+    few are very large, like real repositories.
+    """
+    def __init__(self, n_prs, seed=42, reviewed_fraction=0.8):
+        self.n_prs = n_prs
+        self.rng = random.Random(seed)
+        self.reviewed_fraction = reviewed_fraction
+        self.base_time = datetime(2025, 1, 1)
+        self.repos = [(f"owner{i % 7}", f"repo{i}") for i in range(max(1, n_prs // 50))]
+
+    def _text(self, words):
+        return " ".join(self.rng.choice(WORDS) for _ in range(words))
+
+    def _time(self, start, max_hours):
+        return start + timedelta(minutes=self.rng.randint(0, max_hours * 60))
+
+    def _patch(self, lines):
+        body = [f"@@ -1,{lines} +1,{lines} @@"]
+        for n in range(lines):
+            marker = self.rng.choice("+- ")
+            body.append(f"{marker}    {self._text(self.rng.randint(3, 10))} = value_{n}")
+        return "\n".join(body)
+
+    def rows(self):
+        """Yield ``(table, row)`` pairs in foreign-key order."""
+        for owner, name in self.repos:
+            yield "repositories", (f"{owner}/{name}", owner, name, self.base_time, self.base_time)
+
+        comment_id = 1
+        review_id = 1
+        ai_review_id = 1
+
+        for pr_id in range(1, self.n_prs + 1):
+            owner, name = self.rng.choice(self.repos)
+            created = self._time(self.base_time, 24 * 300)
+            updated = self._time(created, 24 * 30)
+
+            files = min(300, max(1, int(self.rng.lognormvariate(1.5, 0.9))))
+            patches = []
+            for f in range(files):
+                lines = min(5000, max(1, int(self.rng.lognormvariate(3.0, 1.2))))
+                path = f"src/{self.rng.choice(WORDS)}/{self.rng.choice(WORDS)}_{f}.py"
+                patches.append((pr_id, path, self._patch(lines), path,
+                                self.rng.choice(["modified", "modified", "added", "removed"]),
+                                lines, lines // 2 + 1, lines // 2))
+
+            diffs = "\n".join(f"diff --git a/{p[1]} b/{p[1]}\n{p[2]}" for p in patches)
+            yield "pull_requests", (pr_id, owner, name, pr_id, self._text(6)[:255], created, updated,
+                                    self.rng.choice(["open", "closed"]), f"user{self.rng.randint(1, 200)}",
+                                    diffs, files, sum(p[6] for p in patches), sum(p[7] for p in patches),
+                                    self.rng.randint(1, 20), "clean", "0" * 40,
+                                    f"https://github.com/{owner}/{name}/commit/{'0' * 40}", updated)
+
+            for patch in patches:
+                yield "pr_patches", patch
+                # Every synthetic patch is a single hunk
+                lines = patch[2].split("\n")
+                yield "pr_hunks", (pr_id, patch[1], 0, 1, patch[5], 1, patch[5], 0, len(lines) - 1,
+                                   sum(1 for line in lines[1:] if line.startswith("+")),
+                                   sum(1 for line in lines[1:] if line.startswith("-")),
+                                   hashlib.sha256(patch[2].encode("utf-8")).hexdigest(), len(patch[2]) // 4 + 1, patch[2])
+
+            for _ in range(int(self.rng.expovariate(1 / 4))):
+                yield "pr_comments", (comment_id, pr_id, self._text(self.rng.randint(5, 150)),
+                                      self._time(created, 24 * 30), f"user{self.rng.randint(1, 200)}",
+                                      self.rng.choice(patches)[1], self.rng.randint(1, 50))
+                comment_id += 1
+
+            for _ in range(int(self.rng.expovariate(1 / 2))):
+                yield "pr_reviews", (review_id, pr_id, self._text(self.rng.randint(0, 60)),
+                                     self.rng.choice(["APPROVED", "COMMENTED", "CHANGES_REQUESTED"]),
+                                     self._time(created, 24 * 30), f"user{self.rng.randint(1, 200)}")
+                review_id += 1
+
+            if self.rng.random() < self.reviewed_fraction:
+                reviewed_at = self._time(updated, 48)
+                file_reviews = [(ai_review_id, pr_id, p[1], self._text(self.rng.randint(20, 200)), reviewed_at) for p in patches]
+                yield "ai_pr_reviews", (ai_review_id, pr_id, self._text(60),
+                                        "\n\n".join(r[3] for r in file_reviews), reviewed_at)
+                for file_review in file_reviews:
+                    yield "ai_file_reviews", file_review
+                ai_review_id += 1
+
+def _row_size(row):
+    return sum(len(value) if isinstance(value, str) else 8 for value in row)
+
+def seed_database(server_config, bench_db, dataset):
+    """Recreate ``bench_db`` and load ``dataset`` into it; return row counts and bytes."""
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{bench_db}`")
+    cursor.execute(f"CREATE DATABASE `{bench_db}` CHARACTER SET utf8mb4")
+    cursor.execute(f"USE `{bench_db}`")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    counts = {table: 0 for table in TABLE_COLUMNS}
+    total_bytes = 0
+    pending = {table: [] for table in TABLE_COLUMNS}
+    pending_bytes = {table: 0 for table in TABLE_COLUMNS}
+
+    def flush(table):
+        rows = pending[table]
+        if not rows:
+            return
+        columns = TABLE_COLUMNS[table]
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            rows
+        )
+        pending[table] = []
+        pending_bytes[table] = 0
+
+    for table, row in dataset.rows():
+        size = _row_size(row)
+        pending[table].append(row)
+        pending_bytes[table] += size
+        counts[table] += 1
+        total_bytes += size
+
+        if pending_bytes[table] >= INSERT_BATCH_BYTES or len(pending[table]) >= 1000:
+            # Parents must land before their children are flushed
+            for parent in TABLE_COLUMNS:
+                flush(parent)
+                if parent == table:
+                    break
+
+    for table in TABLE_COLUMNS:
+        flush(table)
+
+    connection.commit()
+    cursor.execute("SELECT VERSION()")
+    version = cursor.fetchone()[0]
+    cursor.close()
+    connection.close()
+    return counts, total_bytes, version
+
+def touch_prs(db_config, fraction, seed):
+    """Bump ``updated_at`` on a random fraction of PRs; return how many were touched."""
+    connection = mysql.connector.connect(
+        host=db_config["db_host"], port=db_config["db_port"], user=db_config["db_user"],
+        password=db_config["db_password"], database=db_config["db_name"]
+    )
+    cursor = connection.cursor()
+    cursor.execute("SELECT id FROM pull_requests")
+    ids = [row[0] for row in cursor.fetchall()]
+    touched = random.Random(seed).sample(ids, max(1, int(len(ids) * fraction)))
+    for chunk in pr_export._chunked(touched, 1000):
+        cursor.execute(
+            f"UPDATE pull_requests SET updated_at = updated_at + INTERVAL 1 YEAR WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+            tuple(chunk)
+        )
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return len(touched)
+
+def time_export(db, output_dir, chunk_size, state_file, layout):
+    start = time.perf_counter()
+    stats = pr_export.export_prs_to_json(db, output_dir, chunk_size, state_file, 1, layout)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 4),
+        "written": stats.written,
+        "skipped": stats.skipped,
+        "failed": stats.failed,
+        "bytes_written": stats.bytes_written,
+        "prs_per_second": round(stats.exported / elapsed, 1) if elapsed else None,
+        "mb_per_second": round(stats.bytes_written / elapsed / (1024 * 1024), 2) if elapsed else None,
+    }
+
+def time_pr_details(db, pr_ids, chunk_size):
+    """Compare one ``get_pr_details`` call per PR with chunked bulk loading."""
+    start = time.perf_counter()
+    for pr_id in pr_ids:
+        db.get_pr_details(pr_id)
+    per_pr = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chunk in pr_export._chunked(pr_ids, chunk_size):
+        db.get_pr_details_bulk(chunk)
+    bulk = time.perf_counter() - start
+
+    return {
+        "prs": len(pr_ids),
+        "per_pr_seconds": round(per_pr, 4),
+        "per_pr_ms": round(per_pr * 1000 / len(pr_ids), 3) if pr_ids else None,
+        "bulk_seconds": round(bulk, 4),
+        "bulk_ms": round(bulk * 1000 / len(pr_ids), 3) if pr_ids else None,
+        "speedup": round(per_pr / bulk, 2) if bulk else None,
+    }
+
+def run_size(args, size):
+    """Seed one dataset size and run every timed case against it."""
+    server_config = {"host": args.db_host, "port": args.db_port, "user": args.db_user, "password": args.db_password}
+    dataset = SyntheticDataset(size, args.seed)
+
+    start = time.perf_counter()
+    counts, data_bytes, version = seed_database(server_config, args.bench_db, dataset)
+    seed_seconds = time.perf_counter() - start
+
+    db_config = {
+        "db_host": args.db_host,
+        "db_port": args.db_port,
+        "db_user": args.db_user,
+        "db_password": args.db_password,
+        "db_name": args.bench_db,
+        "profile": args.profile,
+        "json_encoder": args.json_encoder,
+    }
+    layout = pr_export.ExportLayout(args.compression, args.dedupe_patches, args.json_encoder)
+    db = pr_export.DatabaseConnection(db_config)
+    if not db.connect():
+        raise SystemExit(f"Could not connect to benchmark database {args.bench_db}")
+
+    output_dir = tempfile.mkdtemp(prefix=f"pr-export-bench-{size}-")
+    state_file = os.path.join(output_dir, ".export_state.json")
+
+    try:
+        cases = {}
+        cases["full_export"] = time_export(db, output_dir, args.chunk_size, state_file, layout)
+        cases["incremental_unchanged"] = time_export(db, output_dir, args.chunk_size, state_file, layout)
+
+        touched = touch_prs(db_config, args.touch_fraction, args.seed)
+        # Start a fresh transaction so the export sees the touched rows
+        db.connection.commit()
+        cases["incremental_changed"] = time_export(db, output_dir, args.chunk_size, state_file, layout)
+        cases["incremental_changed"]["touched"] = touched
+
+        pr_ids = [pr["id"] for pr in db.get_reviewed_prs()][:args.detail_sample]
+        cases["pr_details"] = time_pr_details(db, pr_ids, args.chunk_size)
+    finally:
+        db.disconnect()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        "size": size,
+        "mysql_version": version,
+        "dataset": {"rows": counts, "bytes": data_bytes, "seed_seconds": round(seed_seconds, 2)},
+        "cases": cases,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pr_export.py against a seeded synthetic database")
+    parser.add_argument("--sizes", default="100,1000", help="Comma-separated numbers of PRs to seed and export")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic dataset")
+    parser.add_argument("--bench-db", default=os.getenv("BENCH_DB_NAME", "github_prs_bench"), help="Scratch database, dropped and recreated for every size")
+    parser.add_argument("--db-host", default=os.getenv("DB_HOST", "localhost"), help="Database host")
+    parser.add_argument("--db-port", type=int, default=int(os.getenv("DB_PORT", "3306")), help="Database port")
+    parser.add_argument("--db-user", default=os.getenv("DB_USER", "pruser"), help="Database user (needs CREATE and DROP)")
+    parser.add_argument("--db-password", default=os.getenv("DB_PASSWORD", "prpassword"), help="Database password")
+    parser.add_argument("--chunk-size", type=int, default=pr_export.DEFAULT_CHUNK_SIZE, help="PRs per bulk query round")
+    parser.add_argument("--profile", choices=sorted(pr_export.EXPORT_PROFILES), default="full", help="Export profile to benchmark")
+    parser.add_argument("--json-encoder", choices=["auto", "orjson", "json"], default="auto", help="JSON encoder backend to benchmark")
+    parser.add_argument("--compression", choices=sorted(pr_export.COMPRESSION_SUFFIXES), default="none", help="Document compression to benchmark")
+    parser.add_argument("--dedupe-patches", action="store_true", help="Benchmark the patch-deduplicated layout")
+    parser.add_argument("--touch-fraction", type=float, default=0.05, help="Fraction of PRs updated before the changed incremental run")
+    parser.add_argument("--detail-sample", type=int, default=500, help="PRs loaded in the get_pr_details comparison")
+    parser.add_argument("--output", default="-", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.bench_db == os.getenv("DB_NAME", "github_prs"):
+        parser.error("--bench-db must not be the tracker database; it is dropped on every run")
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    # Keep stdout for the results and quiet the per-chunk export logging
+    for handler in logging.getLogger().handlers:
+        if type(handler) is logging.StreamHandler and handler.stream is sys.stdout:
+            handler.setStream(sys.stderr)
+    pr_export.logger.setLevel(logging.WARNING)
+
+    results = {
+        "benchmark": "pr_export",
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "json_encoder": pr_export.DocumentEncoder(args.json_encoder).backend,
+        "profile": args.profile,
+        "compression": args.compression,
+        "dedupe_patches": args.dedupe_patches,
+        "chunk_size": args.chunk_size,
+        "seed": args.seed,
+        "runs": [],
+    }
+
+    for size in sizes:
+        print(f"Benchmarking {size} PRs...", file=sys.stderr)
+        results["runs"].append(run_size(args, size))
+
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
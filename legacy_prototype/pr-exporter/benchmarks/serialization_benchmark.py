@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Microbenchmark for the exporter's row conversion and JSON encoding.
+
+Builds synthetic rows of a large PR (many patches and comments) with the
+exporter's own pr_patches and pr_comments columns, and compares the
+original per-cell ``isinstance`` conversion plus stdlib ``json`` against
+the column-plan conversion and the orjson encoder. Results are printed as JSON.
+
+    python benchmarks/serialization_benchmark.py --patches 2000 --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from mysql.connector import FieldType
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pr_export
+
+# Cursor field types matching the exporter's column types; MySQL reports
+# TEXT columns as BLOB
+FIELD_TYPES = {
+    "int64": FieldType.LONGLONG, "int32": FieldType.LONG,
+    "string": FieldType.VAR_STRING, "timestamp": FieldType.DATETIME,
+}
+TEXT_COLUMNS = {"patch", "body", "diffs", "summary", "full_review", "content"}
+
+def description(table):
+    """Cursor metadata for the exporter's columns of ``table``."""
+    return [
+        (name, FieldType.BLOB if name in TEXT_COLUMNS else FIELD_TYPES[kind])
+        for name, kind in pr_export.PARQUET_COLUMNS[table]
+    ]
+
+PATCH_DESCRIPTION = description("pr_patches")
+COMMENT_DESCRIPTION = description("pr_comments")
+
+def synthetic_rows(table, count, seed):
+    """Generate ``count`` rows with the exporter's columns of ``table`` and random sizes."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    rows = []
+    for i in range(count):
+        created = base + timedelta(minutes=rng.randint(0, 500000))
+        lines = rng.randint(5, 400)
+        filename = f"src/module_{i % 97}/file_{i}.py"
+        values = {
+            "id": i, "pr_id": 1, "path": filename, "filename": filename,
+            "status": rng.choice(["added", "modified", "removed"]),
+            "additions": lines, "deletions": rng.randint(0, lines), "changes": lines,
+            "user_login": f"user{i % 31}", "position": rng.randint(1, lines),
+        }
+        if table == "pr_patches":
+            values["patch"] = "\n".join(f"+    value_{n} = compute({n}, 'x')" for n in range(lines))
+        else:
+            values["body"] = " ".join(rng.choice(["looks", "good", "nit", "fix", "this"]) for _ in range(rng.randint(5, 120)))
+
+        defaults = {"int64": i, "int32": lines, "string": "", "timestamp": created}
+        rows.append({
+            name: values.get(name, defaults[kind])
+            for name, kind in pr_export.PARQUET_COLUMNS[table]
+        })
+    return rows
+
+def legacy_convert(row):
+    """The original conversion: type-check every cell."""
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            row[key] = value.isoformat()
+    return row
+
+def copy_rows(rows):
+    return [dict(row) for row in rows]
+
+def run_case(name, patches, comments, convert, encode, repeat):
+    """Time conversion plus encoding of one PR document, best of ``repeat``."""
+    best = None
+    size = 0
+    for _ in range(repeat):
+        patch_rows, comment_rows = copy_rows(patches), copy_rows(comments)
+        start = time.perf_counter()
+        convert(patch_rows, PATCH_DESCRIPTION)
+        convert(comment_rows, COMMENT_DESCRIPTION)
+        data = encode({"id": 1, "patches": patch_rows, "comments": comment_rows})
+        elapsed = time.perf_counter() - start
+        size = len(data)
+        best = elapsed if best is None else min(best, elapsed)
+
+    rows = len(patches) + len(comments)
+    return {
+        "case": name,
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(best, 6),
+        "rows_per_second": round(rows / best, 1),
+        "mb_per_second": round(size / best / (1024 * 1024), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exporter row serialization")
+    parser.add_argument("--patches", type=int, default=2000, help="Patch rows in the synthetic PR")
+    parser.add_argument("--comments", type=int, default=2000, help="Comment rows in the synthetic PR")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the best time is reported")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic rows")
+    parser.add_argument("--indent", action="store_true", help="Pretty-print like the uncompressed per-PR layout")
+    args = parser.parse_args()
+
+    patches = synthetic_rows("pr_patches", args.patches, args.seed)
+    comments = synthetic_rows("pr_comments", args.comments, args.seed + 1)
+    indent = 2 if args.indent else None
+
+    def convert_legacy(rows, description):
+        for row in rows:
+            legacy_convert(row)
+
+    def convert_plan(rows, description):
+        plan = pr_export.temporal_columns(description)
+        for row in rows:
+            pr_export.convert_temporals(row, plan)
+
+    def convert_none(rows, description):
+        pass
+
+    def encode_legacy(document):
+        if indent:
+            return json.dumps(document, indent=2).encode('utf-8')
+        return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+    cases = [
+        ("legacy isinstance + json", convert_legacy, encode_legacy),
+        ("column plan + json", convert_plan, lambda doc: pr_export.DocumentEncoder("json").encode(doc, indent)),
+    ]
+    if pr_export.orjson is not None:
+        cases.append(("orjson native datetimes", convert_none, lambda doc: pr_export.DocumentEncoder("orjson").encode(doc, indent)))
+
+    results = [run_case(name, patches, comments, convert, encode, args.repeat) for name, convert, encode in cases]
+    baseline = results[0]["seconds"]
+    for result in results:
+        result["speedup"] = round(baseline / result["seconds"], 2)
+
+    print(json.dumps({"patches": args.patches, "comments": args.comments, "indent": args.indent, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,7 @@ while true; do
     # If AI reviewer has run since our last export or if we're forcing an export
     if [ -z "$AI_COMPLETION_TIME" ] || [ -z "$LAST_EXPORT_TIME" ] || [ "$AI_COMPLETION_TIME" -gt "$LAST_EXPORT_TIME" ]; then
       echo 'New AI reviews detected or forcing export. Starting export...'
-      python /app/pr_export.py --output-dir /app/exported_prs
+      python /app/pr_export.py --output-dir /app/exported_prs --incremental
       # Update the last export time
       date +%s > /coordination/last_export_time
       echo 'Export completed.'
@@ -33,7 +33,7 @@ while true; do
   else
     echo 'Waiting for AI reviewer to complete first run...'
     # Force an export attempt if AI reviewer hasn't run yet but we might have reviews
-    python /app/pr_export.py --output-dir /app/exported_prs
+    python /app/pr_export.py --output-dir /app/exported_prs --incremental
     date +%s > /coordination/last_export_time
   fi
   
@@ -5,10 +5,36 @@ import json
 import logging
 import argparse
 import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
+from mysql.connector import Error, FieldType, errorcode
+from datetime import datetime, date
 import time
 import pathlib
+import multiprocessing
+import hashlib
+import tempfile
+import gzip
+import shutil
+import urllib.parse
+import socket
+import select
+import signal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
 
 # Configure logging
 logging.basicConfig(
@@ -21,39 +47,274 @@ logging.basicConfig(
 )
 logger = logging.getLogger("pr-export")
 
+# Number of PRs loaded per bulk query round
+DEFAULT_CHUNK_SIZE = 200
+
+# Content hashes of the files in the output directory
+MANIFEST_FILENAME = ".export_manifest.json"
+
+# File suffixes for the supported --compression codecs
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Directory (relative to the exported documents) holding deduplicated patches
+PATCH_STORE_DIRNAME = "patches"
+
+# Column types of the tables written by --format parquet. Child tables also
+# get the PR's repo_owner / repo_name so they can be filtered and
+# partitioned without a join.
+PARQUET_COLUMNS = {
+    "pull_requests": [
+        ("id", "int64"), ("repo_owner", "string"), ("repo_name", "string"), ("number", "int32"),
+        ("title", "string"), ("created_at", "timestamp"), ("updated_at", "timestamp"),
+        ("state", "string"), ("user_login", "string"), ("diffs", "string"),
+        ("files_changed", "int32"), ("additions", "int32"), ("deletions", "int32"),
+        ("commit_count", "int32"), ("mergeable_state", "string"), ("base_commit_sha", "string"),
+        ("base_commit_link", "string"), ("last_processed_time", "timestamp"),
+    ],
+    "pr_comments": [
+        ("id", "int64"), ("pr_id", "int64"), ("body", "string"), ("created_at", "timestamp"),
+        ("user_login", "string"), ("path", "string"), ("position", "int32"),
+    ],
+    "pr_reviews": [
+        ("id", "int64"), ("pr_id", "int64"), ("body", "string"), ("state", "string"),
+        ("created_at", "timestamp"), ("user_login", "string"),
+    ],
+    "pr_patches": [
+        ("id", "int64"), ("pr_id", "int64"), ("path", "string"), ("patch", "string"),
+        ("filename", "string"), ("status", "string"), ("changes", "int32"),
+        ("additions", "int32"), ("deletions", "int32"),
+    ],
+    "pr_hunks": [
+        ("id", "int64"), ("pr_id", "int64"), ("filename", "string"), ("hunk_index", "int32"),
+        ("old_start", "int32"), ("old_lines", "int32"), ("new_start", "int32"), ("new_lines", "int32"),
+        ("position_start", "int32"), ("position_end", "int32"), ("additions", "int32"),
+        ("deletions", "int32"), ("content_hash", "string"), ("tokens", "int32"),
+    ],
+    "ai_pr_reviews": [
+        ("id", "int64"), ("pr_id", "int64"), ("summary", "string"), ("full_review", "string"),
+        ("created_at", "timestamp"),
+    ],
+    "ai_file_reviews": [
+        ("id", "int64"), ("review_id", "int64"), ("pr_id", "int64"), ("filename", "string"),
+        ("content", "string"), ("created_at", "timestamp"),
+    ],
+}
+
+# Tables read by an export; locked while parallel workers open their snapshots
+EXPORTED_TABLES = ("pull_requests", "pr_comments", "pr_reviews", "pr_patches", "pr_hunks", "ai_pr_reviews", "ai_file_reviews")
+
+# Exported tables owned by another service that may not exist yet; the AI
+# reviewer creates pr_hunks on its first run. Missing ones are left out of
+# the export until they appear.
+OPTIONAL_TABLES = ("pr_hunks",)
+
+# Every pull_requests column except the diffs LONGTEXT
+PR_METADATA_COLUMNS = (
+    "id", "repo_owner", "repo_name", "number", "title", "created_at", "updated_at", "state",
+    "user_login", "files_changed", "additions", "deletions", "commit_count", "mergeable_state",
+    "base_commit_sha", "base_commit_link", "last_processed_time",
+)
+
+# Every pr_hunks column except the hunk text, which readers slice out of the
+# patch by position instead of exporting it twice
+HUNK_INDEX_COLUMNS = tuple(name for name, _ in PARQUET_COLUMNS["pr_hunks"])
+
+# Named export profiles: for each table included in the export, the columns
+# to fetch (None means every column). Tables left out are neither queried
+# nor serialized. The light profiles keep the diffs and patch LONGTEXTs off
+# the wire, which dominate transfer and file size.
+EXPORT_PROFILES = {
+    "full": dict({table: None for table in EXPORTED_TABLES}, pr_hunks=HUNK_INDEX_COLUMNS),
+    "reviews-only": {
+        "pull_requests": PR_METADATA_COLUMNS,
+        "pr_comments": None,
+        "pr_reviews": None,
+        "ai_pr_reviews": None,
+        "ai_file_reviews": None,
+    },
+    "metadata": {
+        "pull_requests": PR_METADATA_COLUMNS,
+        "pr_comments": ("id", "pr_id", "created_at", "user_login", "path", "position"),
+        "pr_reviews": ("id", "pr_id", "state", "created_at", "user_login"),
+        "pr_patches": ("id", "pr_id", "path", "filename", "status", "changes", "additions", "deletions"),
+        "pr_hunks": HUNK_INDEX_COLUMNS,
+        "ai_pr_reviews": ("id", "pr_id", "created_at"),
+        "ai_file_reviews": ("id", "review_id", "pr_id", "filename", "created_at"),
+    },
+}
+
+# Rows per Parquet row group for --format parquet
+DEFAULT_ROW_GROUP_SIZE = 50000
+
+# Seconds the coordinator waits for a worker to open its snapshot
+SNAPSHOT_READY_TIMEOUT = 60
+
+# Outbox rows consumed per daemon cycle
+OUTBOX_BATCH_SIZE = 5000
+
 class DatabaseConnection:
     """Handles database connections and queries."""
     def __init__(self, config):
         self.config = config
         self.connection = None
+        self.base_profile = EXPORT_PROFILES[config.get("profile", "full")]
+        self.profile = self.base_profile
+        self.missing_tables = set()
+        self.encoder = DocumentEncoder(config.get("json_encoder", "auto"))
+    
+    def _fetch_rows(self, cursor, query, params):
+        """Run a query and return its rows ready for the document encoder."""
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        
+        # Convert only the columns the result metadata marks as temporal
+        if not self.encoder.converts_temporals:
+            plan = temporal_columns(cursor.description)
+            for row in rows:
+                convert_temporals(row, plan)
+        
+        return rows
+    
+    def columns(self, table, alias=None):
+        """Return the SELECT list for ``table`` under the export profile."""
+        prefix = f"{alias}." if alias else ""
+        columns = self.profile[table]
+        if columns is None:
+            return f"{prefix}*"
+        return ", ".join(f"{prefix}{column}" for column in columns)
+    
+    def _open_connection(self, **options):
+        """Open a new MySQL connection using this instance's settings."""
+        return mysql.connector.connect(
+            host=self.config["db_host"],
+            port=self.config["db_port"],
+            user=self.config["db_user"],
+            password=self.config["db_password"],
+            database=self.config["db_name"],
+            **options
+        )
     
     def connect(self):
         """Connect to the MySQL database."""
         try:
-            self.connection = mysql.connector.connect(
-                host=self.config["db_host"],
-                port=self.config["db_port"],
-                user=self.config["db_user"],
-                password=self.config["db_password"],
-                database=self.config["db_name"]
-            )
+            self.connection = self._open_connection()
             
             if self.connection.is_connected():
                 logger.info(f"Connected to MySQL database: {self.config['db_name']}")
+                self.check_optional_tables()
                 return True
         except Error as e:
             logger.error(f"Error connecting to MySQL database: {e}")
         
         return False
     
+    def check_optional_tables(self):
+        """Drop any of OPTIONAL_TABLES that do not exist yet from the export profile."""
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT table_name FROM information_schema.tables "
+            f"WHERE table_schema = DATABASE() AND table_name IN ({', '.join(['%s'] * len(OPTIONAL_TABLES))})",
+            OPTIONAL_TABLES
+        )
+        present = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        self.connection.rollback()
+        
+        missing = set(OPTIONAL_TABLES) - present
+        if missing != self.missing_tables:
+            for table in sorted(missing):
+                logger.info(f"No {table} table yet, leaving it out of the export")
+        
+        self.missing_tables = missing
+        self.profile = {table: columns for table, columns in self.base_profile.items() if table not in missing}
+    
     def disconnect(self):
         """Disconnect from the database."""
         if self.connection and self.connection.is_connected():
             self.connection.close()
             logger.info("Disconnected from MySQL database")
     
-    def get_reviewed_prs(self):
-        """Get a list of PRs that have AI reviews."""
+    def start_snapshot(self, connection=None):
+        """Begin a read-only REPEATABLE READ transaction with a consistent snapshot.
+        
+        ``connection`` defaults to this instance's own connection.
+        """
+        cursor = (connection or self.connection).cursor()
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        cursor.close()
+    
+    def refresh(self):
+        """End the current read transaction so the next query sees new commits.
+        
+        mysql.connector does not autocommit, so a long-lived connection would
+        otherwise keep reading the snapshot taken by its first query.
+        """
+        if not self.connection or not self.connection.is_connected():
+            return self.connect()
+        self.connection.rollback()
+        self.check_optional_tables()
+        return True
+    
+    def read_outbox(self, limit=OUTBOX_BATCH_SIZE):
+        """Return the oldest pending ``export_outbox`` rows as ``(id, pr_id)`` dicts."""
+        try:
+            cursor = self.connection.cursor(dictionary=True)
+            cursor.execute("SELECT id, pr_id FROM export_outbox ORDER BY id LIMIT %s", (limit,))
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        except Error as e:
+            if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                raise
+            logger.debug("No export_outbox table yet, relying on incremental sweeps")
+            return []
+    
+    def delete_outbox(self, ids):
+        """Delete the consumed outbox rows ``ids``.
+        
+        Only the rows that were read are deleted. A row with a lower id
+        than the newest one read can still commit after the read, as
+        auto-increment ids are assigned before commit, and must be kept.
+        """
+        cursor = self.connection.cursor()
+        
+        for chunk in _chunked(list(ids), 1000):
+            cursor.execute(f"DELETE FROM export_outbox WHERE id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+        
+        self.connection.commit()
+        cursor.close()
+    
+    def end_snapshot(self):
+        """Finish the snapshot transaction opened by start_snapshot."""
+        self.connection.rollback()
+    
+    def lock_snapshot_tables(self):
+        """Take read locks on every exported table; returns False if not permitted."""
+        try:
+            cursor = self.connection.cursor()
+            tables = [table for table in EXPORTED_TABLES if table not in self.missing_tables]
+            cursor.execute("LOCK TABLES " + ", ".join(f"{table} READ" for table in tables))
+            cursor.close()
+            return True
+        except Error as e:
+            logger.warning(f"Could not lock tables for a shared snapshot, the snapshots of workers or streams may differ: {e}")
+            return False
+    
+    def unlock_tables(self):
+        """Release the locks taken by lock_snapshot_tables."""
+        cursor = self.connection.cursor()
+        cursor.execute("UNLOCK TABLES")
+        cursor.close()
+    
+    def get_reviewed_prs(self, with_watermarks=False, pr_ids=None):
+        """Get a list of PRs that have AI reviews.
+        
+        With ``with_watermarks`` each row also carries a ``watermark`` column:
+        the latest of the PR's ``updated_at``, its newest AI review and its
+        newest GitHub comment or review. ``pr_ids`` restricts the result to
+        those PRs.
+        """
         prs = []
         
         try:
@@ -63,16 +324,60 @@ class DatabaseConnection:
             
             cursor = self.connection.cursor(dictionary=True)
             
-            # Fixed query: Include updated_at in SELECT clause
-            query = """
-                SELECT pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, pr.updated_at
-                FROM pull_requests pr
-                JOIN ai_pr_reviews rev ON pr.id = rev.pr_id
-                GROUP BY pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, pr.updated_at
-                ORDER BY pr.updated_at DESC
-            """
+            pr_filter = child_filter = ""
+            params = ()
+            if pr_ids is not None:
+                if not pr_ids:
+                    return prs
+                placeholders = ', '.join(['%s'] * len(pr_ids))
+                pr_filter = f"WHERE pr.id IN ({placeholders})"
+                child_filter = f"WHERE pr_id IN ({placeholders})"
+            
+            if with_watermarks:
+                query = """
+                    SELECT pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, pr.updated_at,
+                           GREATEST(pr.updated_at,
+                                    rev.latest_ai_review_at,
+                                    COALESCE(com.latest_comment_at, pr.updated_at),
+                                    COALESCE(ghr.latest_review_at, pr.updated_at)) AS watermark
+                    FROM pull_requests pr
+                    JOIN (
+                        SELECT pr_id, MAX(created_at) AS latest_ai_review_at
+                        FROM ai_pr_reviews
+                        {child_filter}
+                        GROUP BY pr_id
+                    ) rev ON rev.pr_id = pr.id
+                    LEFT JOIN (
+                        SELECT pr_id, MAX(created_at) AS latest_comment_at
+                        FROM pr_comments
+                        {child_filter}
+                        GROUP BY pr_id
+                    ) com ON com.pr_id = pr.id
+                    LEFT JOIN (
+                        SELECT pr_id, MAX(created_at) AS latest_review_at
+                        FROM pr_reviews
+                        {child_filter}
+                        GROUP BY pr_id
+                    ) ghr ON ghr.pr_id = pr.id
+                    {pr_filter}
+                    ORDER BY pr.updated_at DESC
+                """.format(child_filter=child_filter, pr_filter=pr_filter)
+                if pr_ids is not None:
+                    params = tuple(pr_ids) * 4
+            else:
+                # Fixed query: Include updated_at in SELECT clause
+                query = """
+                    SELECT pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, pr.updated_at
+                    FROM pull_requests pr
+                    JOIN ai_pr_reviews rev ON pr.id = rev.pr_id
+                    {pr_filter}
+                    GROUP BY pr.id, pr.repo_owner, pr.repo_name, pr.number, pr.title, pr.updated_at
+                    ORDER BY pr.updated_at DESC
+                """.format(pr_filter=pr_filter)
+                if pr_ids is not None:
+                    params = tuple(pr_ids)
             
-            cursor.execute(query)
+            cursor.execute(query, params)
             prs = cursor.fetchall()
             
             logger.info(f"Found {len(prs)} PRs with AI reviews")
@@ -86,171 +391,1243 @@ class DatabaseConnection:
     
     def get_pr_details(self, pr_id):
         """Get all details for a specific PR."""
-        pr_data = {}
+        return self.get_pr_details_bulk([pr_id]).get(pr_id, {})
+    
+    def get_pr_details_bulk(self, pr_ids):
+        """Get all details for a chunk of PRs, keyed by PR id.
+        
+        Runs one query per table (``WHERE pr_id IN (...)``) instead of one
+        query per table per PR, then assembles the documents in memory.
+        If any query fails nothing is returned, so every PR of the chunk is
+        counted as failed and exported again later.
+        """
+        pr_details = {}
+        
+        if not pr_ids:
+            return pr_details
         
         try:
             if not self.connection or not self.connection.is_connected():
                 if not self.connect():
-                    return pr_data
+                    return pr_details
             
             cursor = self.connection.cursor(dictionary=True)
+            placeholders = ", ".join(["%s"] * len(pr_ids))
+            params = tuple(pr_ids)
             
             # Get PR basic information
-            query = """
-                SELECT pr.*
+            query = f"""
+                SELECT {self.columns('pull_requests', 'pr')}
                 FROM pull_requests pr
-                WHERE pr.id = %s
+                WHERE pr.id IN ({placeholders})
             """
             
-            cursor.execute(query, (pr_id,))
-            pr_data = cursor.fetchone()
+            for pr_data in self._fetch_rows(cursor, query, params):
+                for table, key in DOCUMENT_KEYS.items():
+                    if table in self.profile:
+                        pr_data[key] = []
+                pr_details[pr_data['id']] = pr_data
             
-            if pr_data:
-                # Convert datetime objects to strings for JSON serialization
-                for key, value in pr_data.items():
-                    if isinstance(value, datetime):
-                        pr_data[key] = value.isoformat()
-                
-                # Get PR comments
-                query = """
-                    SELECT *
+            if not pr_details:
+                cursor.close()
+                return pr_details
+            
+            # Get PR comments
+            if 'pr_comments' in self.profile:
+                query = f"""
+                    SELECT {self.columns('pr_comments')}
                     FROM pr_comments
-                    WHERE pr_id = %s
-                    ORDER BY created_at ASC
+                    WHERE pr_id IN ({placeholders})
+                    ORDER BY pr_id, created_at ASC
                 """
                 
-                cursor.execute(query, (pr_id,))
-                comments = cursor.fetchall()
-                
-                for comment in comments:
-                    for key, value in comment.items():
-                        if isinstance(value, datetime):
-                            comment[key] = value.isoformat()
-                
-                pr_data['comments'] = comments
-                
-                # Get PR reviews (original GitHub reviews)
-                query = """
-                    SELECT *
+                for comment in self._fetch_rows(cursor, query, params):
+                    pr_details[comment['pr_id']]['comments'].append(comment)
+            
+            # Get PR reviews (original GitHub reviews)
+            if 'pr_reviews' in self.profile:
+                query = f"""
+                    SELECT {self.columns('pr_reviews')}
                     FROM pr_reviews
-                    WHERE pr_id = %s
-                    ORDER BY created_at ASC
+                    WHERE pr_id IN ({placeholders})
+                    ORDER BY pr_id, created_at ASC
                 """
                 
-                cursor.execute(query, (pr_id,))
-                reviews = cursor.fetchall()
-                
-                for review in reviews:
-                    for key, value in review.items():
-                        if isinstance(value, datetime):
-                            review[key] = value.isoformat()
-                
-                pr_data['github_reviews'] = reviews
-                
-                # Get PR patches
-                query = """
-                    SELECT *
+                for review in self._fetch_rows(cursor, query, params):
+                    pr_details[review['pr_id']]['github_reviews'].append(review)
+            
+            # Get PR patches
+            if 'pr_patches' in self.profile:
+                query = f"""
+                    SELECT {self.columns('pr_patches')}
                     FROM pr_patches
-                    WHERE pr_id = %s
+                    WHERE pr_id IN ({placeholders})
+                    ORDER BY pr_id, id
                 """
                 
-                cursor.execute(query, (pr_id,))
-                patches = cursor.fetchall()
-                pr_data['patches'] = patches
+                for patch in self._fetch_rows(cursor, query, params):
+                    pr_details[patch['pr_id']]['patches'].append(patch)
+            
+            # Get the hunk index of the patches
+            if 'pr_hunks' in self.profile:
+                query = f"""
+                    SELECT {self.columns('pr_hunks')}
+                    FROM pr_hunks
+                    WHERE pr_id IN ({placeholders})
+                    ORDER BY pr_id, filename, hunk_index
+                """
                 
-                # Get AI reviews
-                query = """
-                    SELECT *
+                for hunk in self._fetch_rows(cursor, query, params):
+                    pr_details[hunk['pr_id']]['hunks'].append(hunk)
+            
+            # Get AI reviews
+            ai_reviews = {}
+            if 'ai_pr_reviews' in self.profile:
+                query = f"""
+                    SELECT {self.columns('ai_pr_reviews')}
                     FROM ai_pr_reviews
-                    WHERE pr_id = %s
-                    ORDER BY created_at DESC
+                    WHERE pr_id IN ({placeholders})
+                    ORDER BY pr_id, created_at DESC
                 """
                 
-                cursor.execute(query, (pr_id,))
-                ai_reviews = cursor.fetchall()
+                for review in self._fetch_rows(cursor, query, params):
+                    if 'ai_file_reviews' in self.profile:
+                        review['file_reviews'] = []
+                    ai_reviews[review['id']] = review
+                    pr_details[review['pr_id']]['ai_reviews'].append(review)
+            
+            # Get AI file reviews for every AI review in the chunk at once
+            if ai_reviews and 'ai_file_reviews' in self.profile:
+                review_placeholders = ", ".join(["%s"] * len(ai_reviews))
+                query = f"""
+                    SELECT {self.columns('ai_file_reviews')}
+                    FROM ai_file_reviews
+                    WHERE review_id IN ({review_placeholders})
+                    ORDER BY review_id, id
+                """
                 
-                for review in ai_reviews:
-                    for key, value in review.items():
-                        if isinstance(value, datetime):
-                            review[key] = value.isoformat()
+                for file_review in self._fetch_rows(cursor, query, tuple(ai_reviews)):
+                    ai_reviews[file_review['review_id']]['file_reviews'].append(file_review)
+            
+            cursor.close()
+            
+        except Error as e:
+            # Documents missing some tables must not be written as complete
+            logger.error(f"Error querying PR details, failing the chunk of {len(pr_ids)} PRs: {e}")
+            return {}
+        
+        return pr_details
+    
+    def stream_reviewed_pr_details(self):
+        """Yield the document of every reviewed PR, one at a time.
+        
+        Each table is read through its own unbuffered cursor ordered by
+        ``pr_id`` and the streams are merge-joined, so only the current PR's
+        rows are ever held in memory. MySQL allows one open result set per
+        connection, hence one connection per stream. Every stream reads its
+        own consistent snapshot, opened while this connection holds read
+        locks on the exported tables, so all of them see the same data.
+        """
+        connections = []
+        
+        try:
+            streams = {}
+            locked = self.lock_snapshot_tables()
+            try:
+                for name, query in STREAM_QUERIES.items():
+                    if name not in self.profile:
+                        continue
+                    
+                    connection = self._open_connection(consume_results=True)
+                    connections.append(connection)
+                    self.start_snapshot(connection)
+                    cursor = connection.cursor(dictionary=True, buffered=False)
+                    cursor.execute(query.format(columns=self.columns(name, 't')))
+                    streams[name] = _PrGroupedStream(cursor, not self.encoder.converts_temporals)
+            finally:
+                if locked:
+                    self.unlock_tables()
+            
+            for pr_data in streams['pull_requests'].rows():
+                pr_id = pr_data['id']
                 
-                # Get AI file reviews
-                if ai_reviews:
-                    for ai_review in ai_reviews:
-                        query = """
-                            SELECT *
-                            FROM ai_file_reviews
-                            WHERE review_id = %s
-                        """
-                        
-                        cursor.execute(query, (ai_review['id'],))
-                        file_reviews = cursor.fetchall()
-                        
-                        for file_review in file_reviews:
-                            for key, value in file_review.items():
-                                if isinstance(value, datetime):
-                                    file_review[key] = value.isoformat()
+                for table in ('pr_comments', 'pr_reviews', 'pr_patches', 'pr_hunks'):
+                    if table in streams:
+                        pr_data[DOCUMENT_KEYS[table]] = streams[table].take(pr_id)
+                
+                if 'ai_pr_reviews' in streams:
+                    ai_reviews = streams['ai_pr_reviews'].take(pr_id)
+                    
+                    if 'ai_file_reviews' in streams:
+                        reviews_by_id = {}
+                        for review in ai_reviews:
+                            review['file_reviews'] = []
+                            reviews_by_id[review['id']] = review
                         
-                        ai_review['file_reviews'] = file_reviews
+                        for file_review in streams['ai_file_reviews'].take(pr_id):
+                            review = reviews_by_id.get(file_review['review_id'])
+                            if review is not None:
+                                review['file_reviews'].append(file_review)
+                    
+                    pr_data['ai_reviews'] = ai_reviews
                 
-                pr_data['ai_reviews'] = ai_reviews
+                yield pr_data
+        
+        finally:
+            for connection in connections:
+                try:
+                    connection.close()
+                except Error as e:
+                    logger.warning(f"Error closing streaming connection: {e}")
+
+# Keys under which each child table's rows appear in a PR document
+DOCUMENT_KEYS = {
+    'pr_comments': 'comments',
+    'pr_reviews': 'github_reviews',
+    'pr_patches': 'patches',
+    'pr_hunks': 'hunks',
+    'ai_pr_reviews': 'ai_reviews',
+}
+
+# Per-table queries for the streaming export, each ordered by PR id so they
+# can be merge-joined against the pull_requests stream. ``{columns}`` is the
+# profile's SELECT list for alias ``t``.
+STREAM_QUERIES = {
+    'pull_requests': """
+        SELECT {columns}
+        FROM pull_requests t
+        WHERE EXISTS (SELECT 1 FROM ai_pr_reviews rev WHERE rev.pr_id = t.id)
+        ORDER BY t.id
+    """,
+    'pr_comments': """
+        SELECT {columns}
+        FROM pr_comments t
+        WHERE t.pr_id IN (SELECT pr_id FROM ai_pr_reviews)
+        ORDER BY t.pr_id, t.created_at ASC
+    """,
+    'pr_reviews': """
+        SELECT {columns}
+        FROM pr_reviews t
+        WHERE t.pr_id IN (SELECT pr_id FROM ai_pr_reviews)
+        ORDER BY t.pr_id, t.created_at ASC
+    """,
+    'pr_patches': """
+        SELECT {columns}
+        FROM pr_patches t
+        WHERE t.pr_id IN (SELECT pr_id FROM ai_pr_reviews)
+        ORDER BY t.pr_id, t.id
+    """,
+    'pr_hunks': """
+        SELECT {columns}
+        FROM pr_hunks t
+        WHERE t.pr_id IN (SELECT pr_id FROM ai_pr_reviews)
+        ORDER BY t.pr_id, t.filename, t.hunk_index
+    """,
+    'ai_pr_reviews': """
+        SELECT {columns}
+        FROM ai_pr_reviews t
+        ORDER BY t.pr_id, t.created_at DESC
+    """,
+    'ai_file_reviews': """
+        SELECT {columns}
+        FROM ai_file_reviews t
+        ORDER BY t.pr_id, t.review_id, t.id
+    """,
+}
+
+class _PrGroupedStream:
+    """Reads rows ordered by ``pr_id`` from an unbuffered cursor one PR at a time."""
+    def __init__(self, cursor, convert=True):
+        self.cursor = cursor
+        self.plan = temporal_columns(cursor.description) if convert else ()
+        self.pending = None
+        self.exhausted = False
+    
+    def rows(self):
+        """Yield the remaining rows as they arrive from the server."""
+        for row in self.cursor:
+            yield convert_temporals(row, self.plan)
+    
+    def _next(self):
+        if self.pending is None and not self.exhausted:
+            self.pending = self.cursor.fetchone()
+            if self.pending is None:
+                self.exhausted = True
+        return self.pending
+    
+    def take(self, pr_id):
+        """Return the rows for ``pr_id``, skipping rows of PRs not in the export."""
+        rows = []
+        
+        while True:
+            row = self._next()
+            if row is None or row['pr_id'] > pr_id:
+                break
             
-            cursor.close()
+            self.pending = None
+            if row['pr_id'] == pr_id:
+                rows.append(convert_temporals(row, self.plan))
+        
+        return rows
+
+# Column types whose values come back as datetime / date objects
+TEMPORAL_FIELD_TYPES = frozenset((FieldType.DATETIME, FieldType.TIMESTAMP, FieldType.DATE, FieldType.NEWDATE))
+
+def temporal_columns(description):
+    """Return the names of a result's temporal columns from cursor metadata.
+    
+    The plan is built once per result set, so each row only touches the
+    few columns that need converting instead of type-checking every cell.
+    """
+    if not description:
+        return ()
+    return tuple(column[0] for column in description if column[1] in TEMPORAL_FIELD_TYPES)
+
+def convert_temporals(row, plan):
+    """Convert the planned temporal columns of a row to ISO strings in place."""
+    for name in plan:
+        value = row[name]
+        if value is not None:
+            row[name] = value.isoformat()
+    return row
+
+def _json_default(value):
+    """Encode temporal values the conversion plan did not cover."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class DocumentEncoder:
+    """Encodes PR documents to UTF-8 JSON bytes.
+    
+    ``auto`` picks orjson when it is installed. orjson serializes datetimes
+    natively, so rows skip conversion entirely; the stdlib ``json`` backend
+    relies on the per-result conversion plan instead.
+    """
+    def __init__(self, backend="auto"):
+        if backend == "auto":
+            backend = "orjson" if orjson is not None else "json"
+        if backend == "orjson" and orjson is None:
+            raise ValueError("The orjson encoder is not installed")
+        if backend not in ("orjson", "json"):
+            raise ValueError(f"Unknown JSON encoder: {backend}")
+        self.backend = backend
+    
+    @property
+    def converts_temporals(self):
+        """Whether the backend encodes datetime values itself."""
+        return self.backend == "orjson"
+    
+    def encode(self, document, indent=False):
+        """Encode a document, pretty-printed with two spaces if ``indent``."""
+        if self.backend == "orjson":
+            return orjson.dumps(document, option=orjson.OPT_INDENT_2 if indent else 0)
+        if indent:
+            return json.dumps(document, indent=2, default=_json_default).encode('utf-8')
+        return json.dumps(document, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+def _chunked(items, size):
+    """Yield successive lists of at most ``size`` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def pr_export_filename(pr, compression="none"):
+    """Return the JSON filename used for an exported PR."""
+    return f"{pr['repo_owner']}_{pr['repo_name']}_PR{pr['number']}.json{COMPRESSION_SUFFIXES[compression]}"
+
+def compress_bytes(data, compression):
+    """Compress ``data`` deterministically with the given codec."""
+    if compression == "gzip":
+        # A fixed mtime keeps the output byte-identical for identical input
+        return gzip.compress(data, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+class PatchStore:
+    """Content-addressed store for patch bodies, shared by all PR documents.
+    
+    Each distinct patch text is written once to
+    ``<root>/<first two hex digits>/<sha256>.patch[.gz|.zst]``.
+    """
+    def __init__(self, root, compression="none"):
+        self.root = pathlib.Path(root)
+        self.compression = compression
+    
+    def path_for(self, digest):
+        return self.root / digest[:2] / f"{digest}.patch{COMPRESSION_SUFFIXES[self.compression]}"
+    
+    def put(self, text):
+        """Store ``text`` if it is not stored yet and return its SHA-256."""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        
+        if not path.exists():
+            atomic_write(path, compress_bytes(data, self.compression))
+        
+        return digest
+
+class ExportLayout:
+    """How PR documents are encoded on disk.
+    
+    The default layout is the original one: one indented JSON file per PR
+    with patch bodies inline. With compression the documents are written
+    compact and compressed; with ``dedupe_patches`` every ``patch`` and the
+    PR's ``diffs`` are moved to a :class:`PatchStore` next to the documents
+    and replaced by ``patch_sha256`` / ``diffs_sha256`` references.
+    """
+    def __init__(self, compression="none", dedupe_patches=False, json_encoder="auto"):
+        self.compression = compression
+        self.dedupe_patches = dedupe_patches
+        self.encoder = DocumentEncoder(json_encoder)
+    
+    def filename(self, pr):
+        return pr_export_filename(pr, self.compression)
+    
+    def settings(self):
+        """The options that change what is written, as recorded in the export state."""
+        return {"compression": self.compression, "dedupe_patches": self.dedupe_patches}
+    
+    def patch_store(self, directory):
+        return PatchStore(pathlib.Path(directory) / PATCH_STORE_DIRNAME, self.compression)
+    
+    def prepare(self, pr_details, store):
+        """Move patch bodies of a document into ``store`` when deduplicating."""
+        if not self.dedupe_patches:
+            return pr_details
+        
+        for patch in pr_details.get('patches', []):
+            if patch.get('patch'):
+                patch['patch_sha256'] = store.put(patch.pop('patch'))
+        
+        if pr_details.get('diffs'):
+            pr_details['diffs_sha256'] = store.put(pr_details.pop('diffs'))
+        
+        pr_details['export_format'] = 2
+        pr_details['patch_store'] = PATCH_STORE_DIRNAME
+        return pr_details
+    
+    def serialize(self, pr_details):
+        """Encode a document as uncompressed JSON bytes."""
+        return self.encoder.encode(pr_details, indent=self.compression == "none")
+    
+    def open_stream(self, path):
+        """Open a binary stream for NDJSON output with this layout's compression."""
+        if self.compression == "gzip":
+            # Opening by filename lets GzipFile own (and close) the file;
+            # stdout is wrapped instead and left open for the caller.
+            if path == '-':
+                return gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb', mtime=0)
+            return gzip.GzipFile(path, mode='wb', mtime=0)
+        raw = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().stream_writer(raw, closefd=path != '-')
+        return raw
+
+def _watermark_key(value):
+    """Normalize a watermark value from the database for the state file."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def atomic_write(path, data):
+    """Write bytes to ``path`` via a temp file in the same directory plus rename.
+    
+    Readers see either the old or the new file, never a partial one. The
+    temp file is hidden and does not end in ``.json``.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+def _load_json_state(path, key):
+    """Load one mapping from a JSON state file, treating problems as empty."""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        return state.get(key, {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state file {path}: {e}")
+        return {}
+
+def load_export_state(state_file, profile="full", layout=None):
+    """Load the persisted per-PR export watermarks, keyed by PR id string.
+    
+    Watermarks recorded under a different export profile or layout are
+    discarded, so switching either re-exports everything once.
+    """
+    if _load_json_state(state_file, "profile") not in (profile, {}):
+        logger.info(f"Export profile changed to {profile}, ignoring previous watermarks")
+        return {}
+    settings = (layout or ExportLayout()).settings()
+    if _load_json_state(state_file, "layout") not in (settings, {}):
+        logger.info(f"Export layout changed to {settings}, ignoring previous watermarks")
+        return {}
+    return _load_json_state(state_file, "watermarks")
+
+def save_export_state(state_file, watermarks, profile="full", layout=None):
+    """Persist the per-PR export watermarks, replacing the file atomically."""
+    settings = (layout or ExportLayout()).settings()
+    state = {"version": 1, "profile": profile, "layout": settings, "watermarks": watermarks}
+    atomic_write(state_file, json.dumps(state).encode('utf-8'))
+
+def load_manifest(manifest_file):
+    """Load the content hashes of exported files, keyed by filename."""
+    return _load_json_state(manifest_file, "files")
+
+def save_manifest(manifest_file, manifest):
+    """Persist the content hash manifest, replacing the file atomically."""
+    atomic_write(manifest_file, json.dumps({"version": 1, "files": manifest}).encode('utf-8'))
+
+def write_if_changed(filepath, data, manifest, compression="none"):
+    """Write ``data`` unless the manifest shows identical content already on disk.
+    
+    The hash is taken over the uncompressed bytes, so unchanged documents
+    are never compressed. Returns ``(sha256, bytes on disk)`` if the file
+    was written, None if it was skipped.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    
+    if manifest.get(filepath.name) == digest and filepath.exists():
+        return None
+    
+    payload = compress_bytes(data, compression)
+    atomic_write(filepath, payload)
+    return digest, len(payload)
+
+def select_changed_prs(prs, watermarks, output_path, layout):
+    """Return the PRs whose watermark moved past the last exported one.
+    
+    A PR is also selected when its export file has gone missing. Watermarks
+    for PRs that no longer have AI reviews are dropped from ``watermarks``.
+    """
+    current_ids = {str(pr['id']) for pr in prs}
+    for stale_id in set(watermarks) - current_ids:
+        del watermarks[stale_id]
+    
+    changed = []
+    for pr in prs:
+        last_exported = watermarks.get(str(pr['id']))
+        if last_exported is None or _watermark_key(pr['watermark']) > last_exported:
+            changed.append(pr)
+        elif not (output_path / layout.filename(pr)).exists():
+            changed.append(pr)
+    
+    return changed
+
+class ExportStats:
+    """Counts and timings for one export run or one export worker."""
+    def __init__(self, worker=None):
+        self.worker = worker
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.elapsed = 0.0
+        self.exported_ids = []
+        self.failed_ids = []
+        self.manifest_updates = {}
+    
+    @property
+    def exported(self):
+        """PRs whose export file is up to date, whether written or skipped."""
+        return self.written + self.skipped
+    
+    def merge(self, other):
+        """Fold another worker's counts into this one."""
+        self.written += other.written
+        self.skipped += other.skipped
+        self.failed += other.failed
+        self.bytes_written += other.bytes_written
+        self.exported_ids.extend(other.exported_ids)
+        self.failed_ids.extend(other.failed_ids)
+        self.manifest_updates.update(other.manifest_updates)
+    
+    def summary(self):
+        """Return the written / skipped / failed counts."""
+        return f"{self.written} written, {self.skipped} skipped (unchanged), {self.failed} failed"
+    
+    def throughput(self):
+        """Return a human-readable count and throughput line."""
+        elapsed = max(self.elapsed, 1e-9)
+        megabytes = self.bytes_written / (1024 * 1024)
+        return (f"{self.exported} PRs, {megabytes:.2f} MB in {self.elapsed:.2f}s "
+                f"({self.exported / elapsed:.1f} PRs/s, {megabytes / elapsed:.2f} MB/s)")
+
+def export_pr_chunks(db, prs, output_path, chunk_size, stats, manifest, layout, on_chunk_exported=None):
+    """Bulk-load and write the given PRs chunk by chunk, updating ``stats``.
+    
+    Files whose content hash matches ``manifest`` are left untouched; new
+    hashes are collected in ``stats.manifest_updates``.
+    ``on_chunk_exported`` is called with the PRs exported in each chunk.
+    """
+    store = layout.patch_store(output_path)
+    
+    for chunk in _chunked(prs, chunk_size):
+        # Load every PR in the chunk with one query per table
+        chunk_details = db.get_pr_details_bulk([pr['id'] for pr in chunk])
+        exported = []
+        
+        for pr in chunk:
+            try:
+                pr_number = pr['number']
+                repo_owner = pr['repo_owner']
+                repo_name = pr['repo_name']
+                
+                pr_details = chunk_details.get(pr['id'])
+                
+                if pr_details:
+                    # Create a filename with repo and PR number
+                    filepath = output_path / layout.filename(pr)
+                    data = layout.serialize(layout.prepare(pr_details, store))
+                    
+                    # Write to JSON file, unless the content is unchanged
+                    written = write_if_changed(filepath, data, manifest, layout.compression)
+                    
+                    if written:
+                        digest, size = written
+                        stats.written += 1
+                        stats.bytes_written += size
+                        stats.manifest_updates[filepath.name] = digest
+                        logger.info(f"Exported PR #{pr_number} from {repo_owner}/{repo_name} to {filepath}")
+                    else:
+                        stats.skipped += 1
+                        logger.debug(f"PR #{pr_number} from {repo_owner}/{repo_name} unchanged, skipped {filepath}")
+                    
+                    stats.exported_ids.append(pr['id'])
+                    exported.append(pr)
+                else:
+                    stats.failed += 1
+                    stats.failed_ids.append(pr['id'])
+                    logger.warning(f"No details found for PR #{pr_number} from {repo_owner}/{repo_name}")
             
+            except Exception as e:
+                stats.failed += 1
+                stats.failed_ids.append(pr['id'])
+                logger.error(f"Error exporting PR {pr.get('number', 'unknown')}: {e}")
+        
+        if on_chunk_exported:
+            on_chunk_exported(exported)
+
+def split_into_ranges(prs, parts):
+    """Split PRs into at most ``parts`` contiguous PR id ranges of similar size."""
+    ordered = sorted(prs, key=lambda pr: pr['id'])
+    parts = max(1, min(parts, len(ordered)))
+    size, remainder = divmod(len(ordered), parts)
+    
+    ranges = []
+    start = 0
+    for index in range(parts):
+        end = start + size + (1 if index < remainder else 0)
+        ranges.append(ordered[start:end])
+        start = end
+    
+    return ranges
+
+def _export_worker(worker_id, config, prs, output_dir, chunk_size, layout, manifest, ready_queue):
+    """Export one PR id range inside a consistent-snapshot transaction."""
+    stats = ExportStats(worker_id)
+    started = time.monotonic()
+    db = DatabaseConnection(config)
+    
+    if not db.connect():
+        ready_queue.put((worker_id, False))
+        stats.failed = len(prs)
+        stats.failed_ids = [pr['id'] for pr in prs]
+        return stats
+    
+    try:
+        try:
+            db.start_snapshot()
         except Error as e:
-            logger.error(f"Error querying PR details: {e}")
+            logger.error(f"Worker {worker_id} could not start a consistent snapshot: {e}")
+            ready_queue.put((worker_id, False))
+            stats.failed = len(prs)
+            stats.failed_ids = [pr['id'] for pr in prs]
+            return stats
         
-        return pr_data
+        ready_queue.put((worker_id, True))
+        
+        if prs:
+            logger.info(f"Worker {worker_id} exporting {len(prs)} PRs (ids {prs[0]['id']}-{prs[-1]['id']})")
+        export_pr_chunks(db, prs, pathlib.Path(output_dir), chunk_size, stats, manifest, layout)
+        db.end_snapshot()
+    
+    finally:
+        db.disconnect()
+        stats.elapsed = time.monotonic() - started
+    
+    return stats
 
-def export_prs_to_json(db, output_dir):
-    """Export all reviewed PRs to individual JSON files."""
+def export_prs_parallel(db, prs, output_dir, chunk_size, workers, layout, manifest):
+    """Export PRs with a pool of worker processes reading one shared snapshot.
+    
+    The coordinator holds read locks on the exported tables while every
+    worker opens its consistent-snapshot transaction, so no write can
+    commit between the first and the last worker's snapshot. The locks are
+    released as soon as all snapshots exist.
+    """
+    ranges = split_into_ranges(prs, workers)
+    stats = ExportStats()
+    worker_stats = []
+    context = multiprocessing.get_context()
+    
+    with context.Manager() as manager:
+        ready_queue = manager.Queue()
+        locked = db.lock_snapshot_tables()
+        
+        with context.Pool(len(ranges)) as pool:
+            try:
+                results = []
+                for worker_id, worker_prs in enumerate(ranges):
+                    # Only ship each worker the manifest entries it can hit
+                    worker_manifest = {}
+                    for pr in worker_prs:
+                        filename = layout.filename(pr)
+                        if filename in manifest:
+                            worker_manifest[filename] = manifest[filename]
+                    
+                    results.append(pool.apply_async(
+                        _export_worker,
+                        (worker_id, db.config, worker_prs, output_dir, chunk_size, layout, worker_manifest, ready_queue)
+                    ))
+                
+                for _ in ranges:
+                    worker_id, ready = ready_queue.get(timeout=SNAPSHOT_READY_TIMEOUT)
+                    if not ready:
+                        logger.warning(f"Worker {worker_id} did not open a snapshot")
+            finally:
+                if locked:
+                    db.unlock_tables()
+            
+            for result in results:
+                worker_stats.append(result.get())
+    
+    for worker in sorted(worker_stats, key=lambda worker: worker.worker):
+        logger.info(f"Worker {worker.worker}: {worker.throughput()}; {worker.summary()}")
+        stats.merge(worker)
+    
+    return stats
+
+def export_prs_to_json(db, output_dir, chunk_size=DEFAULT_CHUNK_SIZE, state_file=None, workers=1, layout=None, pr_ids=None):
+    """Export all reviewed PRs to individual JSON files.
+    
+    When ``state_file`` is given the export is incremental: only PRs whose
+    watermark advanced since the last run are reloaded and rewritten. With
+    ``workers`` above one the PRs are exported by a process pool. Files
+    are replaced atomically and only when their content hash changed.
+    ``layout`` selects compression and patch deduplication. ``pr_ids``
+    exports just those PRs, whether or not their watermark moved.
+    """
+    started = time.monotonic()
+    layout = layout or ExportLayout()
+    
     # Create output directory if it doesn't exist
     output_path = pathlib.Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
+    incremental = state_file is not None
+    manifest_file = output_path / MANIFEST_FILENAME
+    manifest = load_manifest(manifest_file)
+    
     # Get all PRs that have been reviewed by AI
-    prs = db.get_reviewed_prs()
+    prs = db.get_reviewed_prs(with_watermarks=incremental, pr_ids=pr_ids)
     
-    for pr in prs:
+    if incremental:
+        profile = db.config.get("profile", "full")
+        watermarks = load_export_state(state_file, profile, layout)
+        if pr_ids is None:
+            reviewed_count = len(prs)
+            prs = select_changed_prs(prs, watermarks, output_path, layout)
+            logger.info(f"Incremental export: {len(prs)} of {reviewed_count} reviewed PRs changed since last export")
+    
+    stats = ExportStats()
+    
+    def record_progress(exported_prs):
+        # Persist progress after every chunk so an interrupted run resumes.
+        # Only PRs whose document loaded every table advance the manifest
+        # and their watermark; failed PRs keep their old state and are retried.
+        exported_files = {layout.filename(pr) for pr in exported_prs}
+        updates = {name: digest for name, digest in stats.manifest_updates.items() if name in exported_files}
+        if updates:
+            manifest.update(updates)
+            save_manifest(manifest_file, manifest)
+        
+        if incremental:
+            for pr in exported_prs:
+                watermarks[str(pr['id'])] = _watermark_key(pr['watermark'])
+            save_export_state(state_file, watermarks, profile, layout)
+    
+    if workers > 1 and len(prs) > 1:
+        stats = export_prs_parallel(db, prs, output_dir, chunk_size, workers, layout, manifest)
+        exported_ids = set(stats.exported_ids) - set(stats.failed_ids)
+        record_progress([pr for pr in prs if pr['id'] in exported_ids])
+    else:
+        export_pr_chunks(db, prs, output_path, chunk_size, stats, manifest, layout, record_progress)
+    
+    if incremental and not prs:
+        save_export_state(state_file, watermarks, profile, layout)
+    
+    stats.elapsed = time.monotonic() - started
+    return stats
+
+class ExportDaemon:
+    """Long-running incremental exporter driven by the ``export_outbox`` table.
+    
+    The AI reviewer appends an outbox row in the same transaction that
+    stores a review and may also send a datagram to ``notify_socket``. The
+    daemon keeps one connection open. It wakes on a datagram or every
+    ``poll_interval`` seconds and waits until ``debounce`` seconds pass
+    without new signals. It then exports only the signalled PRs and deletes
+    the outbox rows it consumed. Every ``sweep_interval`` seconds a regular
+    incremental export also runs, to catch changes that bypass the outbox
+    (new GitHub comments, a lost outbox row).
+    """
+    def __init__(self, db, output_dir, chunk_size, state_file, layout, notify_socket=None,
+                 debounce=2.0, poll_interval=30.0, sweep_interval=300.0):
+        self.db = db
+        self.output_dir = output_dir
+        self.chunk_size = chunk_size
+        self.state_file = state_file
+        self.layout = layout
+        self.notify_socket = notify_socket
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.running = False
+        self.sock = None
+        self.wake_read = None
+        self.wake_write = None
+    
+    def stop(self, signum=None, frame=None):
+        """Ask the daemon to exit after the current cycle."""
+        self.running = False
+        if self.wake_write is not None:
+            try:
+                os.write(self.wake_write, b"x")
+            except OSError:
+                pass
+    
+    def _open_socket(self):
         try:
-            pr_id = pr['id']
-            pr_number = pr['number']
-            repo_owner = pr['repo_owner']
-            repo_name = pr['repo_name']
-            
-            # Get all details for this PR
-            pr_details = db.get_pr_details(pr_id)
-            
-            if pr_details:
-                # Create a filename with repo and PR number
-                filename = f"{repo_owner}_{repo_name}_PR{pr_number}.json"
-                filepath = output_path / filename
+            os.unlink(self.notify_socket)
+        except FileNotFoundError:
+            pass
+        
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.notify_socket)
+        self.sock.setblocking(False)
+        logger.info(f"Listening for export notifications on {self.notify_socket}")
+    
+    def _close_socket(self):
+        self.sock.close()
+        self.sock = None
+        try:
+            os.unlink(self.notify_socket)
+        except FileNotFoundError:
+            pass
+    
+    def _wait(self, timeout):
+        """Block until a notification arrives, ``timeout`` passes or the daemon stops.
+        
+        Returns True if at least one notification was received.
+        """
+        watched = [self.wake_read] + ([self.sock] if self.sock else [])
+        readable, _, _ = select.select(watched, [], [], max(timeout, 0))
+        
+        if self.sock not in readable:
+            return False
+        
+        # Drain every queued datagram, they all mean "look at the outbox"
+        while True:
+            try:
+                self.sock.recv(64)
+            except BlockingIOError:
+                return True
+    
+    def _settle(self):
+        """Wait until no notification arrived for ``debounce`` seconds, at most 10 periods."""
+        deadline = time.monotonic() + self.debounce * 10
+        while self.running and time.monotonic() < deadline:
+            if not self._wait(self.debounce):
+                break
+    
+    def run_cycle(self, sweep=False):
+        """Export what the outbox signals, or everything that changed when ``sweep``."""
+        if not self.db.refresh():
+            return None
+        
+        rows = self.db.read_outbox()
+        if not rows and not sweep:
+            return None
+        
+        pr_ids = sorted({row['pr_id'] for row in rows})
+        stats = ExportStats()
+        
+        def export(only_pr_ids=None):
+            run = export_prs_to_json(self.db, self.output_dir, self.chunk_size, self.state_file, 1, self.layout, only_pr_ids)
+            stats.merge(run)
+            stats.elapsed += run.elapsed
+        
+        if sweep:
+            export()
+            # Signalled PRs whose watermark did not move still get exported
+            exported_ids = set(stats.exported_ids)
+            pr_ids = [pr_id for pr_id in pr_ids if pr_id not in exported_ids]
+        
+        if pr_ids:
+            logger.info(f"Outbox signalled {len(pr_ids)} PRs")
+            export(pr_ids)
+        
+        if rows:
+            # Keep the rows of failed PRs so the next cycle retries them
+            failed = set(stats.failed_ids)
+            self.db.delete_outbox([row['id'] for row in rows if row['pr_id'] not in failed])
+        
+        logger.info(f"Export cycle: {stats.throughput()}; {stats.summary()}")
+        return stats
+    
+    def run(self):
+        """Run export cycles until SIGTERM or SIGINT."""
+        self.running = True
+        self.wake_read, self.wake_write = os.pipe()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        if self.notify_socket:
+            self._open_socket()
+        
+        logger.info(f"Export daemon started (poll {self.poll_interval}s, sweep {self.sweep_interval}s, debounce {self.debounce}s)")
+        next_sweep = time.monotonic()
+        
+        try:
+            while self.running:
+                sweep = time.monotonic() >= next_sweep
                 
-                # Write to JSON file
-                with open(filepath, 'w') as f:
-                    json.dump(pr_details, f, indent=2)
+                try:
+                    self.run_cycle(sweep)
+                    # Do not hold a read snapshot open while idle
+                    self.db.refresh()
+                except Exception as e:
+                    logger.error(f"Export cycle failed: {e}")
                 
-                logger.info(f"Exported PR #{pr_number} from {repo_owner}/{repo_name} to {filepath}")
-            else:
-                logger.warning(f"No details found for PR #{pr_number} from {repo_owner}/{repo_name}")
+                if sweep:
+                    next_sweep = time.monotonic() + self.sweep_interval
+                
+                if not self.running:
+                    break
+                
+                if self._wait(min(self.poll_interval, next_sweep - time.monotonic())):
+                    self._settle()
+        finally:
+            if self.sock:
+                self._close_socket()
+            os.close(self.wake_read)
+            os.close(self.wake_write)
+            self.wake_write = None
+        
+        logger.info("Export daemon stopped")
+
+class NdjsonWriter:
+    """Writes one compact JSON document per line to a file or stdout.
+    
+    With ``max_bytes`` set, output rotates to numbered part files
+    (``exported_prs-00001.ndjson``, ``exported_prs-00002.ndjson``, ...)
+    once a part would grow past the limit of uncompressed bytes. Patch
+    deduplication stores bodies in a patch store next to the output.
+    """
+    def __init__(self, path, max_bytes=0, layout=None, store_dir=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.layout = layout or ExportLayout()
+        self.store = self.layout.patch_store(store_dir or pathlib.Path(path).parent)
+        self.part = 0
+        self.part_bytes = 0
+        self.total_bytes = 0
+        self.file = None
+        self.paths = []
+    
+    def _open_next_part(self):
+        self.close()
+        self.part += 1
+        self.part_bytes = 0
+        
+        if self.path == '-':
+            self.file = self.layout.open_stream('-')
+            return
+        
+        path = pathlib.Path(self.path)
+        if self.max_bytes:
+            path = path.with_name(f"{path.stem}-{self.part:05d}{path.suffix}")
+        path = path.with_name(path.name + COMPRESSION_SUFFIXES[self.layout.compression])
+        path.parent.mkdir(parents=True, exist_ok=True)
         
-        except Exception as e:
-            logger.error(f"Error exporting PR {pr.get('number', 'unknown')}: {e}")
+        self.file = self.layout.open_stream(str(path))
+        self.paths.append(str(path))
     
-    return len(prs)
+    def write(self, document):
+        document = self.layout.prepare(document, self.store)
+        line = self.layout.encoder.encode(document) + b"\n"
+        
+        if self.file is None or (self.max_bytes and self.path != '-' and self.part_bytes and self.part_bytes + len(line) > self.max_bytes):
+            self._open_next_part()
+        
+        self.file.write(line)
+        self.part_bytes += len(line)
+        self.total_bytes += len(line)
+    
+    def close(self):
+        if self.file is None:
+            return
+        
+        if self.path == '-':
+            if self.file is not sys.stdout.buffer:
+                self.file.close()
+            sys.stdout.buffer.flush()
+        else:
+            self.file.close()
+        self.file = None
+
+def export_prs_to_ndjson(db, writer):
+    """Stream every reviewed PR into an NDJSON writer, one document per line."""
+    exported_count = 0
+    
+    try:
+        for pr_details in db.stream_reviewed_pr_details():
+            writer.write(pr_details)
+            exported_count += 1
+            
+            if exported_count % 1000 == 0:
+                logger.info(f"Streamed {exported_count} PRs ({writer.total_bytes / 1e6:.1f} MB)")
+    finally:
+        writer.close()
+    
+    logger.info(f"Streamed {exported_count} PRs ({writer.total_bytes / 1e6:.1f} MB) to {', '.join(writer.paths) or writer.path}")
+    return exported_count
+
+def _parquet_columns(table, profile):
+    """Return the (name, type) columns of ``table`` kept by the export profile."""
+    selected = profile[table]
+    return [column for column in PARQUET_COLUMNS[table] if selected is None or column[0] in selected]
+
+def _parquet_schema(table, partition_by_repo, profile):
+    """Build the Arrow schema for one exported table."""
+    types = {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us"),
+    }
+    columns = _parquet_columns(table, profile)
+    if table != "pull_requests":
+        columns += [("repo_owner", "string"), ("repo_name", "string")]
+    if partition_by_repo:
+        # Hive-style partitions carry the repo in the directory names
+        columns = [column for column in columns if column[0] not in ("repo_owner", "repo_name")]
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+def _parquet_query(table, profile):
+    """Return the query streaming one table's rows for reviewed PRs."""
+    if table == "pull_requests":
+        columns = ", ".join(f"pr.{name}" for name, _ in _parquet_columns(table, profile))
+        return f"""
+            SELECT {columns}
+            FROM pull_requests pr
+            WHERE EXISTS (SELECT 1 FROM ai_pr_reviews rev WHERE rev.pr_id = pr.id)
+        """
+    
+    columns = ", ".join(f"t.{name}" for name, _ in _parquet_columns(table, profile))
+    return f"""
+        SELECT {columns}, pr.repo_owner, pr.repo_name
+        FROM {table} t
+        JOIN pull_requests pr ON pr.id = t.pr_id
+        WHERE t.pr_id IN (SELECT pr_id FROM ai_pr_reviews)
+    """
+
+class ParquetTableWriter:
+    """Writes one table as Parquet, buffering rows into fixed-size row groups.
+    
+    Without partitioning the table goes to ``<root>/<table>.parquet``. With
+    ``partition_by_repo`` each repository gets its own Hive-style directory,
+    ``<root>/<table>/repo_owner=<owner>/repo_name=<name>/part-00000.parquet``.
+    """
+    def __init__(self, root, table, row_group_size, partition_by_repo, profile):
+        self.root = pathlib.Path(root)
+        self.table = table
+        self.row_group_size = row_group_size
+        self.partition_by_repo = partition_by_repo
+        self.schema = _parquet_schema(table, partition_by_repo, profile)
+        self.writers = {}
+        self.buffers = {}
+        self.rows_written = 0
+    
+    def _path(self, partition):
+        if not self.partition_by_repo:
+            return self.root / f"{self.table}.parquet"
+        owner, name = partition
+        return (self.root / self.table / f"repo_owner={urllib.parse.quote(owner, safe='')}"
+                / f"repo_name={urllib.parse.quote(name, safe='')}" / "part-00000.parquet")
+    
+    def write_rows(self, rows):
+        for row in rows:
+            partition = (row['repo_owner'], row['repo_name']) if self.partition_by_repo else None
+            buffer = self.buffers.setdefault(partition, [])
+            buffer.append(row)
+            
+            if len(buffer) >= self.row_group_size:
+                self._flush(partition)
+    
+    def _flush(self, partition):
+        rows = self.buffers.get(partition)
+        if not rows:
+            return
+        
+        writer = self.writers.get(partition)
+        if writer is None:
+            path = self._path(partition)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+            self.writers[partition] = writer
+        
+        writer.write_table(pa.Table.from_pylist(rows, schema=self.schema), row_group_size=self.row_group_size)
+        self.rows_written += len(rows)
+        self.buffers[partition] = []
+    
+    def close(self):
+        for partition in list(self.buffers):
+            self._flush(partition)
+        
+        if not self.writers and not self.partition_by_repo:
+            # Keep an empty table so readers always find every file
+            pq.write_table(self.schema.empty_table(), str(self._path(None)))
+        
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+def export_prs_to_parquet(db, parquet_dir, row_group_size=DEFAULT_ROW_GROUP_SIZE, partition_by_repo=False):
+    """Export the reviewed PRs as one Parquet table per source table.
+    
+    Rows keep their database types (timestamps, integers) and are pulled
+    through an unbuffered cursor in row-group sized batches. The tables are
+    written to a staging directory that replaces ``parquet_dir`` once every
+    table is complete, so readers never see a half-written dataset.
+    """
+    target = pathlib.Path(parquet_dir)
+    staging = target.with_name(f".{target.name}.staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    
+    row_counts = {}
+    
+    for table in PARQUET_COLUMNS:
+        if table not in db.profile:
+            continue
+        
+        writer = ParquetTableWriter(staging, table, row_group_size, partition_by_repo, db.profile)
+        cursor = db.connection.cursor(dictionary=True, buffered=False)
+        
+        try:
+            cursor.execute(_parquet_query(table, db.profile))
+            while True:
+                rows = cursor.fetchmany(row_group_size)
+                if not rows:
+                    break
+                writer.write_rows(rows)
+        finally:
+            cursor.close()
+            writer.close()
+        
+        row_counts[table] = writer.rows_written
+        logger.info(f"Wrote {writer.rows_written} rows of {table} to Parquet")
+    
+    # Swap the finished dataset into place
+    previous = target.with_name(f".{target.name}.previous")
+    shutil.rmtree(previous, ignore_errors=True)
+    if target.exists():
+        os.replace(target, previous)
+    os.replace(staging, target)
+    shutil.rmtree(previous, ignore_errors=True)
+    
+    return row_counts
 
 def main():
     """Main entry point for the PR export script."""
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="PR Export to JSON")
     parser.add_argument("--output-dir", default="exported_prs", help="Directory to export JSON files to")
+    parser.add_argument("--format", choices=["json", "ndjson", "parquet"], default=os.getenv("EXPORT_FORMAT", "json"), help="One JSON file per PR, a single streamed NDJSON file, or one Parquet table per source table")
+    parser.add_argument("--ndjson-file", default=os.getenv("EXPORT_NDJSON_FILE"), help="NDJSON output path, or '-' for stdout (default: <output-dir>/exported_prs.ndjson)")
+    parser.add_argument("--rotate-mb", type=float, default=float(os.getenv("EXPORT_ROTATE_MB", "0")), help="Rotate NDJSON output into parts of at most this many MB (0 disables rotation)")
+    parser.add_argument("--parquet-dir", default=os.getenv("EXPORT_PARQUET_DIR"), help="Parquet output directory (default: <output-dir>/parquet)")
+    parser.add_argument("--row-group-size", type=int, default=int(os.getenv("EXPORT_ROW_GROUP_SIZE", str(DEFAULT_ROW_GROUP_SIZE))), help="Rows per Parquet row group")
+    parser.add_argument("--partition-by-repo", action="store_true", default=os.getenv("EXPORT_PARTITION_BY_REPO", "").lower() in ("1", "true", "yes"), help="Partition Parquet tables by repo_owner / repo_name")
+    parser.add_argument("--profile", choices=sorted(EXPORT_PROFILES), default=os.getenv("EXPORT_PROFILE", "full"), help="Which columns and child tables to fetch and export")
+    parser.add_argument("--json-encoder", choices=["auto", "orjson", "json"], default=os.getenv("EXPORT_JSON_ENCODER", "auto"), help="JSON encoder backend (auto uses orjson when installed)")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION_SUFFIXES), default=os.getenv("EXPORT_COMPRESSION", "none"), help="Compress exported documents (compressed JSON is written compact)")
+    parser.add_argument("--dedupe-patches", action="store_true", default=os.getenv("EXPORT_DEDUPE_PATCHES", "").lower() in ("1", "true", "yes"), help="Store patch bodies once in a content-addressed patches/ directory and reference them by hash")
     parser.add_argument("--db-host", default=os.getenv("DB_HOST", "localhost"), help="Database host")
     parser.add_argument("--db-port", type=int, default=int(os.getenv("DB_PORT", "3306")), help="Database port")
     parser.add_argument("--db-user", default=os.getenv("DB_USER", "pruser"), help="Database user")
     parser.add_argument("--db-password", default=os.getenv("DB_PASSWORD", "prpassword"), help="Database password")
     parser.add_argument("--db-name", default=os.getenv("DB_NAME", "github_prs"), help="Database name")
+    parser.add_argument("--incremental", action="store_true", default=os.getenv("EXPORT_INCREMENTAL", "").lower() in ("1", "true", "yes"), help="Only re-export PRs that changed since the last export")
+    parser.add_argument("--state-file", default=os.getenv("EXPORT_STATE_FILE"), help="Watermark file for incremental exports (default: <output-dir>/.export_state.json)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EXPORT_WORKERS", "1")), help="Number of export worker processes, each with its own DB connection")
+    parser.add_argument("--daemon", action="store_true", default=os.getenv("EXPORT_DAEMON", "").lower() in ("1", "true", "yes"), help="Keep running and export PRs as the AI reviewer signals them through the export_outbox table")
+    parser.add_argument("--notify-socket", default=os.getenv("EXPORT_NOTIFY_SOCKET"), help="UNIX datagram socket the daemon listens on for immediate wakeups")
+    parser.add_argument("--debounce", type=float, default=float(os.getenv("EXPORT_DEBOUNCE", "2")), help="Seconds without new signals before the daemon exports")
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("EXPORT_POLL_INTERVAL", "30")), help="Seconds between daemon checks of the export outbox")
+    parser.add_argument("--sweep-interval", type=float, default=float(os.getenv("EXPORT_SWEEP_INTERVAL", "300")), help="Seconds between full incremental sweeps in daemon mode")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("EXPORT_CHUNK_SIZE", str(DEFAULT_CHUNK_SIZE))), help="Number of PRs to load per bulk query round")
     args = parser.parse_args()
     
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.compression == "zstd" and zstandard is None:
+        parser.error("--compression zstd requires the zstandard package")
+    if args.json_encoder == "orjson" and orjson is None:
+        parser.error("--json-encoder orjson requires the orjson package")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.format != "json" and (args.incremental or args.workers > 1 or args.daemon):
+        parser.error("--incremental, --workers and --daemon are only supported with --format json")
+    if args.daemon and args.workers > 1:
+        parser.error("--daemon exports with a single worker")
+    if args.daemon and (args.poll_interval <= 0 or args.sweep_interval <= 0 or args.debounce < 0):
+        parser.error("--poll-interval and --sweep-interval must be positive and --debounce not negative")
+    if args.format == "parquet" and pq is None:
+        parser.error("--format parquet requires the pyarrow package")
+    if args.row_group_size < 1:
+        parser.error("--row-group-size must be at least 1")
+    
+    ndjson_file = args.ndjson_file or os.path.join(args.output_dir, "exported_prs.ndjson")
+    if args.format == "ndjson" and ndjson_file == "-":
+        # Keep stdout clean for the NDJSON stream
+        for handler in logging.getLogger().handlers:
+            if type(handler) is logging.StreamHandler and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+    
+    state_file = None
+    if args.incremental or args.daemon:
+        state_file = args.state_file or os.path.join(args.output_dir, ".export_state.json")
+    
     # Load configuration
     config = {
         "db_host": args.db_host,
@@ -258,9 +1635,18 @@ def main():
         "db_user": args.db_user,
         "db_password": args.db_password,
         "db_name": args.db_name,
-        "output_dir": args.output_dir
+        "profile": args.profile,
+        "json_encoder": args.json_encoder,
+        "output_dir": args.output_dir,
+        "chunk_size": args.chunk_size,
+        "state_file": state_file,
+        "workers": args.workers,
+        "compression": args.compression,
+        "dedupe_patches": args.dedupe_patches
     }
     
+    layout = ExportLayout(args.compression, args.dedupe_patches, args.json_encoder)
+    
     # Initialize database connection
     db = DatabaseConnection(config)
     
@@ -269,9 +1655,23 @@ def main():
         return 1
     
     try:
-        # Export PRs to JSON
-        exported_count = export_prs_to_json(db, args.output_dir)
-        logger.info(f"Exported {exported_count} PRs to JSON files in {args.output_dir}")
+        if args.format == "parquet":
+            parquet_dir = args.parquet_dir or os.path.join(args.output_dir, "parquet")
+            row_counts = export_prs_to_parquet(db, parquet_dir, args.row_group_size, args.partition_by_repo)
+            logger.info(f"Exported {row_counts.get('pull_requests', 0)} PRs to Parquet tables in {parquet_dir}")
+        elif args.daemon:
+            daemon = ExportDaemon(db, args.output_dir, args.chunk_size, state_file, layout, args.notify_socket,
+                                  args.debounce, args.poll_interval, args.sweep_interval)
+            daemon.run()
+        elif args.format == "ndjson":
+            store_dir = args.output_dir if ndjson_file == "-" else os.path.dirname(ndjson_file) or "."
+            writer = NdjsonWriter(ndjson_file, int(args.rotate_mb * 1024 * 1024), layout, store_dir)
+            export_prs_to_ndjson(db, writer)
+        else:
+            # Export PRs to JSON
+            stats = export_prs_to_json(db, args.output_dir, args.chunk_size, state_file, args.workers, layout)
+            logger.info(f"Exported {stats.throughput()} to JSON files in {args.output_dir}")
+            logger.info(f"Export summary: {stats.summary()}")
         
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
@@ -0,0 +1,19 @@
+import os
+import importlib.util
+
+import pytest
+
+EXPORTER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pr_export.py")
+
+@pytest.fixture(scope="session")
+def pr_export(tmp_path_factory):
+    """The pr_export module, imported from a scratch directory for its log file."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("exporter"))
+    try:
+        spec = importlib.util.spec_from_file_location("pr_export", EXPORTER_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
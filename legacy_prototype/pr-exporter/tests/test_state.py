@@ -0,0 +1,105 @@
+import os
+import json
+from datetime import datetime
+
+import pytest
+
+def pr(pr_id, watermark, number=None):
+    return {'id': pr_id, 'repo_owner': "acme", 'repo_name': "api", 'number': number or pr_id, 'watermark': watermark}
+
+def test_select_changed_prs(pr_export, tmp_path):
+    layout = pr_export.ExportLayout()
+    old, new = datetime(2025, 1, 1), datetime(2025, 1, 2)
+    prs = [pr(1, old), pr(2, new), pr(3, old), pr(4, old)]
+    watermarks = {"1": old.isoformat(), "2": old.isoformat(), "3": old.isoformat(), "9": old.isoformat()}
+    # PR 1's file is on disk, PR 3's went missing, PR 4 was never exported
+    (tmp_path / layout.filename(prs[0])).write_bytes(b"{}")
+
+    changed = pr_export.select_changed_prs(prs, watermarks, tmp_path, layout)
+
+    assert [p['id'] for p in changed] == [2, 3, 4]
+    assert "9" not in watermarks
+
+def test_select_changed_prs_looks_for_the_layout_filename(pr_export, tmp_path):
+    watermark = datetime(2025, 1, 1)
+    prs = [pr(1, watermark)]
+    watermarks = {"1": watermark.isoformat()}
+    (tmp_path / pr_export.ExportLayout().filename(prs[0])).write_bytes(b"{}")
+
+    assert pr_export.select_changed_prs(prs, watermarks, tmp_path, pr_export.ExportLayout("gzip")) == prs
+
+def test_export_state_round_trip(pr_export, tmp_path):
+    state_file = tmp_path / "state.json"
+    layout = pr_export.ExportLayout("gzip", dedupe_patches=True)
+
+    pr_export.save_export_state(state_file, {"1": "2025-01-01T00:00:00"}, "metadata", layout)
+
+    assert pr_export.load_export_state(state_file, "metadata", layout) == {"1": "2025-01-01T00:00:00"}
+
+@pytest.mark.parametrize("profile, layout", [
+    ("full", ("gzip", True)),
+    ("metadata", ("gzip", False)),
+    ("metadata", ("none", True)),
+])
+def test_export_state_discarded_when_settings_change(pr_export, tmp_path, profile, layout):
+    state_file = tmp_path / "state.json"
+    pr_export.save_export_state(state_file, {"1": "x"}, "metadata", pr_export.ExportLayout("gzip", dedupe_patches=True))
+
+    assert pr_export.load_export_state(state_file, profile, pr_export.ExportLayout(*layout)) == {}
+
+def test_export_state_from_before_layouts_is_kept(pr_export, tmp_path):
+    state_file = tmp_path / "state.json"
+    state_file.write_text(json.dumps({"version": 1, "profile": "full", "watermarks": {"1": "x"}}))
+
+    assert pr_export.load_export_state(state_file, "full", pr_export.ExportLayout()) == {"1": "x"}
+
+def test_manifest_round_trip(pr_export, tmp_path):
+    manifest_file = tmp_path / pr_export.MANIFEST_FILENAME
+
+    pr_export.save_manifest(manifest_file, {"acme_api_PR1.json": "abc"})
+
+    assert pr_export.load_manifest(manifest_file) == {"acme_api_PR1.json": "abc"}
+    assert pr_export.load_manifest(tmp_path / "missing.json") == {}
+
+def test_unreadable_manifest_is_empty(pr_export, tmp_path):
+    manifest_file = tmp_path / pr_export.MANIFEST_FILENAME
+    manifest_file.write_text("{truncated")
+
+    assert pr_export.load_manifest(manifest_file) == {}
+
+def test_atomic_write_replaces_file(pr_export, tmp_path):
+    path = tmp_path / "out" / "doc.json"
+
+    pr_export.atomic_write(path, b"first")
+    pr_export.atomic_write(path, b"second")
+
+    assert path.read_bytes() == b"second"
+    assert os.listdir(path.parent) == ["doc.json"]
+
+def test_atomic_write_failure_keeps_old_file(pr_export, tmp_path, monkeypatch):
+    path = tmp_path / "doc.json"
+    pr_export.atomic_write(path, b"old")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pr_export.os, "replace", fail)
+    with pytest.raises(OSError):
+        pr_export.atomic_write(path, b"new")
+
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["doc.json"]
+
+def test_write_if_changed_skips_identical_content(pr_export, tmp_path):
+    path = tmp_path / "doc.json"
+    manifest = {}
+
+    digest, size = pr_export.write_if_changed(path, b"{}", manifest)
+    manifest[path.name] = digest
+
+    assert size == 2
+    assert pr_export.write_if_changed(path, b"{}", manifest) is None
+    assert pr_export.write_if_changed(path, b"{ }", manifest) is not None
+
+    path.unlink()
+    assert pr_export.write_if_changed(path, b"{}", manifest) is not None
@@ -0,0 +1,32 @@
+from datetime import date, datetime
+
+from mysql.connector import FieldType
+
+def test_temporal_columns_from_description(pr_export):
+    description = [
+        ("id", FieldType.LONGLONG), ("created_at", FieldType.DATETIME), ("body", FieldType.BLOB),
+        ("merged_at", FieldType.TIMESTAMP), ("day", FieldType.DATE),
+    ]
+
+    assert pr_export.temporal_columns(description) == ("created_at", "merged_at", "day")
+    assert pr_export.temporal_columns(None) == ()
+
+def test_convert_temporals_only_touches_planned_columns(pr_export):
+    row = {"id": 1, "created_at": datetime(2025, 1, 2, 3, 4, 5), "day": date(2025, 1, 2), "merged_at": None,
+           "note": datetime(2025, 1, 1)}
+
+    pr_export.convert_temporals(row, ("created_at", "day", "merged_at"))
+
+    assert row == {"id": 1, "created_at": "2025-01-02T03:04:05", "day": "2025-01-02", "merged_at": None,
+                   "note": datetime(2025, 1, 1)}
+
+def test_encoders_agree_on_converted_rows(pr_export):
+    row = {"id": 1, "created_at": datetime(2025, 1, 2, 3, 4, 5)}
+    converted = dict(row)
+    pr_export.convert_temporals(converted, ("created_at",))
+
+    expected = pr_export.DocumentEncoder("json").encode(converted, False)
+
+    assert expected == b'{"id":1,"created_at":"2025-01-02T03:04:05"}'
+    if pr_export.orjson is not None:
+        assert pr_export.DocumentEncoder("orjson").encode(row, False) == expected
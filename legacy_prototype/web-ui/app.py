@@ -378,6 +378,56 @@ def get_pr_details(repo_owner, repo_name, pr_number):
         'patches': patches
     })
 
+@app.route('/api/pr/<repo_owner>/<repo_name>/<int:pr_number>/hunks')
+def get_pr_hunks(repo_owner, repo_name, pr_number):
+    # Hunks of the PR's patches from pr_hunks, optionally only those of one file
+    # or the one a review comment position points at
+    filename = request.args.get('filename', '')
+    position = request.args.get('position', type=int)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    cursor.execute("""
+        SELECT id
+        FROM pull_requests
+        WHERE repo_owner = %s AND repo_name = %s AND number = %s
+    """, (repo_owner, repo_name, pr_number))
+    pr = cursor.fetchone()
+    
+    if not pr:
+        cursor.close()
+        conn.close()
+        return jsonify({'error': 'PR not found'}), 404
+    
+    filters = ["pr_id = %s"]
+    params = [pr['id']]
+    
+    if filename:
+        filters.append("filename = %s")
+        params.append(filename)
+    
+    if position is not None:
+        filters.append("position_start <= %s AND position_end >= %s")
+        params.extend([position, position])
+    
+    cursor.execute(f"""
+        SELECT filename, hunk_index, old_start, old_lines, new_start, new_lines,
+               position_start, position_end, additions, deletions, content_hash, tokens, content
+        FROM pr_hunks
+        WHERE {' AND '.join(filters)}
+        ORDER BY filename, hunk_index
+    """, params)
+    hunks = cursor.fetchall()
+    
+    cursor.close()
+    conn.close()
+    
+    return jsonify({
+        'hunks': hunks,
+        'total_tokens': sum(hunk['tokens'] for hunk in hunks)
+    })
+
 @app.route('/api/authors')
 def get_authors():
     conn = get_db_connection()